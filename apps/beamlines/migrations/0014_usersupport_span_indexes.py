@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:07
+
+import django.contrib.postgres.indexes
+import misc.functions
+from django.conf import settings
+from django.db import migrations, models
+
+SPAN_INDEX = django.contrib.postgres.indexes.GistIndex(misc.functions.TimeSpan('start', 'end'), name='beamlines_support_span_gist')
+
+
+def add_span_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('beamlines', 'UserSupport'), SPAN_INDEX)
+
+
+def remove_span_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('beamlines', 'UserSupport'), SPAN_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beamlines', '0013_rename__admin_roles_ancillary_admin_roles_and_more'),
+        ('scheduler', '0010_mode_span_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersupport',
+            index=models.Index(fields=['facility', 'start', 'end'], name='beamlines_us_fac_start_end_idx'),
+        ),
+        # The GiST index only exists on PostgreSQL, other databases fall back to the B-tree indexes
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='usersupport',
+                    index=SPAN_INDEX,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_span_index, remove_span_index),
+            ],
+        ),
+    ]
@@ -6,6 +6,7 @@ from functools import lru_cache, reduce
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GistIndex
 from django.db import models
 from django.db.models import Q
 from django.utils import timezone
@@ -13,6 +14,7 @@ from django.utils.translation import gettext as _
 from model_utils import Choices
 from model_utils.models import TimeStampedModel
 
+from misc.functions import TimeSpan
 from misc.utils import flatten
 from scheduler.models import Event
 
@@ -182,6 +184,10 @@ class UserSupport(Event):
 
     class Meta:
         unique_together = [('staff', 'facility', 'start')]
+        indexes = [
+            models.Index(fields=['facility', 'start', 'end'], name='beamlines_us_fac_start_end_idx'),
+            GistIndex(TimeSpan('start', 'end'), name='beamlines_support_span_gist'),
+        ]
 
 
 class FacilityTag(TimeStampedModel):
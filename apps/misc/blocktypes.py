@@ -1,11 +1,14 @@
 from collections import defaultdict
 
-from django.template import RequestContext
+from django.core.cache import cache
+from django.template import RequestContext, Engine
+from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.translation import gettext as _
 from model_utils import Choices
 
 from misc.utils import load
+from scheduler.utils import get_versions, version_tag
 
 BLOCK_TYPES = Choices(
     ('dashboard', _('Dashboard Widgets')),
@@ -39,6 +42,10 @@ class BaseBlock(object, metaclass=BlockMeta):
     src_url = ''
     reload_freq = 0
     visible = True
+    lazy = False                # render a placeholder and load the content after the page
+    cache_timeout = 0           # seconds to cache the rendered output for each user, limited by reload_freq
+    cache_scopes = ()           # change-tracking scopes which invalidate the cached output when touched
+    placeholder_template = "misc/blocks/placeholder.html"
 
     def __init__(self, context: RequestContext):
         self.request = context.request
@@ -79,6 +86,34 @@ class BaseBlock(object, metaclass=BlockMeta):
         """
         return self.visible
 
+    def get_src_url(self) -> str:
+        """
+        Returns the URL from which the block content is loaded or reloaded. Lazy blocks without an
+        explicit `src_url` are loaded through the generic dashboard block view.
+        """
+        if self.lazy and not self.src_url:
+            return reverse('dashboard-block', kwargs={'code': self.code})
+        return self.src_url
+
+    def get_cache_timeout(self) -> int:
+        """
+        Returns the number of seconds for which the rendered block is cached for a user. Blocks which
+        reload periodically are never cached longer than their reload frequency.
+        """
+        if self.reload_freq > 0:
+            return min(self.cache_timeout, self.reload_freq)
+        return self.cache_timeout
+
+    def get_cache_key(self) -> str:
+        """
+        Returns the cache key of the rendered block for the current user, including the versions of the
+        change-tracking scopes of the block so that changes are shown without waiting for the timeout.
+        """
+        key = f'dashboard-block:{self.code}:{self.request.user.pk}'
+        if self.cache_scopes:
+            key += ':' + version_tag(get_versions(*self.cache_scopes))
+        return key
+
     def get_context_data(self) -> dict:
         """
         Returns context data for the block.
@@ -89,16 +124,45 @@ class BaseBlock(object, metaclass=BlockMeta):
             'title': self.title,
             'style_classes': self.get_style_classes(),
             'width_classes': self.get_width_classes(),
-            'src_url': self.src_url,
+            'src_url': self.get_src_url(),
             'reload_freq': self.reload_freq,
         }
 
-    def render(self):
+    def render_template(self, template_name: str, context_data: dict) -> str:
+        engine = self.context.template.engine if getattr(self.context, 'template', None) else Engine.get_default()
+        with self.context.push(context_data):
+            return engine.get_template(template_name).render(self.context)
+
+    def render_content(self) -> str:
         context_data = self.get_context_data()
         html = ""
         # an empty context_data means that the block is not visible
         if self.get_visible() or not (isinstance(context_data, dict) and context_data):
-            with self.context.push(context_data):
-                t = self.context.template.engine.get_template(self.get_template_name())
-                html = t.render(self.context)
+            html = self.render_template(self.get_template_name(), context_data)
         return html
+
+    def render(self) -> str:
+        """
+        Renders the block, using the cached output for the current user if available
+        """
+        timeout = self.get_cache_timeout()
+        if timeout <= 0:
+            return self.render_content()
+
+        key = self.get_cache_key()
+        html = cache.get(key)
+        if html is None:
+            html = self.render_content()
+            cache.set(key, html, timeout)
+        return html
+
+    def render_placeholder(self) -> str:
+        """
+        Renders an empty panel which loads the block content from `src_url` once the page is displayed
+        """
+        return self.render_template(self.placeholder_template, {
+            'block': self,
+            'style_classes': self.get_style_classes(),
+            'width_classes': self.get_width_classes(),
+            'src_url': self.get_src_url(),
+        })
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+from django.contrib.postgres.fields import DateTimeRangeField
 from django.core.exceptions import FieldError, FieldDoesNotExist
 from django.db import models
 from django.db.models import Subquery, OuterRef, Min, Max, Count, Avg, Sum, Expression
 from django.db.models import Value, F
+from django.db.models.functions import Greatest
 
 
 class Hours(models.Func):
@@ -28,6 +30,19 @@ class Shifts(models.Func):
                            template="(%(function)s(epoch FROM %(expressions)s)/28800)")
 
 
+class TimeSpan(models.Func):
+    """
+    Combine start and end datetime expressions into a half-open range [start, end). Used both as a GiST index
+    expression and in overlap look-ups so that queries match the index. PostgreSQL only.
+    """
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+    def __init__(self, start, end, **extra):
+        # TSTZRANGE raises an error when end < start, such rows get an empty range instead
+        super().__init__(start, Greatest(start, end), **extra)
+
+
 class Year(models.Func):
     function = 'YEAR'
     template = '%(function)s(%(expressions)s)'
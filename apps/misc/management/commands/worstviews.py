@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from misc.middleware.instrumentation import get_store
+
+ORDERING = {
+    'queries': 'queries',
+    'duplicates': 'duplicates',
+    'db': 'db_time',
+    'time': 'total_time',
+}
+
+
+class Command(BaseCommand):
+    help = 'List the views with the most queries, duplicate queries or time recorded by the instrumentation middleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--by', choices=list(ORDERING), default='queries', help="Measurement to rank views by")
+        parser.add_argument('--limit', type=int, default=20, help="Number of views to list")
+        parser.add_argument('--hours', type=float, help="Only include requests from the last number of hours")
+        parser.add_argument('--clear', action='store_true', help="Remove all recorded samples")
+
+    def handle(self, *args, **options):
+        store = get_store()
+        if not store:
+            raise CommandError('The instrumentation store is disabled, set USO_INSTRUMENT_STORE')
+
+        if options['clear']:
+            store.clear()
+            self.stdout.write(self.style.SUCCESS('Removed all recorded samples'))
+            return
+
+        since = time.time() - options['hours'] * 3600 if options['hours'] else 0
+        results = store.summarize(order_by=ORDERING[options['by']], since=since, limit=options['limit'])
+        if not results:
+            self.stdout.write('No samples recorded')
+            return
+
+        width = max(len(entry['view']) for entry in results)
+        self.stdout.write(
+            f'{"View":<{width}} {"Requests":>8} {"Queries":>13} {"Duplicates":>13} {"DB ms":>17} {"Total ms":>17}'
+        )
+        self.stdout.write(f'{"":<{width}} {"":>8} {"avg / max":>13} {"avg / max":>13} {"avg / max":>17} {"avg / max":>17}')
+        for entry in results:
+            self.stdout.write(
+                f'{entry["view"]:<{width}} {entry["requests"]:>8} '
+                f'{entry["avg_queries"]:>6.1f} / {entry["max_queries"]:<4} '
+                f'{entry["avg_duplicates"]:>6.1f} / {entry["max_duplicates"]:<4} '
+                f'{entry["avg_db_time"]:>8.1f} / {entry["max_db_time"]:<6.1f} '
+                f'{entry["avg_total_time"]:>8.1f} / {entry["max_total_time"]:<6.1f}'
+            )
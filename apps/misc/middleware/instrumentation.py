@@ -0,0 +1,240 @@
+"""
+Per-view query and timing instrumentation. The middleware records the number of queries, duplicate queries,
+database time and total time of every request, keyed by the resolved view name. Samples are kept in a rolling
+SQLite store in the local directory and can be summarized with the `worstviews` management command.
+
+Settings:
+    USO_INSTRUMENT_VIEWS: enable the middleware, follows DEBUG if None, so it is off while running tests
+    USO_SERVER_TIMING: add a Server-Timing header to responses, follows DEBUG if None
+    USO_INSTRUMENT_STORE: path of the SQLite store, None disables the store
+    USO_INSTRUMENT_MAX_SAMPLES: number of samples kept in the store
+"""
+
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import closing, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+USO_INSTRUMENT_VIEWS = getattr(settings, 'USO_INSTRUMENT_VIEWS', None)
+USO_SERVER_TIMING = getattr(settings, 'USO_SERVER_TIMING', None)
+USO_INSTRUMENT_STORE = getattr(
+    settings, 'USO_INSTRUMENT_STORE', str(getattr(settings, 'LOCAL_DIR', '.')) + '/instrumentation.db'
+)
+USO_INSTRUMENT_MAX_SAMPLES = getattr(settings, 'USO_INSTRUMENT_MAX_SAMPLES', 20000)
+TRIM_PROBABILITY = 0.01  # fraction of requests which trim the store back to the maximum number of samples
+
+SAMPLE_FIELDS = ['view', 'method', 'status', 'queries', 'duplicates', 'db_time', 'total_time', 'created']
+
+
+def is_enabled(value) -> bool:
+    """
+    Resolve an instrumentation setting, None follows DEBUG at the time of the request. The test runner turns
+    DEBUG off, so instrumentation is disabled under tests unless enabled explicitly.
+    """
+    return settings.DEBUG if value is None else bool(value)
+
+
+class QueryRecorder:
+    """
+    Records the queries executed on all database connections while active, without requiring DEBUG.
+    Use as a context manager. Times are in milliseconds.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.start = self.end = 0.0
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, repr(params), (time.perf_counter() - start) * 1000))
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        # install on every alias, not only open connections, so that requests served on new threads are counted
+        self._stack = [connections[alias].execute_wrapper(self) for alias in connections]
+        for wrapper in self._stack:
+            wrapper.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        for wrapper in reversed(self._stack):
+            wrapper.__exit__(*args)
+        self.end = time.perf_counter()
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def duplicates(self) -> int:
+        """
+        Number of queries which repeat an earlier query with the same SQL and parameters
+        """
+        return sum(num - 1 for num in Counter((sql, params) for sql, params, duration in self.queries).values())
+
+    @property
+    def similar(self) -> int:
+        """
+        Number of queries which repeat an earlier query with the same SQL but any parameters, typical of N+1 loops
+        """
+        return sum(num - 1 for num in Counter(sql for sql, params, duration in self.queries).values())
+
+    @property
+    def db_time(self) -> float:
+        return sum(duration for sql, params, duration in self.queries)
+
+    @property
+    def total_time(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def server_timing(self) -> str:
+        """
+        Format the measurements as a Server-Timing header value
+        """
+        return (
+            f'db;dur={self.db_time:0.1f};desc="{self.count} queries, {self.duplicates} duplicates", '
+            f'total;dur={self.total_time:0.1f}'
+        )
+
+
+class SampleStore:
+    """
+    Rolling store of request samples in a local SQLite database.
+    """
+
+    def __init__(self, path: str, max_samples: int = USO_INSTRUMENT_MAX_SAMPLES):
+        self.path = path
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self.ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self.ready:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS samples ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, view TEXT, method TEXT, status INTEGER, queries INTEGER, '
+                'duplicates INTEGER, db_time REAL, total_time REAL, created REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS samples_view_idx ON samples (view, created)')
+            self.ready = True
+        return conn
+
+    def add(self, **sample):
+        values = [sample.get(field, time.time() if field == 'created' else None) for field in SAMPLE_FIELDS]
+        with self.lock, closing(self.connect()) as conn, conn:
+            conn.execute(
+                f'INSERT INTO samples ({", ".join(SAMPLE_FIELDS)}) VALUES ({", ".join("?" * len(SAMPLE_FIELDS))})',
+                values
+            )
+            if random.random() < TRIM_PROBABILITY:
+                conn.execute(
+                    'DELETE FROM samples WHERE id <= (SELECT MAX(id) FROM samples) - ?', [self.max_samples]
+                )
+
+    def summarize(self, order_by: str = 'queries', since: float = 0, limit: int = 20) -> list[dict]:
+        """
+        Summarize samples per view, worst first
+        :param order_by: one of 'queries', 'duplicates', 'db_time' or 'total_time', ranked by the maximum
+        :param since: only include samples recorded after this time stamp
+        :param limit: maximum number of views
+        :return: list of dictionaries with the count, average and maximum of each measurement per view
+        """
+        if order_by not in SAMPLE_FIELDS[3:7]:
+            raise ValueError(f'Invalid order: {order_by}')
+        columns = ', '.join(f'AVG({field}), MAX({field})' for field in SAMPLE_FIELDS[3:7])
+        with self.lock, closing(self.connect()) as conn:
+            rows = conn.execute(
+                f'SELECT view, COUNT(*), {columns} FROM samples WHERE created >= ? '
+                f'GROUP BY view ORDER BY MAX({order_by}) DESC, AVG({order_by}) DESC LIMIT ?',
+                [since, limit]
+            ).fetchall()
+        results = []
+        for view, count, *values in rows:
+            entry = {'view': view, 'requests': count}
+            for i, field in enumerate(SAMPLE_FIELDS[3:7]):
+                entry[f'avg_{field}'] = values[2 * i]
+                entry[f'max_{field}'] = values[2 * i + 1]
+            results.append(entry)
+        return results
+
+    def clear(self):
+        with self.lock, closing(self.connect()) as conn, conn:
+            conn.execute('DELETE FROM samples')
+
+
+def get_store() -> SampleStore | None:
+    global _store
+    if USO_INSTRUMENT_STORE and _store is None:
+        _store = SampleStore(USO_INSTRUMENT_STORE)
+    return _store
+
+
+_store = None
+
+
+def get_view_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match:
+        return match.view_name or match._func_path
+    return 'unresolved'
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records query counts, duplicate queries, database time and total time for each request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_enabled(USO_INSTRUMENT_VIEWS):
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        if is_enabled(USO_SERVER_TIMING):
+            response['Server-Timing'] = recorder.server_timing()
+
+        store = get_store()
+        if store:
+            try:
+                store.add(
+                    view=get_view_name(request), method=request.method, status=response.status_code,
+                    queries=recorder.count, duplicates=recorder.duplicates, db_time=recorder.db_time,
+                    total_time=recorder.total_time,
+                )
+            except sqlite3.Error:
+                pass  # instrumentation must never break a request
+        return response
+
+
+@contextmanager
+def query_budget(max_queries: int = None, max_duplicates: int = None):
+    """
+    Context manager which records queries and raises AssertionError if the budget is exceeded
+    :param max_queries: maximum number of queries, not checked if None
+    :param max_duplicates: maximum number of duplicate queries, not checked if None
+    """
+    with QueryRecorder() as recorder:
+        yield recorder
+
+    problems = []
+    if max_queries is not None and recorder.count > max_queries:
+        problems.append(f'{recorder.count} queries executed, budget is {max_queries}')
+    if max_duplicates is not None and recorder.duplicates > max_duplicates:
+        problems.append(f'{recorder.duplicates} duplicate queries executed, budget is {max_duplicates}')
+    if problems:
+        queries = '\n'.join(f'{i + 1}. {sql}' for i, (sql, params, duration) in enumerate(recorder.queries))
+        raise AssertionError('; '.join(problems) + f'\nCaptured queries were:\n{queries}')
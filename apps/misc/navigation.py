@@ -1,3 +1,4 @@
+import time
 from collections import defaultdict
 
 from misc.utils import load
@@ -6,10 +7,18 @@ from django.conf import settings
 
 USO_ADMIN_ROLES = getattr(settings, 'USO_ADMIN_ROLES', [])
 USO_ADMIN_PERMS = getattr(settings, 'USO_ADMIN_PERMS', [])
+MENU_TIMEOUT = 300          # seconds before a filtered menu is rebuilt, refreshes dynamic sub-menu entries
+MENU_CACHE_SIZE = 256       # maximum number of distinct menu signatures kept per process
+
+_discovered = False
+_menu_cache = {}
 
 
 def autodiscover():
-    load('navs')
+    global _discovered
+    if not _discovered:
+        load('navs')
+        _discovered = True
 
 
 def _get_name(cls):
@@ -40,6 +49,60 @@ class NavMeta(type):
         autodiscover()
         return [m() for m in list(cls.plugins.values())]
 
+    def get_signature(cls, request) -> tuple | None:
+        """
+        Returns a hashable signature of everything which determines the menu shown for a request: the
+        user's roles and permissions, and the extra state reported by navigation items which override
+        `signature`. Returns None for anonymous users, who see no menu.
+        """
+        user = request.user
+        if not user.is_authenticated:
+            return None
+        autodiscover()
+        extras = tuple(
+            (name, nav().signature(request)) for name, nav in sorted(cls.registry().items())
+            if nav.signature is not BaseNav.signature
+        )
+        return frozenset(user.get_all_roles()), frozenset(user.get_all_permissions()), extras
+
+    def registry(cls) -> dict:
+        """
+        Returns all registered navigation classes, including sub-menu items, keyed by name.
+        """
+        navs = dict(cls.plugins)
+        for children in cls.children.values():
+            navs.update({child.name: child for child in children})
+        return navs
+
+    def get_menu(cls, request) -> list[tuple]:
+        """
+        Returns the top-level menu items allowed for the request, each paired with its allowed sub-menu
+        items. The result is built once per distinct signature and kept in a per-process cache.
+        :param request: the request
+        :return: list of (nav, submenu) tuples sorted by weight
+        """
+        signature = cls.get_signature(request)
+        if signature is None:
+            return []
+
+        now = time.monotonic()
+        entry = _menu_cache.get(signature)
+        if entry and now - entry[0] < MENU_TIMEOUT:
+            return entry[1]
+
+        # role checks are memoized per user, refresh them so that stale results are not shared by the signature
+        request.user.has_any_role.cache_clear()
+        request.user.has_all_roles.cache_clear()
+
+        menu = [
+            (nav, nav.sub_menu(request))
+            for nav in sorted([m for m in cls.get_menus() if m.allowed(request)], key=lambda x: x.weight)
+        ]
+        if len(_menu_cache) >= MENU_CACHE_SIZE:
+            _menu_cache.clear()
+        _menu_cache[signature] = (now, menu)
+        return menu
+
 
 class BaseNav(object, metaclass=NavMeta):
     label = ''
@@ -58,6 +121,14 @@ class BaseNav(object, metaclass=NavMeta):
     def get_url(self):
         return self.url
 
+    def signature(self, request):
+        """
+        Returns a hashable value of any request state, other than the user's roles and permissions, which
+        `allowed` or `sub_menu` depend on. Override together with those methods, since menus are cached
+        per signature.
+        """
+        return None
+
     def allowed(self, request):
         if not request.user.is_authenticated:
             return False
@@ -11,15 +11,13 @@ def show_sidebar_menu(context):
     request = context.get('request')
     if not request:
         return ''
-    items = navigation.BaseNav.get_menus()
-    nav_items = sorted([m for m in items if m.allowed(request)], key=lambda x: x.weight)
     nav_template = template.loader.get_template("menu-item.html")
     rendered = '<ul class="navbar-nav menu">'
-    for nav in nav_items:
+    for nav, submenu in navigation.BaseNav.get_menu(request):
         rendered += nav_template.render({
             'nav': nav,
             'active': nav.active(request),
-            'submenu': nav.sub_menu(request),
+            'submenu': submenu,
         })
     rendered += '</ul>'
     return mark_safe(rendered)
\ No newline at end of file
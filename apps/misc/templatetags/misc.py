@@ -33,12 +33,13 @@ def version():
 @register.simple_tag()
 def show_block(block) -> str:
     """
-    Checks if a dashboard panel block is allowed to be displayed and renders it if so.
+    Checks if a dashboard panel block is allowed to be displayed and renders it if so. Lazy blocks
+    are rendered as placeholders which load their content separately.
     :param block: instance of a panel block that has a `check_allowed` method and a `render` method.
     :return: string
     """
     if block.check_allowed():
-        content = block.render()
+        content = block.render_placeholder() if block.lazy else block.render()
         return mark_safe(content) if content else ""
     else:
         return ""
@@ -0,0 +1,17 @@
+from misc.middleware.instrumentation import query_budget
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for asserting that a block of code stays within a query budget. Unlike assertNumQueries, the
+    budget is an upper bound and duplicate queries can be limited separately, so that N+1 regressions are caught
+    without tests breaking whenever a single query is added or removed.
+    """
+
+    def assertQueryBudget(self, max_queries: int = None, max_duplicates: int = 0):
+        """
+        Context manager which fails the test if the enclosed code exceeds the budget
+        :param max_queries: maximum number of queries, not checked if None
+        :param max_duplicates: maximum number of queries repeating an earlier query with identical parameters
+        """
+        return query_budget(max_queries=max_queries, max_duplicates=max_duplicates)
@@ -1,4 +1,18 @@
+import threading
 import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.template import RequestContext
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+
+from misc import navigation
+from misc.blocktypes import BaseBlock
+from misc.middleware.instrumentation import QueryRecorder, is_enabled
+from misc.testing import QueryBudgetMixin
 from misc.utils import MultiKeyDict
 
 
@@ -58,5 +72,164 @@ class TestMultiKeyDict(unittest.TestCase):
         self.assertEqual(self.mkd.get('a'), 1)
         self.assertEqual(self.mkd.get('z', 'default'), 'default')
 
+
+class CountingBlock(BaseBlock):
+    block_type = 'testing'
+    template_name = "misc/blocks/panel.html"
+    lazy = True
+    cache_timeout = 300
+    renders = 0
+
+    def get_context_data(self):
+        CountingBlock.renders += 1
+        return super().get_context_data()
+
+
+class TestBlockCaching(TestCase):
+    def setUp(self):
+        cache.clear()
+        CountingBlock.renders = 0
+        self.request = RequestFactory().get('/')
+        self.request.user = SimpleNamespace(pk=1, is_authenticated=True)
+
+    def get_block(self, user_pk=1):
+        self.request.user = SimpleNamespace(pk=user_pk, is_authenticated=True)
+        return CountingBlock(RequestContext(self.request))
+
+    def test_cached_per_user(self):
+        html = self.get_block().render()
+        self.assertEqual(self.get_block().render(), html)
+        self.assertEqual(CountingBlock.renders, 1)
+        self.get_block(user_pk=2).render()
+        self.assertEqual(CountingBlock.renders, 2)
+
+    def test_reload_frequency(self):
+        block = self.get_block()
+        self.assertEqual(block.get_cache_timeout(), 300)
+        block.reload_freq = 60
+        self.assertEqual(block.get_cache_timeout(), 60)
+
+    def test_placeholder(self):
+        html = self.get_block().render_placeholder()
+        self.assertIn('/misc/blocks/misc_CountingBlock/', html)
+        self.assertEqual(CountingBlock.renders, 0)
+
+
+class TestDashboardBlocks(TestCase):
+    """
+    Dashboard blocks loaded through the block view are cached per user until the objects they list change.
+    """
+
+    def setUp(self):
+        from users.models import User
+        cache.clear()
+        self.user = User.objects.create(username='user', first_name='Test', last_name='User')
+        self.client.force_login(self.user)
+
+    def get_block(self, code):
+        return self.client.get(reverse('dashboard-block', kwargs={'code': code}))
+
+    def test_invalidated_on_change(self):
+        from proposals.models import Proposal
+
+        response = self.get_block('proposals_ProposalsBlock')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Draft Proposal', response.content.decode())
+
+        Proposal.objects.create(spokesperson=self.user, title='Dashboard Draft')
+        self.assertIn('Dashboard Draft', self.get_block('proposals_ProposalsBlock').content.decode())
+
+    def test_not_allowed(self):
+        from proposals.blocks import ProposalsBlock
+
+        with patch.object(ProposalsBlock, 'check_allowed', return_value=False):
+            response = self.get_block('proposals_ProposalsBlock')
+        self.assertEqual((response.status_code, response.content), (200, b''))
+        self.assertEqual(self.get_block('misc_CountingBlock').status_code, 404, "Only dashboard blocks are served")
+
+
+class TestMenuCache(TestCase):
+    def setUp(self):
+        from users.models import User
+        navigation._menu_cache.clear()
+        User.has_any_role.cache_clear()
+
+    def get_request(self, username, roles):
+        from users.models import User
+        request = RequestFactory().get('/')
+        request.user = User.objects.create(username=username, first_name='Test', last_name=username, roles=roles)
+        return request
+
+    def test_cached_per_signature(self):
+        admin = self.get_request('admin', ['admin:uso'])
+        labels = [nav.label for nav, submenu in navigation.BaseNav.get_menu(admin)]
+        self.assertIn('Admin', labels)
+
+        # only the reviewer look-up of the signature remains, items are not checked again
+        other_admin = self.get_request('other', ['admin:uso'])
+        with self.assertNumQueries(1):
+            menu = navigation.BaseNav.get_menu(other_admin)
+        self.assertEqual([nav.label for nav, submenu in menu], labels)
+
+        user = self.get_request('user', [])
+        self.assertNotIn('Admin', [nav.label for nav, submenu in navigation.BaseNav.get_menu(user)])
+
+    def test_role_change(self):
+        request = self.get_request('user', [])
+        self.assertNotIn('Admin', [nav.label for nav, submenu in navigation.BaseNav.get_menu(request)])
+
+        # the memoized role checks of the user must not leak into the menu of the new signature
+        request.user.roles = ['admin:uso']
+        request.user.save()
+        self.assertIn('Admin', [nav.label for nav, submenu in navigation.BaseNav.get_menu(request)])
+
+
+class TestDashboardQueries(QueryBudgetMixin, TestCase):
+    """
+    The dashboard must render with a fixed number of queries, heavy blocks are loaded separately.
+    """
+
+    def setUp(self):
+        from users.models import User
+        cache.clear()
+        self.user = User.objects.create(username='user', first_name='Test', last_name='User', roles=['admin:uso'])
+        self.client.force_login(self.user)
+        self.client.get(reverse('user-dashboard'))  # warm up URL configuration and menu caches
+
+    def test_dashboard(self):
+        with self.assertQueryBudget(max_queries=15):
+            response = self.client.get(reverse('user-dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+
+class TestQueryRecorder(TestCase):
+
+    def test_new_thread(self):
+        # requests served on a new thread start without an open connection, their queries must still be counted
+        counts = []
+
+        def run():
+            try:
+                with QueryRecorder() as recorder:
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                counts.append(recorder.count)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertEqual(counts, [1])
+
+    def test_follows_debug(self):
+        with override_settings(DEBUG=False):
+            self.assertFalse(is_enabled(None), "Instrumentation should be off when DEBUG is, as under tests")
+            self.assertTrue(is_enabled(True))
+        with override_settings(DEBUG=True):
+            self.assertTrue(is_enabled(None))
+            self.assertFalse(is_enabled(False))
+
+
 if __name__ == '__main__':
-    unittest.main()# Create your tests here.
+    unittest.main()
@@ -1,14 +1,16 @@
 from crisp_modals.views import ModalCreateView, ModalUpdateView
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
-from django.http import JsonResponse, Http404
+from django.http import JsonResponse, Http404, HttpResponse
 from django.shortcuts import render
+from django.template import RequestContext
 from django.urls import reverse
 from django.utils import timezone
 from django.views.generic import View
 from reportcraft.views import ReportIndexView, ReportData, DataView, ReportView
 
 from roleperms.views import RolePermsViewMixin
+from . import blocktypes
 from . import forms
 from . import models
 
@@ -138,6 +140,25 @@ class Ping(RolePermsViewMixin, View):
         })
 
 
+class DashboardBlock(RolePermsViewMixin, View):
+    """
+    Renders a single dashboard block for the current user. Used to load lazy blocks and to reload blocks
+    periodically.
+    """
+
+    def get(self, request, *args, **kwargs):
+        blocktypes.autodiscover()
+        plugins = {
+            plugin.code: plugin for plugin in blocktypes.BaseBlock.get_plugins(blocktypes.BLOCK_TYPES.dashboard)
+        }
+        if kwargs['code'] not in plugins:
+            raise Http404('Block not found')
+
+        block = plugins[kwargs['code']](RequestContext(request))
+        html = block.render() if block.check_allowed() else ""
+        return HttpResponse(html)
+
+
 class SectionIndex(RolePermsViewMixin, ReportIndexView):
     """
     View to handle reporting a section of the site.
@@ -7,5 +7,6 @@ urlpatterns = [
     path("schedule/beamtime/<str:fac>/<int:pk>/stats/", views.BeamtimeStatsAPI.as_view(), name="schedule-beamtime-stats-api"),
     path("schedule/beamtime/<str:fac>/", views.BeamTimeListAPI.as_view(), name='beamtime-schedule-api'),
     path("schedule/request/<int:pk>/<str:fac>/", views.RequestPreferencesAPI.as_view(), name='schedule-request-api'),
+    path("schedule/availability/<str:fac>/", views.AvailabilityAPI.as_view(), name='facility-availability-api'),
     path("schedule/project/<int:pk>/", views.ProjectScheduleAPI.as_view(), name='project-schedule-api'),
 ]
\ No newline at end of file
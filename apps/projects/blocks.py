@@ -8,6 +8,9 @@ from misc.blocktypes import BaseBlock, BLOCK_TYPES
 class ProjectsBlock(BaseBlock):
     block_type = BLOCK_TYPES.dashboard
     template_name = "projects/blocks/projects.html"
+    lazy = True
+    cache_timeout = 300
+    cache_scopes = ('projects', 'cycles')
     priority = 4
 
     def get_context_data(self):
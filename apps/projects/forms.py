@@ -374,8 +374,8 @@ class LabSessionForm(ModalModelForm):
                 self.add_error('end', "End earlier than Start!")
 
             if workspaces and start and end:
-                conflicts = models.LabSession.objects.filter(lab=lab, workspaces__in=workspaces).intersects(
-                    cleaned_data
+                conflicts = models.LabSession.objects.filter(lab=lab, workspaces__in=workspaces).overlaps(
+                    start, end
                 ).distinct()
                 if self.instance:
                     conflicts = conflicts.exclude(pk=self.instance.pk)
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:07
+
+import django.contrib.postgres.indexes
+import misc.functions
+from django.db import migrations, models
+
+SPAN_INDEX = django.contrib.postgres.indexes.GistIndex(misc.functions.TimeSpan('start', 'end'), name='projects_beamtime_span_gist')
+
+
+def add_span_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('projects', 'BeamTime'), SPAN_INDEX)
+
+
+def remove_span_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('projects', 'BeamTime'), SPAN_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beamlines', '0014_usersupport_span_indexes'),
+        ('projects', '0028_rename__pending_team_project_pending_team'),
+        ('scheduler', '0010_mode_span_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='beamtime',
+            index=models.Index(fields=['beamline', 'start', 'end'], name='projects_bt_bl_start_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='beamtime',
+            index=models.Index(fields=['project', 'start', 'end'], name='projects_bt_prj_start_end_idx'),
+        ),
+        # The GiST index only exists on PostgreSQL, other databases fall back to the B-tree indexes
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='beamtime',
+                    index=SPAN_INDEX,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_span_index, remove_span_index),
+            ],
+        ),
+    ]
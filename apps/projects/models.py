@@ -6,9 +6,12 @@ from datetime import timedelta
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericRelation
+from django.contrib.postgres.indexes import GistIndex
 from django.db import models
 from django.db.models import Q, Sum
 from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 from django.http import HttpRequest
 from django.urls import reverse
 from django.utils import timezone
@@ -16,9 +19,11 @@ from django.utils.translation import gettext as _
 from model_utils import Choices
 from model_utils.models import TimeStampedModel, TimeFramedModel
 
+from misc.functions import TimeSpan
 from misc.models import DateSpanMixin, Attachment, Clarification, ActivityLog, CodeModelMixin
 from proposals.models import Review, ReviewCycle
 from scheduler.models import Event, EventQuerySet
+from scheduler.utils import touch_versions
 
 User = getattr(settings, "AUTH_USER_MODEL")
 
@@ -865,6 +870,25 @@ class BeamTime(Event):
 
     class Meta:
         unique_together = [('project', 'beamline', 'start')]
+        indexes = [
+            models.Index(fields=['beamline', 'start', 'end'], name='projects_bt_bl_start_end_idx'),
+            models.Index(fields=['project', 'start', 'end'], name='projects_bt_prj_start_end_idx'),
+            GistIndex(TimeSpan('start', 'end'), name='projects_beamtime_span_gist'),
+        ]
+
+
+@receiver([post_save, post_delete], sender=BeamTime)
+def on_beamtime_change(sender, instance, **kwargs):
+    touch_versions(
+        f'schedule:{instance.schedule_id}', f'facility:{instance.beamline_id}', f'project:{instance.project_id}'
+    )
+
+
+@receiver([post_save, post_delete], sender=Project)
+@receiver([post_save, post_delete], sender=Allocation)
+@receiver(m2m_changed, sender=Project.team.through)
+def on_project_change(sender, instance, **kwargs):
+    touch_versions('projects')      # invalidates the cached project dashboard blocks
 
 
 class Reservation(TimeStampedModel):
@@ -1 +1,91 @@
-# Create your tests here.
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from beamlines.models import Facility
+from projects import models, utils
+from scheduler.models import Mode, ModeType, Schedule, ShiftConfig
+from users.models import User
+
+
+def dt(day: int, hour: int = 0) -> datetime:
+    return timezone.make_aware(datetime(2024, 1, day, hour))
+
+
+class AvailabilityTests(TestCase):
+    """
+    Free windows are the normal modes of live schedules, clipped to the requested range, minus booked beam time.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        config = ShiftConfig.objects.create(start=time(8), duration=8, number=3, names='A,B,C')
+        cls.schedule = Schedule.objects.create(
+            description='Schedule', config=config, start_date=date(2024, 1, 1), end_date=date(2024, 1, 31),
+            state=Schedule.STATES.live,
+        )
+        normal = ModeType.objects.create(acronym='N', name='Normal', is_normal=True)
+        development = ModeType.objects.create(acronym='MD', name='Development')
+        for kind, start, end in [(normal, dt(1, 8), dt(3, 8)), (development, dt(3, 8), dt(4, 8)),
+                                 (normal, dt(4, 8), dt(6, 8))]:
+            Mode.objects.create(schedule=cls.schedule, kind=kind, start=start, end=end)
+
+        cls.sector = Facility.objects.create(name='Sector', acronym='SEC', kind=Facility.Types.sector)
+        cls.beamline = Facility.objects.create(name='Beamline', acronym='BL', parent=cls.sector)
+        cls.user = User.objects.create(username='staff', first_name='Staff', last_name='User')
+
+    def setUp(self):
+        cache.clear()
+
+    def book(self, facility, start, end, **kwargs):
+        return models.BeamTime.objects.create(schedule=self.schedule, beamline=facility, start=start, end=end, **kwargs)
+
+    def test_overlap(self):
+        self.book(self.beamline, dt(2, 8), dt(2, 16))
+        self.book(self.beamline, dt(1, 8), dt(1, 16), cancelled=True)
+        windows = utils.get_availability(self.beamline, dt(1), dt(7))
+        self.assertEqual(windows, [(dt(1, 8), dt(2, 8)), (dt(2, 16), dt(3, 8)), (dt(4, 8), dt(6, 8))])
+
+        # beam time on the parent facility, or added later, is also booked
+        self.book(self.sector, dt(5, 0), dt(5, 8))
+        windows = utils.get_availability(self.beamline, dt(1), dt(7))
+        self.assertEqual(
+            windows, [(dt(1, 8), dt(2, 8)), (dt(2, 16), dt(3, 8)), (dt(4, 8), dt(5, 0)), (dt(5, 8), dt(6, 8))]
+        )
+
+    def test_clipping(self):
+        self.book(self.beamline, dt(1, 0), dt(1, 16))
+        windows = utils.get_availability(self.beamline, dt(1, 12), dt(5, 0))
+        self.assertEqual(windows, [(dt(1, 16), dt(3, 8)), (dt(4, 8), dt(5, 0))])
+
+        windows = utils.get_availability(self.beamline, dt(1, 12), dt(5, 0), min_duration=timedelta(hours=20))
+        self.assertEqual(windows, [(dt(1, 16), dt(3, 8))])
+
+    def test_api(self):
+        self.book(self.beamline, dt(2, 8), dt(2, 16))
+        self.client.force_login(self.user)
+        url = reverse('facility-availability-api', kwargs={'fac': 'bl'})
+        response = self.client.get(url, {'start': '2024-01-01', 'end': '2024-01-04', 'hours': 18})
+        self.assertEqual(response.status_code, 200)
+        events = response.json()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['hours'], 24.0)
+        self.assertEqual(events[0]['rendering'], 'background')
+        self.assertEqual(datetime.fromisoformat(events[0]['start']), dt(1, 8))
+
+    def test_api_errors(self):
+        self.client.force_login(self.user)
+        url = reverse('facility-availability-api', kwargs={'fac': 'BL'})
+        for params in [{'start': '2024-01-01'}, {'start': 'soon', 'end': '2024-01-04'},
+                       {'start': '2024-01-01', 'end': '2024-01-04', 'hours': 'inf'},
+                       {'start': '2024-01-01', 'end': '2024-01-04', 'hours': '1e30'},
+                       {'start': '2024-01-01', 'end': '2024-01-04', 'hours': 'nan'},
+                       {'start': '2024-01-01', 'end': '2024-01-04', 'hours': '-2'}]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, f'{params} should be rejected')
+
+        url = reverse('facility-availability-api', kwargs={'fac': 'XX'})
+        self.assertEqual(self.client.get(url, {'start': '2024-01-01', 'end': '2024-01-04'}).status_code, 404)
@@ -5,6 +5,7 @@ import datetime
 from typing import Any
 import numpy
 
+from django.core.cache import cache
 from django.db.models import Q, Value, Max, Min
 from django.db.models.functions import Coalesce
 from django.utils import timezone
@@ -12,8 +13,13 @@ from django.utils import timezone
 from beamlines.models import Facility
 from misc.utils import get_code_generator
 from proposals.models import ReviewType, ReviewCycle
+from scheduler import intervals
+from scheduler.models import Mode, Schedule
+from scheduler.utils import get_versions, version_tag
 from . import models
 
+AVAILABILITY_TIMEOUT = 6 * 3600
+
 
 def to_int(value: Any, default: int = 0) -> int:
     """
@@ -278,3 +284,54 @@ def generate_material_code(material: models.Material) -> str:
         count=Value(1) + Coalesce(Max('pk') - Min('pk'), 0)
     )['count'] or 1
     return f"{material.project.code}M{count:0>3d}".upper()
+
+
+def get_busy_spans(facility: Facility, start: datetime.datetime, end: datetime.datetime) -> list[tuple]:
+    """
+    Merged spans within a time window during which a facility is booked. Includes beam time for projects
+    and reserved beam time without a project, on the facility itself or on its parent.
+    :param facility: the facility
+    :param start: start of the window
+    :param end: end of the window
+    :return: sorted list of disjoint (start, end) tuples
+    """
+    beamlines = [pk for pk in (facility.pk, facility.parent_id) if pk]
+    beamtimes = models.BeamTime.objects.filter(
+        beamline__in=beamlines, cancelled=False
+    ).overlaps(start, end).values_list('start', 'end')
+    return intervals.merge(beamtimes)
+
+
+def get_availability(
+        facility: Facility,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        min_duration: datetime.timedelta | None = None
+) -> list[tuple]:
+    """
+    Free windows during which a facility can be booked. Only time covered by normal (user) modes of live or
+    tentative schedules is available, and booked beam time is subtracted from it. Results are cached until
+    the modes or the beam time of the facility change.
+    :param facility: the facility
+    :param start: start of the window
+    :param end: end of the window
+    :param min_duration: drop windows shorter than this
+    :return: sorted list of disjoint (start, end) tuples
+    """
+    scopes = ['modes', f'facility:{facility.pk}']
+    if facility.parent_id:
+        scopes.append(f'facility:{facility.parent_id}')
+    key = 'availability:' + version_tag(get_versions(*scopes), facility.pk, start.isoformat(), end.isoformat())
+    windows = cache.get(key)
+    if windows is None:
+        modes = Mode.objects.filter(
+            kind__is_normal=True, cancelled=False,
+            schedule__state__in=[Schedule.STATES.live, Schedule.STATES.tentative]
+        ).overlaps(start, end).values_list('start', 'end')
+        usable = intervals.intersection(modes, [(start, end)])
+        windows = intervals.difference(usable, get_busy_spans(facility, start, end))
+        cache.set(key, windows, timeout=AVAILABILITY_TIMEOUT)
+
+    if min_duration:
+        windows = [window for window in windows if window[1] - window[0] >= min_duration]
+    return windows
@@ -30,18 +30,20 @@ from misc.views import ClarificationResponse, RequestClarification
 from notifier import notify
 from proposals.filters import CycleFilterFactory
 from proposals.models import ReviewCycle, ReviewType, AccessPool
+from proposals.search import ProposalSearchMixin
 from proposals.utils import truncated_title
 from roleperms.views import RolePermsViewMixin
 from samples.models import Sample
 from samples.templatetags.samples_tags import pictogram_url
 from scheduler.models import ModeType
 from scheduler.utils import round_time
-from scheduler.views import EventEditor, EventUpdateAPI, EventStatsAPI
+from scheduler.views import EventEditor, EventUpdateAPI, EventStatsAPI, ConditionalFeedMixin
 
 from users.models import User
 from . import forms
 from . import models
 from . import serializers
+from . import utils
 
 USO_ADMIN_ROLES = getattr(settings, 'USO_ADMIN_ROLES', ["admin:uso"])
 USO_HSE_ROLES = getattr(settings, 'USO_HSE_ROLES', ["staff:hse"])
@@ -77,7 +79,7 @@ def _fmt_full_name(user, obj=None):
     return user.get_full_name()
 
 
-class ProjectList(RolePermsViewMixin, ItemListView):
+class ProjectList(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Project
     template_name = "item-list.html"
     paginate_by = 50
@@ -86,10 +88,8 @@ class ProjectList(RolePermsViewMixin, ItemListView):
         'start_date', 'end_date', FutureDateListFilterFactory.new('end_date'),
         CycleFilterFactory.new('cycle'), 'pool', BeamlineFilterFactory.new("beamlines")
     ]
-    list_search = [
-        'code', 'proposal__code', 'proposal__title',
-        'proposal__team', 'proposal__keywords', 'submissions__code'
-    ]
+    list_search = ['code', 'proposal__code', 'submissions__code']
+    search_path = 'proposal__'
     list_styles = {'title': 'col-sm-3', 'state': 'text-center'}
     list_transforms = {'state': _fmt_project_state, 'title': truncated_title}
     link_url = "project-detail"
@@ -156,7 +156,7 @@ class LabSessionList(RolePermsViewMixin, ItemListView):
     allowed_roles = USO_STAFF_ROLES
 
 
-class UserProjectList(RolePermsViewMixin, ItemListView):
+class UserProjectList(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Project
     template_name = "item-list.html"
     paginate_by = 50
@@ -164,7 +164,8 @@ class UserProjectList(RolePermsViewMixin, ItemListView):
     list_filters = [
         'start_date', 'end_date', CycleFilterFactory.new('cycle'), 'pool', BeamlineFilterFactory.new("beamlines")
     ]
-    list_search = ['id', 'proposal__title', 'proposal__team', 'proposal__keywords']
+    list_search = ['code', 'proposal__code']
+    search_path = 'proposal__'
     list_styles = {'title': 'col-sm-3', 'state': 'text-center'}
     list_transforms = {'state': _fmt_project_state, 'title': truncated_title}
     link_url = "project-detail"
@@ -196,7 +197,7 @@ class UserBeamTimeList(RolePermsViewMixin, ItemListView):
         return reverse('project-detail', kwargs={'pk': obj.project.pk})
 
 
-class BeamlineProjectList(RolePermsViewMixin, ItemListView):
+class BeamlineProjectList(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Project
     template_name = "item-list.html"
     paginate_by = 50
@@ -204,7 +205,8 @@ class BeamlineProjectList(RolePermsViewMixin, ItemListView):
     list_filters = [
         'start_date', 'end_date', CycleFilterFactory.new('cycle'), 'pool', BeamlineFilterFactory.new("beamlines")
     ]
-    list_search = ['id', 'proposal__title', 'proposal__team', 'proposal__keywords']
+    list_search = ['code', 'proposal__code']
+    search_path = 'proposal__'
     list_styles = {'title': 'col-sm-3'}
     list_transforms = {'beamlines': _fmt_beamlines, 'state': _fmt_project_state, 'title': truncated_title}
     link_url = "project-detail"
@@ -457,7 +459,7 @@ class SessionHandOver(RolePermsViewMixin, ModalCreateView):
         data['staff'] = self.request.user
 
         sessions = models.Session.objects.filter(project=self.project, beamline=self.facility)
-        existing = sessions.within(data) | sessions.encloses(data) | sessions.intersects(data)
+        existing = sessions.overlaps(data['start'], data['end'])
 
         if existing.exists():
             messages.error(self.request, 'HandOver failed. Existing Sessions exist within time period!')
@@ -736,7 +738,7 @@ class LabSignOn(RolePermsViewMixin, ModalCreateView):
         data['spokesperson'] = self.request.user
 
         sessions = models.LabSession.objects.filter(project=self.project, lab=data['lab'])
-        existing = sessions.within(data) | sessions.encloses(data) | sessions.intersects(data)
+        existing = sessions.overlaps(data['start'], data['end'])
 
         if existing.exists():
             messages.error(self.request, 'Lab Sign-On failed. You have other sessions within the requested period!')
@@ -1279,6 +1281,10 @@ class BeamTimeAPI(EventUpdateAPI):
         for m in data['project'].materials.filter(state=models.Material.STATES.pending):
             m.update_due_dates()
 
+    def get_version_scopes(self):
+        facility = Facility.objects.filter(acronym=self.kwargs['fac']).first()
+        return super().get_version_scopes() + [f"facility:{facility.pk if facility else None}"]
+
     def get_data(self, info):
         data = super().get_data(info)
         data.update(
@@ -1289,11 +1295,17 @@ class BeamTimeAPI(EventUpdateAPI):
         return data
 
 
-class BeamTimeListAPI(generics.ListAPIView):
+class BeamTimeListAPI(ConditionalFeedMixin, generics.ListAPIView):
     serializer_class = serializers.BeamTimeSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     parser_classes = (JSONParser,)
 
+    def get_version_scopes(self):
+        facility = Facility.objects.filter(acronym__iexact=self.kwargs['fac']).values('pk', 'parent').first()
+        if not facility:
+            return []
+        return [f"facility:{pk}" for pk in (facility['pk'], facility['parent']) if pk]
+
     def get_queryset(self):
         self.facility = Facility.objects.filter(acronym__iexact=self.kwargs['fac']).first()
         if self.request.GET.get('start') and self.request.GET.get('end'):
@@ -1303,8 +1315,8 @@ class BeamTimeListAPI(generics.ListAPIView):
             today = timezone.now().date()
             start = today.replace(day=1)
             end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
-        filters = Q(start__lte=end, end__gte=start) & (Q(beamline=self.facility) | Q(beamline__children=self.facility))
-        return models.BeamTime.objects.filter(filters)
+        filters = Q(beamline=self.facility) | Q(beamline__children=self.facility)
+        return models.BeamTime.objects.filter(filters).overlaps(start, end)
 
 
 class AskClarification(RequestClarification):
@@ -1720,6 +1732,39 @@ class RequestPreferencesAPI(RolePermsViewMixin, View):
         return JsonResponse(events, safe=False)
 
 
+class AvailabilityAPI(RolePermsViewMixin, View):
+    """
+    Free windows of a facility within the requested range, as background events. An optional "hours" parameter
+    drops windows shorter than the given number of hours.
+    """
+
+    def get(self, *args, **kwargs):
+        facility = Facility.objects.filter(acronym__iexact=self.kwargs['fac']).first()
+        if not facility:
+            raise Http404('Facility not found')
+        try:
+            start, end = (parser.parse(self.request.GET[key]) for key in ('start', 'end'))
+            hours = float(self.request.GET.get('hours', 0))
+            if not math.isfinite(hours) or hours < 0:
+                raise ValueError('Invalid number of hours')
+            min_duration = timedelta(hours=hours) if hours > 0 else None
+        except (KeyError, ValueError, OverflowError):
+            return JsonResponse(
+                {'error': 'Valid "start" and "end" parameters, and a non-negative "hours", are required'}, status=400
+            )
+
+        start, end = (timezone.make_aware(dt) if timezone.is_naive(dt) else dt for dt in (start, end))
+        windows = utils.get_availability(facility, start, end, min_duration=min_duration)
+        events = [{
+            'start': timezone.localtime(window_start).isoformat(),
+            'end': timezone.localtime(window_end).isoformat(),
+            'hours': round((window_end - window_start).total_seconds() / 3600, 2),
+            'type': 'available',
+            'rendering': 'background',
+        } for window_start, window_end in windows]
+        return JsonResponse(events, safe=False)
+
+
 class ProjectSchedule(RolePermsViewMixin, detail.DetailView):
     model = models.Project
     template_name = "scheduler/calendar.html"
@@ -1765,18 +1810,25 @@ class ProjectSchedule(RolePermsViewMixin, detail.DetailView):
         return context
 
 
-class ProjectScheduleAPI(generics.ListAPIView):
+class ProjectScheduleAPI(ConditionalFeedMixin, generics.ListAPIView):
     serializer_class = serializers.ProjectBeamTimeSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     parser_classes = (JSONParser,)
 
+    def get_version_scopes(self):
+        # beam time edited in bulk through the facility editor only touches the facility scope
+        facilities = models.BeamTime.objects.filter(project__pk=self.kwargs['pk']).values_list(
+            'beamline', flat=True
+        ).distinct()
+        return [f"project:{self.kwargs['pk']}"] + [f"facility:{pk}" for pk in facilities]
+
     def get_queryset(self):
         self.project = models.Project.objects.filter(pk=self.kwargs['pk']).first()
         self.queryset = self.project.beamtimes
         if self.request.GET.get('start') and self.request.GET.get('end'):
             start = self.request.GET.get('start')
             end = self.request.GET.get('end')
-            self.queryset = self.queryset.filter(start__lte=end, end__gte=start)
+            self.queryset = self.queryset.overlaps(start, end)
         return super().get_queryset()
 
 
@@ -1828,7 +1880,7 @@ def _fmt_contact(user, obj=None):
     return '{} <br/><small>&lt;{}&gt;</small>'.format(user, user.email)
 
 
-class InvoicingList(RolePermsViewMixin, ItemListView):
+class InvoicingList(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Project
     paginate_by = 50
     template_name = "item-list.html"
@@ -1841,7 +1893,8 @@ class InvoicingList(RolePermsViewMixin, ItemListView):
         'invoice_region', 'invoice_country', 'invoice_code', 'shifts_allocated', 'shifts_used'
     ]
     list_filters = ['start_date', 'end_date', 'pool', BeamlineFilterFactory.new("beamlines")]
-    list_search = ['proposal__title', 'proposal__team', 'id']
+    list_search = ['code', 'proposal__code']
+    search_path = 'proposal__'
     list_styles = {'title': 'col-sm-3', 'state': 'text-center', 'beamlines': 'col-sm-2'}
     list_transforms = {
         'beamlines': _fmt_beamlines,
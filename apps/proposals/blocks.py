@@ -12,6 +12,9 @@ from misc.blocktypes import BaseBlock, BLOCK_TYPES
 class ProposalsBlock(BaseBlock):
     block_type = BLOCK_TYPES.dashboard
     template_name = "proposals/blocks/proposals.html"
+    lazy = True
+    cache_timeout = 300
+    cache_scopes = ('proposals', 'cycles')
     priority = 1
 
     def get_context_data(self):
@@ -35,6 +38,9 @@ class ProposalsBlock(BaseBlock):
 class SubmissionsBlock(BaseBlock):
     block_type = BLOCK_TYPES.dashboard
     template_name = "proposals/blocks/submissions.html"
+    lazy = True
+    cache_timeout = 300
+    cache_scopes = ('proposals', 'submissions')
     priority = 2
 
     def get_context_data(self):
@@ -60,6 +66,9 @@ class SubmissionsBlock(BaseBlock):
 class ReviewsBlock(BaseBlock):
     block_type = BLOCK_TYPES.dashboard
     template_name = "proposals/blocks/reviews.html"
+    lazy = True
+    cache_timeout = 300
+    cache_scopes = ('reviews', 'reviewers', 'cycles')
     priority = 1
 
     def get_context_data(self):
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from proposals.models import Submission, SubmissionScore
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized review score entries of submissions from their completed reviews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cycle', type=int, action='append', help="Only rebuild submissions for this cycle")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of entries per insert statement")
+
+    def handle(self, *args, **options):
+        submissions = Submission.objects.all()
+        if options['cycle']:
+            submissions = submissions.filter(cycle__in=options['cycle'])
+
+        start = time.perf_counter()
+        created = SubmissionScore.rebuild(submissions, batch_size=options['batch_size'])
+        duration = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {created} score entries for {submissions.count()} submissions in {duration:0.2f} s')
+        )
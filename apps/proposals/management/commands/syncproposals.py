@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from proposals.models import Proposal
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the team members, requested facilities and techniques, and subject areas derived from proposal details.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--code', type=str, action='append', help="Only synchronize the proposal with this code")
+
+    def handle(self, *args, **options):
+        proposals = Proposal.objects.select_related('spokesperson')
+        if options['code']:
+            proposals = proposals.filter(code__in=options['code'])
+
+        start = time.perf_counter()
+        count = 0
+        for proposal in proposals.iterator():
+            proposal.sync_details()
+            count += 1
+        duration = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Synchronized {count} proposals in {duration:0.2f} s'))
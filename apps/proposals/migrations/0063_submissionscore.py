@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:19
+
+import statistics
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def facility_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_scores(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Review = apps.get_model('proposals', 'Review')
+    ReviewType = apps.get_model('proposals', 'ReviewType')
+    SubmissionScore = apps.get_model('proposals', 'SubmissionScore')
+    Facility = apps.get_model('beamlines', 'Facility')
+
+    submission_type = ContentType.objects.filter(app_label='proposals', model='submission').first()
+    if not submission_type:
+        return
+
+    # same grouping as SubmissionScore.summarize, a combined entry per type and one per reviewed facility
+    per_facility = set(ReviewType.objects.filter(per_facility=True).values_list('pk', flat=True))
+    facilities = set(Facility.objects.values_list('pk', flat=True))
+    groups = defaultdict(list)
+    reviews = Review.objects.filter(content_type=submission_type, is_complete=True).values_list(
+        'object_id', 'type', 'stage', 'score', F('details__facility')
+    )
+    for submission, type_id, stage, score, facility in reviews.iterator():
+        groups[(submission, type_id, stage, None)].append(score)
+        facility = facility_id(facility)
+        if type_id in per_facility and facility in facilities:
+            groups[(submission, type_id, stage, facility)].append(score)
+
+    SubmissionScore.objects.bulk_create([
+        SubmissionScore(
+            submission_id=submission, type_id=type_id, stage_id=stage, facility_id=facility,
+            average=statistics.fmean(scores), stdev=statistics.pstdev(scores), num_reviews=len(scores),
+        )
+        for (submission, type_id, stage, facility), scores in groups.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beamlines', '0014_usersupport_span_indexes'),
+        ('proposals', '0062_reviewtrack_reviewers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('average', models.FloatField(default=0.0)),
+                ('stdev', models.FloatField(default=0.0)),
+                ('num_reviews', models.IntegerField(default=0)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('facility', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='submission_scores', to='beamlines.facility')),
+                ('stage', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='submission_scores', to='proposals.reviewstage')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_entries', to='proposals.submission')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_scores', to='proposals.reviewtype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['submission', 'type', 'facility'], name='proposals_score_sub_type_idx'), models.Index(fields=['type', 'facility', 'average'], name='proposals_score_rank_idx')],
+            },
+        ),
+        migrations.RunPython(compute_scores, migrations.RunPython.noop),
+    ]
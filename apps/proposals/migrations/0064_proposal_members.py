@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def sync_proposal_details(apps, schema_editor):
+    Proposal = apps.get_model('proposals', 'Proposal')
+    ProposalMember = apps.get_model('proposals', 'ProposalMember')
+    Technique = apps.get_model('proposals', 'Technique')
+    Facility = apps.get_model('beamlines', 'Facility')
+
+    facility_ids = set(Facility.objects.values_list('pk', flat=True))
+    technique_ids = set(Technique.objects.values_list('pk', flat=True))
+    members, facilities, techniques = [], [], []
+    for proposal in Proposal.objects.select_related('spokesperson').iterator():
+        details = proposal.details if isinstance(proposal.details, dict) else {}
+
+        # team members, as in Proposal.get_members
+        leader_email = str((details.get('leader') or {}).get('email') or '').strip().lower()
+        spokesperson = proposal.spokesperson
+        spokesperson_email = str(spokesperson.email or '').strip().lower()
+        team = {
+            spokesperson_email: (
+                spokesperson.first_name, spokesperson.last_name,
+                ['spokesperson'] + (['leader'] if spokesperson_email == leader_email else [])
+            )
+        }
+        delegate = details.get('delegate') or {}
+        delegate_email = str(delegate.get('email') or '').strip().lower()
+        if delegate_email and delegate_email != spokesperson_email:
+            team[delegate_email] = (delegate.get('first_name', ''), delegate.get('last_name', ''), ['delegate'])
+        for member in details.get('team_members') or []:
+            if not isinstance(member, dict):
+                continue
+            email = str(member.get('email') or '').strip().lower()
+            if email not in team:
+                team[email] = (member.get('first_name', ''), member.get('last_name', ''), [])
+        members.extend(
+            ProposalMember(
+                proposal_id=proposal.pk, email=email, first_name=(first_name or '')[:100],
+                last_name=(last_name or '')[:100], roles=roles
+            )
+            for email, (first_name, last_name, roles) in team.items() if email
+        )
+
+        # requested facilities and techniques
+        requirements = [req for req in details.get('beamline_reqs') or [] if isinstance(req, dict)]
+        facilities.extend(
+            Proposal.facilities.through(proposal_id=proposal.pk, facility_id=pk)
+            for pk in {req.get('facility') for req in requirements} if pk in facility_ids
+        )
+        techniques.extend(
+            Proposal.techniques.through(proposal_id=proposal.pk, technique_id=pk)
+            for pk in {pk for req in requirements for pk in req.get('techniques') or []} if pk in technique_ids
+        )
+
+    ProposalMember.objects.bulk_create(members, batch_size=500)
+    Proposal.facilities.through.objects.bulk_create(facilities, batch_size=500)
+    Proposal.techniques.through.objects.bulk_create(techniques, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beamlines', '0014_usersupport_span_indexes'),
+        ('proposals', '0063_submissionscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proposal',
+            name='facilities',
+            field=models.ManyToManyField(blank=True, related_name='proposals', to='beamlines.facility'),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='techniques',
+            field=models.ManyToManyField(blank=True, related_name='proposals', to='proposals.technique'),
+        ),
+        migrations.CreateModel(
+            name='ProposalMember',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('first_name', models.CharField(blank=True, max_length=100)),
+                ('last_name', models.CharField(blank=True, max_length=100)),
+                ('roles', models.JSONField(blank=True, default=list)),
+                ('proposal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='proposals.proposal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['email', 'proposal'], name='proposals_member_email_idx')],
+            },
+        ),
+        migrations.RunPython(sync_proposal_details, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:33
+
+from collections import defaultdict
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+from proposals import search
+
+
+def create_index(apps, schema_editor):
+    search.create_index(schema_editor)
+
+
+def populate_index(apps, schema_editor):
+    Proposal = apps.get_model('proposals', 'Proposal')
+    ProposalMember = apps.get_model('proposals', 'ProposalMember')
+
+    team = defaultdict(list)
+    for proposal, first_name, last_name, email in ProposalMember.objects.order_by('pk').values_list(
+        'proposal', 'first_name', 'last_name', 'email'
+    ).iterator():
+        team[proposal].append(f'{first_name} {last_name} {email}')
+
+    entries = []
+    for proposal in Proposal.objects.only('title', 'keywords', 'details').iterator():
+        details = proposal.details if isinstance(proposal.details, dict) else {}
+        subject = details.get('subject') or {}
+        if isinstance(subject, list):
+            subject = subject[0] if len(subject) == 1 else {}
+        entries.append((proposal.pk, {
+            'title': proposal.title or '',
+            'keywords': proposal.keywords or subject.get('keywords', '') or '',
+            'team': ' '.join(team[proposal.pk]),
+            'abstract': details.get('abstract', '') or '',
+        }))
+    search.index_entries(entries, schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beamlines', '0014_usersupport_span_indexes'),
+        ('dynforms', '0007_update_likert_scores'),
+        ('proposals', '0064_proposal_members'),
+        ('publications', '0027_focusarea_remove_publication_category_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proposal',
+            name='search',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # The GIN index only exists on PostgreSQL, SQLite gets an FTS5 table instead
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='proposal',
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=['search'], name='proposals_proposal_search_idx'
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_index, drop_index),
+            ],
+        ),
+        migrations.RunPython(populate_index, migrations.RunPython.noop),
+    ]
@@ -1,21 +1,28 @@
 import copy
+import statistics
 from collections import defaultdict
 from datetime import date, timedelta, datetime
+from typing import Iterable
 from dateutil.relativedelta import relativedelta
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericRelation
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.cache import cache
 from django.db import models, transaction
-from django.db.models import Case, Avg, When, F, Q, StdDev, Max, Count
-from django.db.models.functions import Round, ExtractYear
+from django.db.models import Case, Avg, When, F, Q, StdDev, Max, Count, Sum, OuterRef, Subquery, ExpressionWrapper
+from django.db.models import Value
+from django.db.models.functions import Greatest, Round, ExtractYear, Sqrt
 from django.db.models.query import QuerySet
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.utils.text import slugify
 from django.utils.translation import gettext as _
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save, m2m_changed
 from django.dispatch import receiver
 from dynforms.models import BaseFormModel, FormType
 from model_utils import Choices
@@ -26,9 +33,12 @@ from misc.models import Clarification, GenericContentMixin, CodeModelMixin
 from misc.models import DateSpanMixin, DateSpanQuerySet, Attachment
 from misc.utils import humanize_role
 from publications.models import SubjectArea
+from scheduler.utils import touch_versions, get_versions, version_tag
+from . import search as fulltext
 
 
 User = getattr(settings, "AUTH_USER_MODEL")
+DOCUMENT_TIMEOUT = 60 * 60 * 24 * 7  # Documents are invalidated on change, this only limits stale entries
 
 
 class Proposal(CodeModelMixin, BaseFormModel):
@@ -46,9 +56,17 @@ class Proposal(CodeModelMixin, BaseFormModel):
     )
     team = models.JSONField(default=list, null=True, blank=True)
     state = models.IntegerField(choices=STATES, default=STATES.draft)
+    facilities = models.ManyToManyField(Facility, blank=True, related_name='proposals')
+    techniques = models.ManyToManyField('Technique', blank=True, related_name='proposals')
+    search = SearchVectorField(null=True, editable=False)
     clarifications = GenericRelation(Clarification)
     attachments = GenericRelation(Attachment)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search'], name='proposals_proposal_search_idx'),
+        ]
+
     def is_editable(self) -> bool:
         return self.state == self.STATES.draft
 
@@ -78,33 +96,35 @@ class Proposal(CodeModelMixin, BaseFormModel):
         'spokesperson'). The team roles for each member will be in the key 'roles' which is a list
         """
 
-        leader_email = self.details.get('leader', {}).get('email', '').strip().lower()
-        spokesperson_email = self.spokesperson.email.strip().lower()
-        spokesperson_roles = ['spokesperson'] + ['leader'] if spokesperson_email == leader_email else []
+        leader_email = str((self.details.get('leader') or {}).get('email') or '').strip().lower()
+        spokesperson_email = str(self.spokesperson.email or '').strip().lower()
+        spokesperson_roles = ['spokesperson'] + (['leader'] if spokesperson_email == leader_email else [])
 
         full_team = {
             spokesperson_email: {
-                'first_name': self.spokesperson.first_name,
-                'last_name': self.spokesperson.last_name,
-                'email': self.spokesperson.email.strip().lower(),
+                'first_name': self.spokesperson.first_name or '',
+                'last_name': self.spokesperson.last_name or '',
+                'email': spokesperson_email,
                 'roles': spokesperson_roles
             }
         }
-        delegate_email = self.details.get('delegate', {}).get('email', '').strip().lower()
+        delegate = self.details.get('delegate') or {}
+        delegate_email = str(delegate.get('email') or '').strip().lower()
         if delegate_email and delegate_email != spokesperson_email:
-            delegate = self.details.get('delegate', {})
             full_team[delegate_email] = {
-                'first_name': delegate.get('first_name', ''),
-                'last_name': delegate.get('last_name', ''),
+                'first_name': delegate.get('first_name') or '',
+                'last_name': delegate.get('last_name') or '',
                 'email': delegate_email,
                 'roles': ['delegate']
             }
-        for member in self.details.get('team_members', []):
-            email = member.get('email', '').strip().lower()
+        for member in self.details.get('team_members') or []:
+            if not isinstance(member, dict):
+                continue
+            email = str(member.get('email') or '').strip().lower()
             if email not in full_team:
                 full_team[email] = {
-                    'first_name': member.get('first_name', ''),
-                    'last_name': member.get('last_name', ''),
+                    'first_name': member.get('first_name') or '',
+                    'last_name': member.get('last_name') or '',
                     'email': email,
                     'roles': []
                 }
@@ -139,16 +159,16 @@ class Proposal(CodeModelMixin, BaseFormModel):
             ).first()
         return None
 
-    def get_document(self) -> dict:
+    def build_document(self) -> dict:
         """
-        Returns a dictionary of review content for this submission.
+        Builds a dictionary of review content for this proposal, excluding attachments.
         """
 
         return {
             'title': self.title,
             'authors': self.authors(),
-            'topics': self.areas.all(),
-            'keywords': [text.strip() for text in self.details.get('subject', {}).get('keywords', '').split(';')],
+            'topics': list(self.areas.all()),
+            'keywords': [text.strip() for text in self.get_subject().get('keywords', '').split(';')],
             'science': self.details,
             'safety': {
                 'samples': self.details.get('sample_list', []),
@@ -157,9 +177,58 @@ class Proposal(CodeModelMixin, BaseFormModel):
                 'waste': self.details.get('waste_generation', []),
                 'disposal': self.details.get('disposal_procedure', ''),
             },
-            'attachments': self.attachments,
         }
 
+    def get_document(self) -> dict:
+        """
+        Returns a dictionary of review content for this proposal. The document is cached until the proposal
+        or its subject areas change.
+        """
+        versions = get_versions(f'proposal:{self.pk}')
+        key = f'proposal-document:{self.pk}:{version_tag(versions, self.modified)}'
+        document = cache.get(key)
+        if document is None:
+            document = self.build_document()
+            cache.set(key, document, DOCUMENT_TIMEOUT)
+        return {**document, 'attachments': self.attachments}
+
+    def get_subject(self) -> dict:
+        """
+        Returns the subject section of the proposal details, which contains the 'areas' and 'keywords' keys
+        """
+        subject = self.details.get('subject', {})
+        if isinstance(subject, list):
+            subject = subject[0] if len(subject) == 1 else {}
+        return subject or {}
+
+    def sync_details(self):
+        """
+        Update the team members, requested facilities and techniques, and subject areas derived from the
+        proposal details, so that they can be filtered in the database instead of parsing the details of
+        every proposal. Called automatically when the proposal is saved.
+        """
+        requirements = [req for req in self.details.get('beamline_reqs', []) if isinstance(req, dict)]
+        facility_ids = {req['facility'] for req in requirements if req.get('facility')}
+        technique_ids = {pk for req in requirements for pk in req.get('techniques', []) if pk}
+        subject = self.get_subject()
+        members = [
+            ProposalMember(
+                proposal=self, email=member['email'], first_name=member['first_name'][:100],
+                last_name=member['last_name'][:100], roles=member['roles'],
+            )
+            for member in self.get_members() if member['email']
+        ]
+        with transaction.atomic():
+            self.members.all().delete()
+            ProposalMember.objects.bulk_create(members)
+            self.facilities.set(Facility.objects.filter(pk__in=facility_ids))
+            self.techniques.set(Technique.objects.filter(pk__in=technique_ids))
+            if 'areas' in subject:
+                # areas may also be managed outside the details, keep them if the details have no subject
+                self.areas.set(SubjectArea.objects.filter(pk__in=subject['areas']))
+            fulltext.update_index(self)
+        touch_versions(f'proposal:{self.pk}')
+
     def hazards(self) -> QuerySet:
         """
         Returns a list of hazards associated with this proposal.
@@ -176,40 +245,44 @@ class SubmissionQuerySet(QuerySet):
 
     def with_score(self):
         """
-        Annotate the queryset with the average score of all reviews for each submission.
+        Annotate the queryset with the stage-weighted average score of all completed reviews for each submission,
+        from the materialized score entries.
         """
-        return self.annotate(
-            score=Round(Avg(
-                Case(
-                    When(
-                        reviews__state__gte=Review.STATES.submitted,
-                        then=F('reviews__score') * F('reviews__stage__weight')
-                    ),
-                    output_field=models.FloatField()
-                )
-            ), 2)
-        ).distinct()
+        weighted = SubmissionScore.objects.filter(
+            submission=OuterRef('pk'), facility__isnull=True, stage__isnull=False
+        ).order_by().values('submission').annotate(
+            value=ExpressionWrapper(
+                Sum(F('average') * F('num_reviews') * F('stage__weight')) / Sum('num_reviews'),
+                output_field=models.FloatField()
+            )
+        ).values('value')
+        return self.annotate(score=Round(Subquery(weighted, output_field=models.FloatField()), 2)).distinct()
 
     def with_scores(self):
         """
-        Calculate average and standard deviations of each review type
+        Annotate the average and standard deviation of each scored review type over all completed reviews,
+        from the materialized score entries. Entries of different stages are pooled, weighted by their number
+        of reviews.
         """
+        total = Sum('num_reviews')
+        average = Sum(F('average') * F('num_reviews')) / total
+        # population variance of the pooled reviews, from the per-stage means and variances
+        variance = Sum(F('num_reviews') * (F('stdev') * F('stdev') + F('average') * F('average'))) / total
+        variance = variance - average * average
+
         annotations = {}
         for rev_type in ReviewType.objects.scored():
             type_code = slugify(rev_type.code).replace('-', '_')
-            annotations[f"{type_code}_avg"] = Avg(
-                Case(
-                    When(Q(reviews__state__gte=Review.STATES.submitted, reviews__type=rev_type),
-                         then=F('reviews__score')),
-                    output_field=models.FloatField()
-                )
+            entries = SubmissionScore.objects.filter(
+                submission=OuterRef('pk'), type=rev_type, facility__isnull=True
+            ).order_by().values('submission')
+            annotations[f"{type_code}_avg"] = Subquery(
+                entries.annotate(value=ExpressionWrapper(average, output_field=models.FloatField())).values('value')
             )
-            annotations[f"{type_code}_std"] = StdDev(
-                Case(
-                    When(Q(reviews__state__gte=Review.STATES.submitted, reviews__type=rev_type),
-                         then=F('reviews__score')),
-                    output_field=models.FloatField()
-                )
+            annotations[f"{type_code}_std"] = Subquery(
+                entries.annotate(
+                    value=Sqrt(Greatest(variance, Value(0.0)), output_field=models.FloatField())
+                ).values('value')
             )
         return self.annotate(**annotations).distinct()
 
@@ -334,44 +407,28 @@ class Submission(CodeModelMixin, TimeStampedModel):
 
     def scores(self) -> dict:
         """
-        Generate a summary of review scores for this submission. The result is a dictionary with keys
-        corresponding to the review stage, per-facility review stages will have a further level keyed with facility ids
-        """
-        facility_scores = defaultdict(list)
-        acronyms = dict(self.facilities().values_list('pk', 'acronym'))
-
-        # fetch score information from all completed reviews
-        review_scores = self.reviews.complete().annotate(
-            facility=F('details__facility'),
-        ).values(
-            'stage',
-            'facility'
-        ).annotate(
-            score_avg=Avg('score'),
-            score_std=StdDev('score'),
-        ).values(
-            'stage',
-            'facility',
-            'score_avg',
-            'score_std',
-        )
-        stages = self.track.stages.in_bulk()
-
-        # create a dictionary mapping stage objects to score information
-        for entry in review_scores:
-            facility_scores[stages.get(entry['stage'], None)].append(entry)
+        Generate a summary of review scores for this submission from the materialized score entries. The result is a
+        dictionary with keys corresponding to the review stage, per-facility review stages will have a further level
+        keyed with facility acronyms
+        """
+        entries = self.score_entries.filter(stage__isnull=False).select_related(
+            'stage__kind', 'facility'
+        ).order_by('stage__position')
 
         summary = {}
-        for stage, stage_scores in facility_scores.items():
+        for entry in entries:
+            stage = entry.stage
+            info = {
+                'stage': entry.stage_id, 'facility': entry.facility_id,
+                'score_avg': entry.average, 'score_std': entry.stdev,
+            }
             if stage.kind.per_facility:
                 # collect review scores per facility
-                summary[stage] = {
-                    acronyms[int(item['facility'])]: stage.add_passage(item)
-                    for item in stage_scores
-                    if item.get('facility') is not None
-                }
-            else:
-                summary[stage] = stage.add_passage(stage_scores[0])
+                stage_summary = summary.setdefault(stage, {})
+                if entry.facility:
+                    stage_summary[entry.facility.acronym] = stage.add_passage(info)
+            elif entry.facility is None:
+                summary[stage] = stage.add_passage(info)
 
         return summary
 
@@ -455,30 +512,42 @@ class Submission(CodeModelMixin, TimeStampedModel):
             }
         return facility_requests
 
-    def get_document(self) -> dict:
+    def build_document(self) -> dict:
         """
-        Returns a dictionary of content for this submission. This is used to display the
-        proposal in the review system.
+        Builds a dictionary of content for this submission, excluding attachments. The proposal document is
+        restricted to the facilities and techniques of this submission.
         """
 
-        doc = copy.deepcopy(self.proposal.get_document())
+        doc = self.proposal.get_document()
+        doc.pop('attachments')
+        doc = copy.deepcopy(doc)
 
         # Update facilities and techniques as those are likely different for the submission
-        facilities = self.facilities().values_list('pk', flat=True)
-        proposal_reqs = doc['science']['beamline_reqs']
-        doc['science']['beamline_reqs'] = []
-        for req in proposal_reqs:
-            facility_id = req.get('facility', 0)
-            if facility_id not in facilities:
-                continue
-            doc['science']['beamline_reqs'].append({
-                **req,
-                'techniques': list(
-                    self.techniques.filter(config__facility=facility_id).values_list('technique__pk', flat=True)
-                )
-            })
+        techniques = defaultdict(list)
+        for facility_id, technique_id in self.techniques.values_list('config__facility', 'technique'):
+            techniques[facility_id].append(technique_id)
+        proposal_reqs = doc['science'].get('beamline_reqs', [])
+        doc['science']['beamline_reqs'] = [
+            {**req, 'techniques': techniques[req.get('facility', 0)]}
+            for req in proposal_reqs
+            if req.get('facility', 0) in techniques
+        ]
         return doc
 
+    def get_document(self) -> dict:
+        """
+        Returns a dictionary of content for this submission. This is used to display the
+        proposal in the review system. The document is cached until the submission, its techniques or the
+        proposal change.
+        """
+        versions = get_versions(f'proposal:{self.proposal_id}', f'submission:{self.pk}')
+        key = f'submission-document:{self.pk}:{version_tag(versions, self.modified, self.proposal.modified)}'
+        document = cache.get(key)
+        if document is None:
+            document = self.build_document()
+            cache.set(key, document, DOCUMENT_TIMEOUT)
+        return {**document, 'attachments': self.proposal.attachments}
+
     def get_comments(self) -> str:
         """
         Extract reviewer comments from completed reviews
@@ -943,6 +1012,21 @@ class ConfigItem(TimeStampedModel):
         return f"{self.config}/{self.track.acronym}/{self.technique.short_name()}"
 
 
+@receiver([post_save, post_delete], sender=FacilityConfig)
+@receiver([post_save, post_delete], sender=ConfigItem)
+@receiver([post_save, post_delete], sender=Technique)
+def on_config_change(sender, instance, **kwargs):
+    touch_versions('facility-configs')
+
+
+@receiver(m2m_changed, sender=Submission.techniques.through)
+def on_submission_techniques_change(sender, instance, **kwargs):
+    if isinstance(instance, Submission):
+        touch_versions(f'cycle-submissions:{instance.cycle_id}', f'submission:{instance.pk}')
+    else:
+        touch_versions('facility-configs', *(f'submission:{pk}' for pk in kwargs.get('pk_set') or ()))
+
+
 class ReviewerQueryset(models.QuerySet):
     def available(self, cycle=None) -> QuerySet:
         """
@@ -1313,6 +1397,162 @@ class Review(BaseFormModel, GenericContentMixin):
         return f'<ul>{full_comments}</ul>'
 
 
+def _facility_id(value) -> int | None:
+    """
+    Facility primary key recorded in review details, which may be stored as a string
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SubmissionScore(models.Model):
+    """
+    Materialized review score statistics of a submission for one review type. Each scored type has a combined
+    entry without a facility, and per-facility review types also have an entry for each reviewed facility.
+    Only completed reviews are included. Entries are refreshed when reviews change and can be rebuilt in bulk.
+    """
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='score_entries')
+    type = models.ForeignKey(ReviewType, on_delete=models.CASCADE, related_name='submission_scores')
+    stage = models.ForeignKey(ReviewStage, null=True, on_delete=models.CASCADE, related_name='submission_scores')
+    facility = models.ForeignKey(
+        Facility, null=True, blank=True, on_delete=models.CASCADE, related_name='submission_scores'
+    )
+    average = models.FloatField(default=0.0)
+    stdev = models.FloatField(default=0.0)
+    num_reviews = models.IntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['submission', 'type', 'facility'], name='proposals_score_sub_type_idx'),
+            models.Index(fields=['type', 'facility', 'average'], name='proposals_score_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.submission} - {self.type.code}: {self.average:0.2f}"
+
+    @staticmethod
+    def summarize(reviews: Iterable[dict], per_facility: set) -> list[dict]:
+        """
+        Compute score entries from review values.
+        :param reviews: dictionaries with 'object_id', 'type', 'stage', 'facility' and 'score' keys
+        :param per_facility: primary keys of per-facility review types
+        :return: list of dictionaries with the field values of score entries
+        """
+        groups = defaultdict(list)
+        for review in reviews:
+            groups[(review['object_id'], review['type'], review['stage'], None)].append(review['score'])
+            if review['type'] in per_facility and review['facility'] is not None:
+                key = (review['object_id'], review['type'], review['stage'], review['facility'])
+                groups[key].append(review['score'])
+
+        return [
+            {
+                'submission_id': submission, 'type_id': type_id, 'stage_id': stage, 'facility_id': facility,
+                'average': statistics.fmean(scores), 'stdev': statistics.pstdev(scores), 'num_reviews': len(scores),
+            }
+            for (submission, type_id, stage, facility), scores in groups.items()
+        ]
+
+    @classmethod
+    def rebuild(cls, submissions: QuerySet = None, batch_size: int = 1000) -> int:
+        """
+        Recompute the score entries of the given submissions from their reviews in a fixed number of queries.
+        :param submissions: Submission queryset, all submissions if not provided
+        :param batch_size: number of entries per insert statement
+        :return: number of entries created
+        """
+        submission_type = ContentType.objects.get_for_model(Submission)
+        reviews = Review.objects.filter(content_type=submission_type, is_complete=True)
+        entries = cls.objects.all()
+        if submissions is not None:
+            pks = list(submissions.values_list('pk', flat=True))
+            reviews = reviews.filter(object_id__in=pks)
+            entries = entries.filter(submission__in=pks)
+
+        per_facility = set(ReviewType.objects.filter(per_facility=True).values_list('pk', flat=True))
+        facilities = set(Facility.objects.values_list('pk', flat=True))
+        values = [
+            {**review, 'facility': facility if (facility := _facility_id(review['facility'])) in facilities else None}
+            for review in reviews.values('object_id', 'type', 'stage', 'score', facility=F('details__facility'))
+        ]
+        with transaction.atomic():
+            entries.delete()
+            created = cls.objects.bulk_create(
+                [cls(**info) for info in cls.summarize(values, per_facility)], batch_size=batch_size
+            )
+        return len(created)
+
+    @classmethod
+    def refresh(cls, submission: Submission) -> int:
+        """
+        Recompute the score entries of a single submission.
+        :param submission: Submission instance
+        :return: number of entries created
+        """
+        return cls.rebuild(Submission.objects.filter(pk=submission.pk))
+
+
+class ProposalMember(models.Model):
+    """
+    Team member of a proposal, derived from the proposal details by Proposal.sync_details. Emails are
+    lower-case and roles is a list of team roles ('spokesperson', 'leader', 'delegate').
+    """
+    proposal = models.ForeignKey(Proposal, on_delete=models.CASCADE, related_name='members')
+    email = models.EmailField()
+    first_name = models.CharField(max_length=100, blank=True)
+    last_name = models.CharField(max_length=100, blank=True)
+    roles = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['email', 'proposal'], name='proposals_member_email_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.proposal.code} - {self.email}"
+
+
+@receiver(m2m_changed, sender=Proposal.areas.through)
+def on_proposal_areas_change(sender, instance, **kwargs):
+    if isinstance(instance, Proposal):
+        touch_versions(f'proposal:{instance.pk}')
+    else:
+        touch_versions(*(f'proposal:{pk}' for pk in kwargs.get('pk_set') or ()))
+
+
+@receiver(post_save, sender=Proposal)
+def on_proposal_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.sync_details()
+
+
+@receiver(post_delete, sender=Proposal)
+def on_proposal_delete(sender, instance, **kwargs):
+    fulltext.remove_index(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def on_review_change(sender, instance, **kwargs):
+    if instance.content_type_id == ContentType.objects.get_for_model(Submission).pk:
+        SubmissionScore.rebuild(Submission.objects.filter(pk=instance.object_id))
+
+
+@receiver([post_save, post_delete], sender=Proposal)
+@receiver([post_save, post_delete], sender=Submission)
+@receiver([post_save, post_delete], sender=Review)
+@receiver([post_save, post_delete], sender=Reviewer)
+@receiver([post_save, post_delete], sender=ReviewCycle)
+def on_dashboard_change(sender, instance, **kwargs):
+    # invalidates the cached dashboard blocks listing these objects
+    touch_versions({
+        Proposal: 'proposals', Submission: 'submissions', Review: 'reviews', Reviewer: 'reviewers',
+        ReviewCycle: 'cycles',
+    }[sender])
+
+
 # Aliases
 Cycle = ReviewCycle
 Track = ReviewTrack
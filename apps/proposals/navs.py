@@ -26,6 +26,9 @@ class Proposals(BaseNav):
             allowed = request.user.reviewer.committee is not None
         return allowed
 
+    def signature(self, request):
+        return hasattr(request.user, "reviewer") and request.user.reviewer.committee_id is not None
+
     def sub_menu(self, request):
         from .models import ReviewCycle
         now = timezone.localtime(timezone.now())
@@ -101,6 +104,9 @@ class PRCAssignments(BaseNav):
             allowed = request.user.reviewer.committee is not None
         return allowed
 
+    def signature(self, request):
+        return hasattr(request.user, "reviewer") and request.user.reviewer.committee_id is not None
+
 
 class CycleTypes(BaseNav):
     parent = 'misc.Admin'
@@ -0,0 +1,219 @@
+"""
+Full-text search of proposals. On PostgreSQL, each proposal stores a weighted search vector in Proposal.search,
+covered by a GIN index. On SQLite, an FTS5 virtual table shadows the same text. Both are refreshed whenever the
+proposal details are synchronized, and the item list mixin below uses them for ranked searches of proposals,
+submissions and projects.
+"""
+
+import operator
+from functools import reduce
+
+from django.db import OperationalError, connection
+from django.db.models import Q, F, Value, Case, When, FloatField, TextField
+from itemlist.views import ORDER_VAR, lookup_needs_distinct
+
+FTS_TABLE = 'proposals_proposal_fts'
+SEARCH_CONFIG = 'english'
+SEARCH_LIMIT = 1000  # Maximum number of matches within the searched scope, on backends without a search vector
+FIELD_WEIGHTS = {
+    'title': 'A',
+    'keywords': 'B',
+    'team': 'B',
+    'abstract': 'C',
+}
+
+
+def create_index(schema_editor=None):
+    """
+    Create the database objects backing the search index for the current database backend.
+    :param schema_editor: optional schema editor, used when called from a migration
+    """
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor == 'postgresql':
+        sql = 'CREATE INDEX IF NOT EXISTS proposals_proposal_search_idx ON proposals_proposal USING gin (search)'
+    elif conn.vendor == 'sqlite':
+        sql = (
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            f'{", ".join(FIELD_WEIGHTS)}, tokenize="porter unicode61")'
+        )
+    else:
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+
+
+def drop_index(schema_editor=None):
+    """
+    Remove the database objects created by create_index.
+    :param schema_editor: optional schema editor, used when called from a migration
+    """
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor == 'postgresql':
+        sql = 'DROP INDEX IF EXISTS proposals_proposal_search_idx'
+    elif conn.vendor == 'sqlite':
+        sql = f'DROP TABLE IF EXISTS {FTS_TABLE}'
+    else:
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+
+
+def _index_missing(error: OperationalError) -> bool:
+    """
+    Check if a database error was raised because the SQLite search table does not exist, as in databases created
+    without running migrations
+    """
+    return f'no such table: {FTS_TABLE}' in str(error)
+
+
+def get_search_text(proposal) -> dict:
+    """
+    Extract the searchable text of a proposal
+    :param proposal: Proposal instance
+    :return: dictionary mapping the keys of FIELD_WEIGHTS to text
+    """
+    members = proposal.get_members()
+    return {
+        'title': proposal.title or '',
+        'keywords': proposal.keywords or proposal.get_subject().get('keywords', ''),
+        'team': ' '.join(f"{member['first_name']} {member['last_name']} {member['email']}" for member in members),
+        'abstract': proposal.details.get('abstract', '') or '',
+    }
+
+
+def update_index(proposal):
+    """
+    Refresh the search index entry of a single proposal
+    :param proposal: Proposal instance
+    """
+    from proposals.models import Proposal
+
+    text = get_search_text(proposal)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchVector
+        vector = reduce(operator.add, [
+            SearchVector(Value(text[field], output_field=TextField()), weight=weight, config=SEARCH_CONFIG)
+            for field, weight in FIELD_WEIGHTS.items()
+        ])
+        Proposal.objects.filter(pk=proposal.pk).update(search=vector)
+    elif connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [proposal.pk])
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(text)}) VALUES (%s, {", ".join(["%s"] * len(text))})',
+                    [proposal.pk, *text.values()]
+                )
+        except OperationalError as err:
+            if not _index_missing(err):
+                raise
+
+
+def index_entries(entries, schema_editor=None):
+    """
+    Fill the search index from precomputed text in bulk, used to populate the index of existing proposals
+    :param entries: iterable of (primary key, text) pairs, text as returned by get_search_text
+    :param schema_editor: optional schema editor, used when called from a migration
+    """
+    conn = schema_editor.connection if schema_editor else connection
+    rows = [(pk, [text[field] for field in FIELD_WEIGHTS]) for pk, text in entries]
+    if conn.vendor == 'postgresql':
+        vector = ' || '.join(
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(%s, '')), '{weight}')"
+            for weight in FIELD_WEIGHTS.values()
+        )
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE proposals_proposal SET search = {vector} WHERE id = %s', [(*text, pk) for pk, text in rows]
+            )
+    elif conn.vendor == 'sqlite':
+        with conn.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk, text in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(FIELD_WEIGHTS)}) '
+                f'VALUES (%s, {", ".join(["%s"] * len(FIELD_WEIGHTS))})',
+                [(pk, *text) for pk, text in rows]
+            )
+
+
+def remove_index(pk: int):
+    """
+    Remove the search index entry of a deleted proposal. Only needed for backends which keep a separate table.
+    :param pk: primary key of the proposal
+    """
+    if connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+        except OperationalError as err:
+            if not _index_missing(err):
+                raise
+
+
+def _fts_query(text: str) -> str:
+    """
+    Convert free text into an FTS5 query which matches all words, each as a prefix
+    """
+    words = [word.replace('"', '') for word in text.split()]
+    return ' '.join(f'"{word}"*' for word in words if word)
+
+
+def search_proposals(text: str, path: str = '', scope=None) -> tuple[Q, object]:
+    """
+    Build a filter and a rank expression which match proposals against free text through the search index.
+    :param text: search text
+    :param path: look-up path from the queried model to the proposal, e.g. 'proposal__', empty for proposals
+    :param scope: optional queryset of the model being searched. On backends without a search vector column, only
+        proposals within it are ranked, so that the match limit is not used up by proposals which will be filtered out
+    :return: tuple (filter, rank expression), higher ranks are better matches
+    """
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        return Q(**{f'{path}search': query}), SearchRank(F(f'{path}search'), query)
+
+    ranks = {}
+    fts_query = _fts_query(text)
+    if connection.vendor == 'sqlite' and fts_query:
+        sql = f'SELECT rowid, bm25({FTS_TABLE}, 10.0, 4.0, 4.0, 1.0) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        params = [fts_query]
+        if scope is not None:
+            scope_sql, scope_params = scope.order_by().values(f'{path}pk').query.sql_with_params()
+            sql += f' AND rowid IN ({scope_sql})'
+            params.extend(scope_params)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'{sql} ORDER BY 2 LIMIT %s', [*params, SEARCH_LIMIT])
+                ranks = {pk: -score for pk, score in cursor.fetchall()}  # bm25 scores are lower for better matches
+        except OperationalError as err:
+            if not _index_missing(err):
+                raise
+
+    rank = Case(
+        *[When(**{f'{path}pk': pk}, then=Value(score)) for pk, score in ranks.items()],
+        default=Value(0.0), output_field=FloatField()
+    ) if ranks else Value(0.0, output_field=FloatField())
+    return Q(**{f'{path}pk__in': list(ranks)}), rank
+
+
+class ProposalSearchMixin:
+    """
+    Item list mixin which searches proposals through the full-text index instead of chained icontains filters
+    and orders results by rank. Fields in list_search are still matched by prefix so that codes and identifiers
+    can be found.
+    """
+    search_path = ''  # look-up path from the listed model to the proposal, e.g. 'proposal__'
+
+    def get_search_results(self, queryset, search_term):
+        index_filter, rank = search_proposals(search_term, self.search_path, scope=queryset)
+        lookups = [f'{field}__istartswith' for field in self.get_list_search()]
+        prefix_filters = [Q(**{lookup: bit}) for lookup in lookups for bit in search_term.split()]
+        queryset = queryset.annotate(search_rank=rank).filter(reduce(operator.or_, prefix_filters, index_filter))
+        use_distinct = any(lookup_needs_distinct(queryset.model._meta, lookup) for lookup in lookups)
+        return queryset, use_distinct
+
+    def get_ordering_fields(self, queryset):
+        ordering = super().get_ordering_fields(queryset)
+        if 'search_rank' in queryset.query.annotations and not self.request.GET.get(ORDER_VAR):
+            ordering = ['-search_rank', *ordering]
+        return ordering
@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from django import template
-from django.db.models import Q, Count, Avg, StdDev, F, Value
+from django.db.models import Q, Count, Avg, StdDev, F, Value, ExpressionWrapper, FloatField
 from django.db.models.functions import Coalesce
 from django.utils import timesince
 from django.utils.safestring import mark_safe
@@ -50,18 +50,24 @@ def show_track(context, track):
 
 @register.filter(name="review_count")
 def review_count(reviewer, cycle):
+    if hasattr(reviewer, 'num_reviews'):
+        return reviewer.num_reviews
     return reviewer.committee_proposals(cycle).count()
 
 
 @register.filter(name="review_compat")
 def review_compat(reviewer, submission):
+    """
+    Technique and subject area compatibility of a reviewer with a submission. Uses prefetched related objects
+    when available, so that rendering a page of assignments does not issue queries per row.
+    """
     if hasattr(reviewer, 'reviewer'):
-        sub_techs = set(submission.techniques.values_list('technique', flat=True))
-        user_techs = set(reviewer.reviewer.techniques.values_list('pk', flat=True))
+        sub_techs = {item.technique_id for item in submission.techniques.all()}
+        user_techs = {technique.pk for technique in reviewer.reviewer.techniques.all()}
         matches = sub_techs & user_techs
 
-        sub_areas = set(submission.proposal.areas.values_list('pk', flat=True))
-        user_areas = set(reviewer.reviewer.areas.values_list('pk', flat=True))
+        sub_areas = {area.pk for area in submission.proposal.areas.all()}
+        user_areas = {area.pk for area in reviewer.reviewer.areas.all()}
         areas = sub_areas & user_areas
 
         return mark_safe(
@@ -82,30 +88,31 @@ def facility_acronyms(beamlines):
 
 @register.inclusion_tag('proposals/track-stats.html', takes_context=True)
 def show_track_stats(context, cycle, track):
-    # reviewers = models.Reviewer.objects.available(cycle)
     if cycle.state < cycle.STATES.open:
-        submissions = models.Submission.objects.none()
+        total_submissions = 0
         techs = cycle.techniques().filter(items__track=track).distinct()
         facilities = cycle.configs().annotate(
             facility_acronym=F('facility__acronym')
         ).values('facility_acronym').annotate(count=Count('techniques', distinct=True))
     else:
         submissions = cycle.submissions.filter(track=track)
-        facilities = cycle.submissions.filter(track=track).annotate(
+        total_submissions = submissions.count()
+        facilities = submissions.annotate(
             facility_acronym=F('techniques__config__facility__acronym')
         ).values('facility_acronym').annotate(count=Count('id', distinct=True))
         techs = cycle.techniques().filter(items__track=track, items__submissions__in=submissions).distinct()
 
+    facilities = list(facilities.order_by('facility_acronym'))
     info = {
         'admin': context.get('admin'),
         'owner': context.get('owner'),
         'facilities': facilities,
         'cycle': cycle,
         'track': track,
-        'total_submissions': submissions.count(),
-        'total_facilities': facilities.count(),
+        'total_submissions': total_submissions,
+        'total_facilities': len(facilities),
         'total_techniques': techs.count(),
-        # 'total_reviewers': reviewers.count(),
+        'total_committee': track.committee.count(),
     }
     return info
 
@@ -118,7 +125,7 @@ def show_technique_matrix(context, cycle, track):
         num_proposals=Count('items__submissions', distinct=True),
         num_reviewers=Count('reviewers', distinct=True)
     ).annotate(
-        redundancy=F('num_reviewers') / F('num_proposals')
+        redundancy=ExpressionWrapper(F('num_reviewers') * 1.0 / F('num_proposals'), output_field=FloatField())
     ).values(
         'name', 'acronym', 'num_proposals', 'num_reviewers', 'redundancy'
     ).order_by('redundancy')
@@ -145,32 +152,56 @@ def show_technique_matrix(context, cycle, track):
 def show_track_committee(context, cycle, track):
     reviews = models.Review.objects.filter(cycle=cycle, stage__track=track).distinct()
 
+    # statistics of all review types in a single grouped query
+    complete = Q(is_complete=True)
+    type_stats = {
+        entry['type__kind']: entry
+        for entry in reviews.order_by().values('type__kind').annotate(
+            total=Count('id', distinct=True),
+            complete=Count('id', filter=complete, distinct=True),
+            reviewers=Count('reviewer', distinct=True),
+            complete_reviewers=Count('reviewer', filter=complete, distinct=True),
+        )
+    }
+
     info = []
-    rev_list = [('Technical', reviews.technical(), 'info'), ('Scientific', reviews.scientific(), 'success')]
-    for name, revs, css in rev_list:
-        total = revs.count()
-        reviewers = revs.values_list('reviewer').distinct().count()
-        complete = revs.complete().count()
-        percent = int(100.0 * complete / max(1, total))
-        complete_reviewers = revs.complete().values('reviewer').distinct().count()
-        if total:
+    rev_list = [
+        ('Technical', models.ReviewType.Types.technical, 'info'),
+        ('Scientific', models.ReviewType.Types.scientific, 'success')
+    ]
+    for name, kind, css in rev_list:
+        stats = type_stats.get(kind)
+        if stats and stats['total']:
             info.append({
                 'name': name,
-                'total': total,
-                'complete': complete,
-                'percent': percent,
-                'reviewers': reviewers,
-                'complete_reviewers': complete_reviewers,
+                'total': stats['total'],
+                'complete': stats['complete'],
+                'percent': int(100.0 * stats['complete'] / max(1, stats['total'])),
+                'reviewers': stats['reviewers'],
+                'complete_reviewers': stats['complete_reviewers'],
                 'css': css
             })
 
+    # number of proposals reviewed this cycle by each committee member, in a single grouped query
+    committee = list(track.committee.select_related('user__institution'))
+    review_counts = dict(
+        cycle.submissions.filter(
+            track=track, reviews__reviewer__in=[member.user_id for member in committee]
+        ).order_by().values('reviews__reviewer').annotate(
+            count=Count('id', distinct=True)
+        ).values_list('reviews__reviewer', 'count')
+    )
+    for member in committee:
+        member.num_reviews = review_counts.get(member.user_id, 0)
+
     return {
         'admin': context.get('admin'),
         'owner': context.get('owner'),
         'cycle_state': context.get('cycle_state'),
         'cycle': cycle,
         'track': track,
-        'total_reviews': reviews.count(),
+        'committee': committee,
+        'total_reviews': sum(stats['total'] for stats in type_stats.values()),
         'total_reviewers': sum([v['reviewers'] for v in info]),
         'reviews': reviews,
         'review_types': info,
@@ -1 +1,562 @@
-# Create your tests here.
+import statistics
+from datetime import date, time, timedelta
+from importlib import import_module
+from unittest.mock import patch
+
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from dynforms.models import FormType
+
+from beamlines.models import Facility
+from misc.testing import QueryBudgetMixin
+from proposals import models, search, utils, views
+from proposals.templatetags import cycle_tags
+from publications.models import SubjectArea
+from scheduler.models import Schedule, ShiftConfig
+from users.models import User
+
+
+class TrackQueryBudgetTests(TestCase):
+    """
+    The track administration pages must render with a fixed number of queries regardless of the number of
+    committee members, submissions and reviews in the cycle.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.form_type = FormType.objects.create(name='Review')
+        config = ShiftConfig.objects.create(start=time(8), duration=8, number=3, names='A,B,C')
+        schedule = Schedule.objects.create(
+            description='Schedule', config=config, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30)
+        )
+        cycle_type = models.CycleType.objects.create(name='Standard', start_date=date(2024, 1, 1), shifts=config)
+        cls.cycle = models.ReviewCycle.objects.create(
+            type=cycle_type, schedule=schedule, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30),
+            open_date=date(2023, 9, 1), close_date=date(2023, 10, 1), alloc_date=date(2023, 12, 1),
+            state=models.ReviewCycle.STATES.assign,
+        )
+        cls.track = models.ReviewTrack.objects.create(name='General', acronym='GA')
+        cls.review_type = models.ReviewType.objects.create(
+            code='scientific', kind=models.ReviewType.Types.scientific, description='Scientific Review',
+            score_fields={'merit': 1}
+        )
+        cls.stage = models.ReviewStage.objects.create(track=cls.track, kind=cls.review_type, position=1)
+        cls.pool = models.AccessPool.objects.create(name='General Access', is_default=True)
+        cls.facility = Facility.objects.create(name='Beamline', acronym='BL')
+        cls.facility_config = models.FacilityConfig.objects.create(facility=cls.facility, start_date=date(2023, 1, 1))
+        cls.area = SubjectArea.objects.create(name='Physics')
+        cls.num_items = 0
+
+    def add_rows(self, count: int):
+        """
+        Add committee members, each with a submission in the cycle and a review of it
+        """
+        for i in range(count):
+            self.num_items += 1
+            n = self.num_items
+            technique = models.Technique.objects.create(name=f'Technique {n}', acronym=f'T{n}')
+            item = models.ConfigItem.objects.create(config=self.facility_config, technique=technique, track=self.track)
+            user = User.objects.create(username=f'user{n}', first_name='Test', last_name=f'User {n}')
+            reviewer = models.Reviewer.objects.create(user=user, committee=self.track)
+            reviewer.techniques.add(technique)
+            reviewer.areas.add(self.area)
+            proposal = models.Proposal.objects.create(spokesperson=user, title=f'Proposal {n}')
+            proposal.areas.add(self.area)
+            submission = models.Submission.objects.create(
+                proposal=proposal, track=self.track, cycle=self.cycle, pool=self.pool
+            )
+            submission.techniques.add(item)
+            models.Review.objects.create(
+                reference=submission, cycle=self.cycle, type=self.review_type, stage=self.stage,
+                reviewer=user, form_type=self.form_type, is_complete=bool(i % 2),
+            )
+
+    def count_queries(self, func) -> int:
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        return len(ctx.captured_queries)
+
+    def assertFixedQueries(self, func):
+        """
+        Assert that the number of queries used by func does not grow with the number of rows
+        """
+        self.add_rows(2)
+        before = self.count_queries(func)
+        self.add_rows(6)
+        after = self.count_queries(func)
+        self.assertEqual(before, after, "Query count should not grow with the number of rows")
+        return after
+
+    def test_track_committee(self):
+        def render():
+            info = cycle_tags.show_track_committee({}, self.cycle, self.track)
+            return [cycle_tags.review_count(member, self.cycle) for member in info['committee']]
+
+        self.assertLessEqual(self.assertFixedQueries(render), 3)
+        self.assertEqual(render(), [1] * self.num_items)
+
+    def test_track_stats(self):
+        self.assertLessEqual(
+            self.assertFixedQueries(lambda: cycle_tags.show_track_stats({}, self.cycle, self.track)), 4
+        )
+
+    def test_technique_matrix(self):
+        self.assertLessEqual(
+            self.assertFixedQueries(lambda: cycle_tags.show_technique_matrix({}, self.cycle, self.track)), 1
+        )
+
+    def test_review_compatibility(self):
+        request = RequestFactory().get(
+            reverse('assigned-reviewers', kwargs={'cycle': self.cycle.pk, 'stage': self.stage.pk})
+        )
+        request.user = User.objects.create(username='admin', first_name='Admin', last_name='User', roles=['admin:uso'])
+
+        def render():
+            view = views.AssignedSubmissionList()
+            view.setup(request, cycle=self.cycle.pk, stage=self.stage.pk)
+            submissions = view.get_queryset()
+            return [
+                cycle_tags.review_compat(review.reviewer, submission)
+                for submission in submissions
+                for review in submission.stage_reviews
+            ]
+
+        self.assertFixedQueries(render)
+        self.assertTrue(all("1/1" in compat for compat in render()))
+
+    def test_pooled_scores(self):
+        self.add_rows(1)
+        models.Review.objects.all().delete()
+        submission = models.Submission.objects.get()
+        for stage, score in [(self.stage, 2), (self.stage, 4), (None, 3), (None, 9)]:
+            models.Review.objects.create(
+                reference=submission, cycle=self.cycle, type=self.review_type, stage=stage, score=score,
+                reviewer=submission.proposal.spokesperson, form_type=self.form_type, is_complete=True,
+            )
+
+        # reviews of the same type recorded against different stages are combined
+        self.assertEqual(models.SubmissionScore.objects.filter(facility__isnull=True).count(), 2)
+        scored = models.Submission.objects.with_scores().get(pk=submission.pk)
+        self.assertAlmostEqual(scored.scientific_avg, statistics.fmean([2, 4, 3, 9]))
+        self.assertAlmostEqual(scored.scientific_std, statistics.pstdev([2, 4, 3, 9]))
+
+    def test_score_backfill(self):
+        self.add_rows(4)
+        for i, review in enumerate(models.Review.objects.filter(is_complete=True)):
+            models.Review.objects.filter(pk=review.pk).update(score=i + 2)
+        models.SubmissionScore.rebuild()
+        fields = ('submission', 'type', 'stage', 'facility', 'average', 'stdev', 'num_reviews')
+        expected = sorted(models.SubmissionScore.objects.values_list(*fields))
+        self.assertEqual(len(expected), 2)
+
+        models.SubmissionScore.objects.all().delete()
+        migration = import_module('proposals.migrations.0063_submissionscore')
+        migration.compute_scores(django_apps, None)
+        self.assertEqual(sorted(models.SubmissionScore.objects.values_list(*fields)), expected)
+
+
+class TechniqueMatrixTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        config = ShiftConfig.objects.create(start=time(8), duration=8, number=3, names='A,B,C')
+        schedule = Schedule.objects.create(
+            description='Schedule', config=config, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30)
+        )
+        cycle_type = models.CycleType.objects.create(name='Standard', start_date=date(2024, 1, 1), shifts=config)
+        cls.cycle = models.ReviewCycle.objects.create(
+            type=cycle_type, schedule=schedule, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30),
+            open_date=date(2023, 9, 1), close_date=date(2023, 10, 1), alloc_date=date(2023, 12, 1),
+        )
+        cls.track = models.ReviewTrack.objects.create(name='General', acronym='GA')
+        cls.pool = models.AccessPool.objects.create(name='General Access', is_default=True)
+        user = User.objects.create(username='spokesperson', first_name='Test', last_name='User')
+        cls.proposal = models.Proposal.objects.create(spokesperson=user, title='Proposal')
+        cls.techniques = [
+            models.Technique.objects.create(name=f'Technique {i}', acronym=f'T{i}') for i in range(4)
+        ]
+        cls.configs = []
+        for i in range(3):
+            facility = Facility.objects.create(name=f'Beamline {i}', acronym=f'BL{i}')
+            facility_config = models.FacilityConfig.objects.create(
+                facility=facility, start_date=date(2023, 1, 1), accept=True
+            )
+            for technique in cls.techniques[i:]:
+                models.ConfigItem.objects.create(config=facility_config, technique=technique, track=cls.track)
+            cls.configs.append(facility_config)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_matrix(self):
+        with self.assertNumQueries(1):
+            matrix = utils.get_techniques_matrix(self.cycle, sel_techs=[self.techniques[0].pk])
+        self.assertEqual(len(matrix['techniques']), 4)
+        self.assertEqual(len(matrix['facilities']), 3)
+        self.assertEqual(matrix['techniques'][3]['facilities'], [config.facility.pk for config in self.configs])
+        self.assertEqual([entry['selected'] for entry in matrix['techniques']], [True, False, False, False])
+
+        with self.assertNumQueries(0):
+            utils.get_techniques_matrix(self.cycle)
+
+    def test_demand_and_invalidation(self):
+        utils.get_techniques_matrix(self.cycle)
+        submission = models.Submission.objects.create(
+            proposal=self.proposal, track=self.track, cycle=self.cycle, pool=self.pool
+        )
+        submission.techniques.add(*models.ConfigItem.objects.filter(technique=self.techniques[3]))
+        matrix = utils.get_techniques_matrix(self.cycle)
+        self.assertEqual(matrix['techniques'][3]['demand'], 3)
+        self.assertEqual([entry['demand'] for entry in matrix['facilities']], [1, 1, 1])
+
+        models.ConfigItem.objects.filter(technique=self.techniques[0]).delete()
+        matrix = utils.get_techniques_matrix(self.cycle)
+        self.assertEqual(len(matrix['techniques']), 3)
+
+    def test_edit_config(self):
+        today = timezone.localdate()
+        schedule = Schedule.objects.create(
+            description='Next', config=self.cycle.schedule.config, start_date=today + timedelta(days=120),
+            end_date=today + timedelta(days=300)
+        )
+        cycle = models.ReviewCycle.objects.create(
+            type=self.cycle.type, schedule=schedule, start_date=today + timedelta(days=120),
+            end_date=today + timedelta(days=300), open_date=today + timedelta(days=10),
+            close_date=today + timedelta(days=40), alloc_date=today + timedelta(days=90),
+        )
+        facility = self.configs[2].facility
+        config = models.FacilityConfig.objects.create(
+            facility=facility, cycle=cycle, start_date=cycle.start_date, accept=True
+        )
+        models.ConfigItem.objects.create(config=config, technique=self.techniques[3], track=self.track)
+        matrix = utils.get_techniques_matrix(cycle)
+        self.assertNotIn(facility.pk, matrix['techniques'][0]['facilities'])
+
+        admin = User.objects.create(username='admin', first_name='Admin', last_name='User', roles=['admin:uso'])
+        self.client.force_login(admin)
+        response = self.client.post(reverse('edit-facility-config', kwargs={'pk': config.pk}), {
+            'cycle': cycle.pk, 'facility': facility.pk, 'accept': 'True', 'comments': '',
+            'configs.0.technique': self.techniques[0].pk, 'configs.0.value': self.track.pk,
+            'configs.1.technique': self.techniques[3].pk, 'configs.1.value': self.track.pk,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(config.items.count(), 2)
+        matrix = utils.get_techniques_matrix(cycle)
+        self.assertIn(facility.pk, matrix['techniques'][0]['facilities'], "Added techniques should be listed")
+
+
+class SubmissionEligibilityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        config = ShiftConfig.objects.create(start=time(8), duration=8, number=3, names='A,B,C')
+        schedule = Schedule.objects.create(
+            description='Schedule', config=config, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30)
+        )
+        cycle_type = models.CycleType.objects.create(name='Standard', start_date=date(2024, 1, 1), shifts=config)
+        cls.cycle = models.ReviewCycle.objects.create(
+            type=cycle_type, schedule=schedule, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30),
+            open_date=date(2023, 9, 1), close_date=date(2023, 10, 1), alloc_date=date(2023, 12, 1),
+            state=models.ReviewCycle.STATES.open,
+        )
+        cls.track = models.ReviewTrack.objects.create(name='General', acronym='GA', require_call=True)
+        cls.general = models.AccessPool.objects.create(name='General Access', is_default=True)
+        cls.staff = models.AccessPool.objects.create(name='Staff Access', code='S', role='beamline-staff:-')
+        cls.general.tracks.add(cls.track)
+        cls.staff.tracks.add(cls.track)
+        cls.user = User.objects.create(
+            username='spokesperson', first_name='Test', last_name='User', roles=['beamline-staff:sec']
+        )
+        cls.techniques = [
+            models.Technique.objects.create(name=f'Technique {i}', acronym=f'T{i}') for i in range(3)
+        ]
+        cls.parent = Facility.objects.create(name='Sector', acronym='SEC')
+        cls.facilities = []
+        for i in range(3):
+            facility = Facility.objects.create(name=f'Beamline {i}', acronym=f'BL{i}', parent=cls.parent)
+            facility_config = models.FacilityConfig.objects.create(
+                facility=facility, start_date=date(2023, 1, 1), accept=True
+            )
+            for technique in cls.techniques[:2]:
+                models.ConfigItem.objects.create(config=facility_config, technique=technique, track=cls.track)
+            cls.facilities.append(facility)
+
+    def requirements(self, count: int) -> list[dict]:
+        return [
+            {'facility': facility.pk, 'techniques': [technique.pk for technique in self.techniques]}
+            for facility in self.facilities[:count]
+        ]
+
+    def test_fixed_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            utils.evaluate_submission(self.user, self.cycle, self.requirements(1))
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            utils.evaluate_submission(self.user, self.cycle, self.requirements(3))
+
+    def test_eligibility(self):
+        info = utils.evaluate_submission(self.user, self.cycle, self.requirements(2))
+        self.assertEqual(len(info['requests']), 4)
+        self.assertEqual(set(info['available']), {self.general, self.staff})
+        track_info = info['available'][self.staff][self.track]
+        self.assertEqual(track_info['score'], 100)
+        self.assertEqual(len(track_info['techniques']), 4)
+        self.assertEqual(len(info['checks']), 2)
+        self.assertEqual(info['checks'][0]['requested'], {technique.pk for technique in self.techniques})
+        self.assertEqual(len(info['checks'][0]['items']), 2, "Techniques not offered should not be matched")
+
+        self.user.roles = []
+        info = utils.evaluate_submission(self.user, self.cycle, self.requirements(2))
+        self.assertEqual(set(info['available']), {self.general})
+
+
+class ProposalDetailsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='spokesperson', first_name='Test', last_name='User', email='Test.User@example.com'
+        )
+        cls.area = SubjectArea.objects.create(name='Physics')
+        cls.facility = Facility.objects.create(name='Beamline', acronym='BL')
+        cls.technique = models.Technique.objects.create(name='Technique', acronym='T')
+
+    def test_sync_on_save(self):
+        proposal = models.Proposal.objects.create(spokesperson=self.user, title='Proposal', details={
+            'leader': {'first_name': 'Test', 'last_name': 'User', 'email': 'test.user@example.com'},
+            'delegate': {'first_name': 'Del', 'last_name': 'Egate', 'email': 'Delegate@example.com'},
+            'team_members': [{'first_name': 'Team', 'last_name': 'Member', 'email': 'member@example.com'}],
+            'subject': {'areas': [self.area.pk], 'keywords': 'one; two'},
+            'beamline_reqs': [{'facility': self.facility.pk, 'techniques': [self.technique.pk]}],
+        })
+        members = {member.email: member.roles for member in proposal.members.all()}
+        self.assertEqual(members, {
+            'test.user@example.com': ['spokesperson', 'leader'],
+            'delegate@example.com': ['delegate'],
+            'member@example.com': [],
+        })
+        self.assertEqual(list(proposal.areas.all()), [self.area])
+        self.assertEqual(list(self.facility.proposals.all()), [proposal])
+        self.assertEqual(list(self.technique.proposals.all()), [proposal])
+
+        proposal.details['team_members'] = []
+        proposal.details['beamline_reqs'] = []
+        proposal.save()
+        self.assertFalse(proposal.members.filter(email='member@example.com').exists())
+        self.assertFalse(proposal.facilities.exists())
+
+    def test_areas_without_subject(self):
+        proposal = models.Proposal.objects.create(spokesperson=self.user, title='Proposal', details={})
+        proposal.areas.add(self.area)
+        proposal.save()
+        self.assertEqual(list(proposal.areas.all()), [self.area], "Areas should be kept without a subject")
+
+    def test_incomplete_details(self):
+        details = {
+            'leader': None, 'delegate': None,
+            'team_members': [{'first_name': None, 'last_name': 'Member', 'email': 'member@example.com'}, 'invalid'],
+        }
+        proposal = models.Proposal.objects.create(spokesperson=self.user, title='Proposal', details=details)
+        members = {member.email: (member.first_name, member.roles) for member in proposal.members.all()}
+        self.assertEqual(members, {
+            'test.user@example.com': ('Test', ['spokesperson']),
+            'member@example.com': ('', []),
+        })
+
+        # a spokesperson without an email is not added as a member
+        proposal.spokesperson = User.objects.create(username='anonymous', first_name='No', last_name='Email', email='')
+        proposal.save()
+        self.assertEqual([member.email for member in proposal.members.all()], ['member@example.com'])
+
+        models.ProposalMember.objects.all().delete()
+        migration = import_module('proposals.migrations.0064_proposal_members')
+        migration.sync_proposal_details(django_apps, None)
+        self.assertEqual([member.email for member in proposal.members.all()], ['member@example.com'])
+
+    def test_migration_backfill(self):
+        proposal = models.Proposal.objects.create(spokesperson=self.user, title='Proposal', details={
+            'delegate': {'first_name': 'Del', 'last_name': 'Egate', 'email': 'Delegate@example.com'},
+            'beamline_reqs': [{'facility': self.facility.pk, 'techniques': [self.technique.pk]}],
+        })
+        models.ProposalMember.objects.all().delete()
+        proposal.facilities.clear()
+        proposal.techniques.clear()
+
+        migration = import_module('proposals.migrations.0064_proposal_members')
+        migration.sync_proposal_details(django_apps, None)
+        self.assertEqual(
+            {member.email: member.roles for member in proposal.members.all()},
+            {'test.user@example.com': ['spokesperson'], 'delegate@example.com': ['delegate']}
+        )
+        self.assertEqual(list(proposal.facilities.all()), [self.facility])
+        self.assertEqual(list(proposal.techniques.all()), [self.technique])
+
+
+class SubmissionDocumentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        config = ShiftConfig.objects.create(start=time(8), duration=8, number=3, names='A,B,C')
+        schedule = Schedule.objects.create(
+            description='Schedule', config=config, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30)
+        )
+        cycle_type = models.CycleType.objects.create(name='Standard', start_date=date(2024, 1, 1), shifts=config)
+        cls.cycle = models.ReviewCycle.objects.create(
+            type=cycle_type, schedule=schedule, start_date=date(2024, 1, 1), end_date=date(2024, 6, 30),
+            open_date=date(2023, 9, 1), close_date=date(2023, 10, 1), alloc_date=date(2023, 12, 1),
+        )
+        cls.track = models.ReviewTrack.objects.create(name='General', acronym='GA')
+        cls.pool = models.AccessPool.objects.create(name='General Access', is_default=True)
+        cls.user = User.objects.create(username='spokesperson', first_name='Test', last_name='User')
+        cls.techniques = [
+            models.Technique.objects.create(name=f'Technique {i}', acronym=f'T{i}') for i in range(2)
+        ]
+        cls.items = []
+        for i in range(2):
+            facility = Facility.objects.create(name=f'Beamline {i}', acronym=f'BL{i}')
+            facility_config = models.FacilityConfig.objects.create(
+                facility=facility, start_date=date(2023, 1, 1), accept=True
+            )
+            cls.items.append(
+                models.ConfigItem.objects.create(config=facility_config, technique=cls.techniques[i], track=cls.track)
+            )
+        cls.proposal = models.Proposal.objects.create(spokesperson=cls.user, title='Proposal', details={
+            'beamline_reqs': [
+                {'facility': item.config.facility.pk, 'techniques': [t.pk for t in cls.techniques]}
+                for item in cls.items
+            ],
+            'sample_handling': 'Gloves',
+        })
+        cls.submission = models.Submission.objects.create(
+            proposal=cls.proposal, track=cls.track, cycle=cls.cycle, pool=cls.pool
+        )
+        cls.submission.techniques.add(cls.items[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_document(self):
+        submission = models.Submission.objects.select_related('proposal__spokesperson').get(pk=self.submission.pk)
+        document = submission.get_document()
+        self.assertEqual(document['safety']['handling'], 'Gloves')
+        self.assertEqual(document['science']['beamline_reqs'], [
+            {'facility': self.items[0].config.facility.pk, 'techniques': [self.techniques[0].pk]}
+        ])
+        with self.assertNumQueries(0):
+            submission.get_document()
+
+        self.submission.techniques.add(self.items[1])
+        self.assertEqual(len(submission.get_document()['science']['beamline_reqs']), 2)
+
+        self.proposal.details['sample_handling'] = 'Fume hood'
+        self.proposal.save()
+        submission = models.Submission.objects.select_related('proposal__spokesperson').get(pk=self.submission.pk)
+        self.assertEqual(submission.get_document()['safety']['handling'], 'Fume hood')
+
+
+class ProposalSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_index()
+        cls.user = User.objects.create(
+            username='spokesperson', first_name='Marie', last_name='Curie', email='marie@example.com'
+        )
+        cls.crystal = models.Proposal.objects.create(spokesperson=cls.user, title='Protein crystallography', details={
+            'abstract': 'Structures of membrane proteins',
+            'team_members': [{'first_name': 'Rosalind', 'last_name': 'Franklin', 'email': 'rf@example.com'}],
+        })
+        cls.imaging = models.Proposal.objects.create(spokesperson=cls.user, title='Imaging of soils', details={
+            'abstract': 'Protein residues in agricultural soils',
+        })
+
+    def find(self, text: str, queryset=None, path: str = '') -> list:
+        queryset = models.Proposal.objects.all() if queryset is None else queryset
+        flt, rank = search.search_proposals(text, path)
+        return list(queryset.annotate(rank=rank).filter(flt).order_by('-rank'))
+
+    def test_search(self):
+        self.assertEqual(self.find('protein'), [self.crystal, self.imaging], "Title matches should rank first")
+        self.assertEqual(self.find('franklin'), [self.crystal])
+        self.assertEqual(self.find('soil'), [self.imaging], "Words should match by stem or prefix")
+        self.assertEqual(set(self.find('curie')), {self.crystal, self.imaging})
+
+    def test_index_updates(self):
+        self.imaging.title = 'Imaging of rocks'
+        self.imaging.details['abstract'] = 'Minerals'
+        self.imaging.save()
+        self.assertEqual(self.find('soils'), [])
+        self.assertEqual(self.find('rocks'), [self.imaging])
+
+        self.crystal.delete()
+        self.assertEqual(self.find('franklin'), [])
+
+    def test_migration_backfill(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        else:
+            models.Proposal.objects.update(search=None)
+        self.assertEqual(self.find('protein'), [])
+
+        migration = import_module('proposals.migrations.0065_proposal_search')
+        migration.populate_index(django_apps, None)
+        self.assertEqual(self.find('protein'), [self.crystal, self.imaging])
+        self.assertEqual(self.find('franklin'), [self.crystal])
+
+    def test_scoped_search(self):
+        other = User.objects.create(username='other', first_name='Dorothy', last_name='Hodgkin', email='dh@example.com')
+        for i in range(3):
+            models.Proposal.objects.create(spokesperson=other, title=f'Protein protein protein {i}')
+
+        # other proposals ranked higher must not push the user's own matches past the limit
+        self.client.force_login(self.user)
+        with patch.object(search, 'SEARCH_LIMIT', 2):
+            response = self.client.get(reverse('proposal-list'), {'search': 'protein'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['object_list']), [self.crystal, self.imaging])
+
+    def test_missing_index(self):
+        search.drop_index()
+        self.addCleanup(search.create_index)
+        self.imaging.title = 'Imaging of rocks'
+        self.imaging.save()
+        self.imaging.delete()
+        self.assertEqual(self.find('rocks'), [])
+
+
+class ProposalListQueryTests(QueryBudgetMixin, TestCase):
+    """
+    Proposal lists must render with a fixed number of queries regardless of the number of proposals.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='spokesperson', first_name='Marie', last_name='Curie', email='marie@example.com'
+        )
+        for i in range(20):
+            models.Proposal.objects.create(spokesperson=cls.user, title=f'Proposal {i}', details={
+                'team_members': [{'first_name': 'Pierre', 'last_name': 'Curie', 'email': 'marie@example.com'}],
+            })
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.client.get(reverse('proposal-list'))  # warm up URL configuration and menu caches
+
+    def test_proposal_list(self):
+        with self.assertQueryBudget(max_queries=12):
+            response = self.client.get(reverse('proposal-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['object_list']), 20)
+
+    def test_proposal_search(self):
+        with self.assertQueryBudget(max_queries=12):
+            response = self.client.get(reverse('proposal-list'), {'search': 'proposal'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['object_list']), 20)
@@ -1,10 +1,12 @@
 
+import re
 from collections import defaultdict
 from datetime import date, timedelta
 from typing import Literal
 
 from django.conf import settings
-from django.db.models import Case, When, BooleanField, Value, Q, Sum, IntegerField, F, Avg, Count
+from django.core.cache import cache
+from django.db.models import Case, When, Value, Q, Sum, IntegerField, F, Avg, Count
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.db.models.functions import Concat, Lower
 from django.urls import reverse
@@ -20,6 +22,7 @@ ALLOC_OFFSET_WEEKS = 2  # When must all committee evaluations be completed, 2 we
 DUE_WEEKS = 6  # Number of weeks from close of call to reviews due date
 
 USO_REVIEW_ASSIGNMENT = getattr(settings, "USO_REVIEW_ASSIGNMENT", "BRUTE_FORCE")
+MATRIX_TIMEOUT = 60 * 60 * 24  # Technique matrices are invalidated on change, this only limits stale entries
 
 
 def truncated_title(title, obj=None):
@@ -65,7 +68,7 @@ def get_submission_info(submission):
     return {
         'techniques': set(submission.techniques.values_list('technique__pk', flat=True)),
         'areas': set(proposal.areas.values_list('pk', flat=True)),
-        'emails': {user.get('email', '') for user in proposal.get_members()},
+        'emails': set(proposal.members.values_list('email', flat=True)),
         'conflicts': {
             f'{r["fist_name"]},{r["last_name"]}'.strip().lower()
             for r in proposal.details.get('inappropriate_reviewers', [])
@@ -199,7 +202,7 @@ class Assigner:
             for item in self.submissions.values('pk').annotate(
                 areas=ArrayAgg('proposal__areas__pk', distinct=True),
                 techs=ArrayAgg('techniques__technique__pk', distinct=True),
-                emails=F('proposal__team'),
+                emails=ArrayAgg('proposal__members__email', distinct=True),
                 names=F('proposal__details__inappropriate_reviewers')
             )
         }
@@ -591,61 +594,227 @@ def stdev_format(val, obj=None):
         return mark_safe("&hellip;")
 
 
-def get_techniques_matrix(cycle=None, sel_techs=(), sel_fac=None):
-    """Generate a dictionary mapping each technique to a list of available facilities and
-    each facility to a list available techniques. Entries in the lists are tuples of the form
-    (primary_key, Unicode label, bool selected). The selected field will be true if the primary key was passed in
-    the sel_techs or sel_fac.
+def _build_techniques_matrix(cycle=None, start_date: date = None) -> dict:
+    """
+    Build the selection-independent technique matrix from a single joined query over the configuration items of
+    active facility configurations accepting proposals. Submission demand for each item within the cycle is
+    folded in through conditional aggregation.
+    :param cycle: ReviewCycle or None
+    :param start_date: date used to select active configurations
     """
     from proposals import models
-    tech_facilities = defaultdict(list)
-    fac_techniques = defaultdict(list)
 
-    start_date = cycle.start_date if cycle else date.today()
+    configs = models.FacilityConfig.objects.active(d=start_date).accepting().values('pk')
+    demand_filter = Q(submissions__cycle=cycle) if cycle else Q(pk__in=[])
+    items = models.ConfigItem.objects.filter(config__in=configs).order_by().values(
+        'technique', 'technique__name', 'technique__acronym', 'config__facility', 'config__facility__acronym',
+        'config__facility__name'
+    ).annotate(demand=Count('submissions', filter=demand_filter, distinct=True))
+
+    techniques = {}
+    facilities = {}
+    sort_names = {}
+    for item in items:
+        tech_pk, fac_pk = item['technique'], item['config__facility']
+        name, acronym = item['technique__name'], item['technique__acronym']
+        technique = techniques.setdefault(tech_pk, {
+            'id': tech_pk, 'name': name if not acronym else f'{name} ({acronym})', 'facilities': [], 'demand': 0,
+        })
+        facility = facilities.setdefault(fac_pk, {
+            'id': fac_pk, 'name': item['config__facility__acronym'], 'techniques': [], 'demand': 0,
+        })
+        sort_names[('technique', tech_pk)] = name
+        sort_names[('facility', fac_pk)] = item['config__facility__name']
+        technique['facilities'].append(fac_pk)
+        technique['demand'] += item['demand']
+        facility['techniques'].append(tech_pk)
+        facility['demand'] += item['demand']
 
-    if not sel_techs:
-        sel_techs = [0]
+    return {
+        'cycle': cycle.pk if cycle else None,
+        'techniques': sorted(techniques.values(), key=lambda entry: sort_names[('technique', entry['id'])]),
+        'facilities': sorted(facilities.values(), key=lambda entry: sort_names[('facility', entry['id'])]),
+    }
 
-    for conf in models.FacilityConfig.objects.active(d=start_date).accepting():
-        for t in conf.items.values_list('technique', flat=True):
-            tech_facilities[t].append(conf.facility.pk)
-            fac_techniques[conf.facility.pk].append(t)
 
-    techs = models.Technique.objects.filter(pk__in=list(tech_facilities.keys())).annotate(
-        selected=Case(
-            When(pk__in=sel_techs, then=Value(1)),
-            default=Value(0), output_field=BooleanField()
-        )
-    ).order_by('name')
+def get_techniques_matrix(cycle=None, sel_techs=(), sel_fac=None):
+    """Generate a dictionary mapping each technique to a list of available facilities and
+    each facility to a list available techniques. Entries in the lists are dictionaries with the primary key,
+    Unicode label, selected flag, related entries and the demand, the number of submissions requesting the
+    technique at the facility in the cycle. The selected field will be true if the primary key was passed in
+    the sel_techs or sel_fac. The matrix is cached per cycle until facility configurations or submission
+    techniques change.
+    """
+    from scheduler.utils import get_versions, version_tag
 
-    facilities = models.Facility.objects.filter(pk__in=list(fac_techniques.keys())).annotate(
-        selected=Case(
-            When(pk=sel_fac, then=Value(1)),
-            default=Value(0), output_field=BooleanField()
-        )
-    ).order_by('name')
-    matrix = {
-        'cycle': cycle.pk if cycle else None,
+    start_date = cycle.start_date if cycle else date.today()
+    cycle_key = cycle.pk if cycle else start_date.isoformat()
+    scopes = ['facility-configs'] + ([f'cycle-submissions:{cycle.pk}'] if cycle else [])
+    cache_key = f'techniques-matrix:{cycle_key}:{version_tag(get_versions(*scopes))}'
+    matrix = cache.get(cache_key)
+    if matrix is None:
+        matrix = _build_techniques_matrix(cycle, start_date)
+        cache.set(cache_key, matrix, timeout=MATRIX_TIMEOUT)
+
+    sel_techs = {int(pk) for pk in sel_techs}
+    return {
+        'cycle': matrix['cycle'],
         'techniques': [
-            {
-                'id': t.pk,
-                'name': str(t),
-                'selected': t.selected,
-                'facilities': tech_facilities[t.pk]
-            }
-            for t in techs
+            {**entry, 'selected': entry['id'] in sel_techs} for entry in matrix['techniques']
         ],
         'facilities': [
-            {
-                'id': f.pk,
-                'name': str(f),
-                'selected': f.selected,
-                'techniques': fac_techniques[f.pk]
+            {**entry, 'selected': entry['id'] == sel_fac} for entry in matrix['facilities']
+        ],
+    }
+
+
+def role_matches(role: str, user_roles: set) -> bool:
+    """
+    Check a role against a set of compiled user roles without querying the database. Mirrors
+    has_any_role, a user role matches if it is the role itself or a sub-role of the form "<role>:<qualifier>".
+    :param role: the role to check
+    :param user_roles: lower-case roles of the user as returned by get_all_roles()
+    """
+    role = role.lower().strip()
+    return any(user_role == role or user_role.startswith(f'{role}:') for user_role in user_roles)
+
+
+def expand_facility_role(facility_pk: int, role: str, tree: dict) -> list[str]:
+    """
+    Expand a facility role for a facility using a pre-loaded facility tree. Equivalent to Facility.expand_role.
+    :param facility_pk: primary key of the facility
+    :param role: role string of the form <role>(:[+-*])?
+    :param tree: dictionary mapping facility primary keys to dictionaries with 'acronym', 'parent' and
+        'children' keys
+    """
+    acronym = tree[facility_pk]['acronym'].lower()
+    if m := re.match(r'^(?P<role>[\w_-]+)(?::(?P<wildcard>[+*-]))?$', role):
+        name, wildcard = m.group('role'), m.group('wildcard')
+        if wildcard == '+':
+            pending, trace = [facility_pk], []
+            while pending:
+                pk = pending.pop(0)
+                trace.append(pk)
+                pending.extend(tree[pk]['children'])
+            return [f"{name}:{tree[pk]['acronym'].lower()}" for pk in trace]
+        elif wildcard == '-':
+            trace, pk = [], facility_pk
+            while pk is not None:
+                trace.append(pk)
+                pk = tree[pk]['parent']
+            return [f"{name}:{tree[pk]['acronym'].lower()}" for pk in trace]
+        elif wildcard == '*':
+            return [f"{name}:{acronym}"]
+    return [role.format(acronym)]
+
+
+def evaluate_submission(user, cycle, requirements: list[dict]) -> dict:
+    """
+    Evaluate the eligibility of a proposal's facility requirements for submission to a cycle by a user. All
+    tracks, access pools, facility configurations and the facility tree are loaded in a fixed number of queries
+    regardless of the number of requirements or pools, and the user's compiled roles are matched in memory.
+
+    :param user: the submitting user
+    :param cycle: the target ReviewCycle
+    :param requirements: list of dictionaries with 'facility' and 'techniques' keys
+    :return: dictionary with the following keys
+        - 'requests': all requested configuration items
+        - 'available': mapping of access pools to tracks, with the score, matched and missing requests and the
+          configuration items available through each track
+        - 'checks': one entry per requirement, with the facility, the configuration used, the requested items,
+          and the pools available to the user for the facility
+    """
+    from beamlines.models import Facility
+    from proposals import models
+
+    today = timezone.now().date()
+    if cycle.is_open():
+        require_call = True
+    elif cycle.is_closed() and cycle.end_date > today:
+        require_call = False
+    else:
+        require_call = None  # no tracks available
+
+    requested = defaultdict(set)
+    for req in requirements:
+        if req.get('facility'):
+            requested[int(req['facility'])].update(int(pk) for pk in req.get('techniques', []) if pk)
+
+    # the latest configuration accepting proposals for each facility, as selected by get_for_cycle
+    configs = {}
+    for config in models.FacilityConfig.objects.filter(
+        Q(cycle=cycle) | Q(start_date__lte=cycle.start_date), facility__in=requested, accept=True
+    ).order_by('start_date', 'pk'):
+        configs[config.facility_id] = config
+
+    items = models.ConfigItem.objects.filter(
+        config__in=list(configs.values())
+    ).select_related('technique', 'track', 'config__facility')
+    pools = list(models.AccessPool.objects.all())
+    pool_tracks = defaultdict(set)
+    for pool_id, track_id in models.AccessPool.tracks.through.objects.values_list('accesspool', 'reviewtrack'):
+        pool_tracks[pool_id].add(track_id)
+    tree = {
+        pk: {'acronym': acronym, 'parent': parent, 'children': []}
+        for pk, acronym, parent in Facility.objects.values_list('pk', 'acronym', 'parent')
+    }
+    for pk, info in tree.items():
+        if info['parent'] is not None:
+            tree[info['parent']]['children'].append(pk)
+    user_roles = user.get_all_roles()
+
+    # check each requirement against the configuration, and each pool against the user's roles
+    requests = []
+    checks = []
+    pool_techniques = defaultdict(list)
+    for item in items:
+        facility_pk = item.config.facility_id
+        if item.technique_id in requested[facility_pk]:
+            requests.append(item)
+    for facility_pk, technique_ids in requested.items():
+        facility_items = [item for item in requests if item.config.facility_id == facility_pk]
+        eligible = [
+            pool for pool in pools
+            if pool.role in [None, ''] or any(
+                role_matches(role, user_roles) for role in expand_facility_role(facility_pk, pool.role, tree)
+            )
+        ] if facility_pk in tree else []
+        checks.append({
+            'facility': facility_pk,
+            'config': configs.get(facility_pk),
+            'requested': technique_ids,
+            'items': facility_items,
+            'pools': eligible,
+        })
+        for pool in eligible:
+            pool_techniques[pool].extend(
+                item for item in facility_items
+                if item.track.require_call == require_call and item.track_id in pool_tracks[pool.pk]
+            )
+
+    # Now we have all the techniques requested by the proposal mapped to the pools the user has access to
+    # Now we need to get the available tracks
+    distinct_requests = {(item.technique.acronym, item.config.facility.acronym) for item in requests}
+    available = defaultdict(dict)
+    for pool in pools:
+        track_items = defaultdict(list)
+        for item in pool_techniques.get(pool, []):
+            track_items[item.track].append(item)
+        for track, track_techniques in track_items.items():
+            track_techs = {(item.technique.acronym, item.config.facility.acronym) for item in track_techniques}
+            track_matches = len(distinct_requests & track_techs)
+            available[pool][track] = {
+                'score': 100 * track_matches / len(distinct_requests) if distinct_requests else 0,
+                'matched': track_techs,
+                'techniques': track_techniques,
+                'missing': distinct_requests - track_techs,
             }
-            for f in facilities
-        ]
+
+    return {
+        'requests': requests,
+        'available': dict(available),
+        'checks': checks,
     }
-    return matrix
 
 
 def notify_reviewers(reviews):
@@ -7,7 +7,7 @@ from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.messages.views import SuccessMessageMixin
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Q, Prefetch
 from django.http import HttpResponseRedirect, JsonResponse, Http404
 from django.template.defaultfilters import pluralize
 from django.urls import reverse_lazy, reverse
@@ -26,14 +26,15 @@ from misc.models import ActivityLog
 from misc.utils import get_code_generator
 from misc.views import ClarificationResponse, RequestClarification
 from notifier import notify
-from publications.models import SubjectArea
 from roleperms.views import RolePermsViewMixin
+from scheduler.utils import touch_versions
 from users.models import User
 from . import forms
 from . import models
 from . import utils
 from .filters import CycleFilterFactory
 from .models import ReviewType, Submission
+from .search import ProposalSearchMixin
 from .templatetags import proposal_tags
 
 USO_ADMIN_ROLES = getattr(settings, "USO_ADMIN_ROLES", ['admin:uso'])
@@ -66,13 +67,13 @@ def _fmt_role(role, obj=None):
         return name.replace('-', ' ').title()
 
 
-class UserProposalList(RolePermsViewMixin, ItemListView):
+class UserProposalList(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Proposal
     template_name = "proposals/proposal-list.html"
     list_columns = ['code', 'title', 'state', 'created']
     list_filters = ['state', 'modified', 'created']
     list_transforms = {'state': _state_lbl, }
-    list_search = ['title', 'areas__name', 'keywords', 'code', 'details']
+    list_search = ['code']
     ordering = ['state', '-modified']
     list_title = 'My Proposals'
     paginate_by = 25
@@ -87,16 +88,15 @@ class UserProposalList(RolePermsViewMixin, ItemListView):
                 Q(delegate_username=self.request.user.username)
         )
 
-        if self.request.user.email:
-            flts |= Q(team__icontains=self.request.user.email)
-        if self.request.user.alt_email:
-            flts |= Q(team__icontains=self.request.user.alt_email)
+        emails = {email.strip().lower() for email in [self.request.user.email, self.request.user.alt_email] if email}
+        if emails:
+            flts |= Q(pk__in=models.ProposalMember.objects.filter(email__in=emails).values('proposal'))
 
         self.queryset = models.Proposal.objects.filter(flts)
         return super().get_queryset(*args, **kwargs)
 
 
-class ProposalList(RolePermsViewMixin, ItemListView):
+class ProposalList(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Proposal
     template_name = "item-list.html"
     list_title = 'All Draft Proposals'
@@ -104,7 +104,7 @@ class ProposalList(RolePermsViewMixin, ItemListView):
     list_columns = ['code', 'title', 'spokesperson', 'state']
     list_filters = ['state', 'modified', 'created']
     list_transforms = {'state': _state_lbl, }
-    list_search = ['title', 'areas__name', 'keywords', 'code', 'details']
+    list_search = ['code']
     ordering = ['state', 'created']
     paginate_by = 15
 
@@ -131,7 +131,7 @@ class FacilityDraftProposals(ProposalList):
         queryset = super().get_queryset(*args, **kwargs)
         facility = Facility.objects.filter(acronym__iexact=self.kwargs['slug']).first()
         self.queryset = queryset.filter(state=models.Proposal.STATES.draft).filter(
-            details__beamline_reqs__contains=[{'facility': facility.pk}]
+            facilities=facility
         )
         return self.queryset
 
@@ -226,11 +226,9 @@ class EditProposal(RolePermsViewMixin, DynUpdateView):
 
     def form_valid(self, form):
         data = form.cleaned_data
-        subject_areas = data['details'].get('subject', {})
-        areas = SubjectArea.objects.filter(pk__in=subject_areas.get('areas', []))
-        self.object.areas.set(areas)
-        self.object.save()
-        self.queryset.filter(pk=self.object.pk).update(**data)
+        for field, value in data.items():
+            setattr(self.object, field, value)
+        self.object.save()  # derived members, facilities and areas are synchronized on save
         messages.success(self.request, 'Draft proposal was saved successfully')
         self.form_action = form.cleaned_data['details']['form_action']
         ActivityLog.objects.log(
@@ -313,58 +311,10 @@ class SubmitProposal(RolePermsViewMixin, ModalUpdateView):
         :return:
         """
 
-        user = self.request.user
         requirements = self.object.details['beamline_reqs']
         cycle = models.ReviewCycle.objects.get(pk=self.object.details['first_cycle'])
-        if cycle.is_open():
-            flt = Q(track__require_call=True)
-        elif cycle.is_closed() and cycle.end_date > timezone.now().date():
-            flt = Q(track__require_call=False)
-        else:
-            flt = Q(pk__isnull=True)  # no tracks available
-
-        # initialize pool -> techniques mapping
-        pool_techniques = {
-            pool: models.ConfigItem.objects.none()
-            for pool in models. AccessPool.objects.all()
-        }
-
-        # Loop through requirements and gather the requested techniques for each pool
-        # for which the user has a matching role, or no role is defined
-        requests = models.ConfigItem.objects.none()
-        for req in requirements:
-            config = models.FacilityConfig.objects.for_facility(req.get('facility')).get_for_cycle(cycle)
-            if config:
-                techniques = config.items.filter(technique__in=req.get('techniques', []))
-                requests |= techniques
-
-                # map pools to techniques for easy lookup later
-                for pool in models.AccessPool.objects.all():
-                    if pool.role in [None, ''] or user.has_any_role(*config.facility.expand_role(pool.role)):
-                        pool_techniques[pool] |= techniques.filter(flt & Q(track__pools=pool))
-
-        # Now we have all the techniques requested by the proposal mapped to the pools the user has access to
-        # Now we need to get the available tracks
-        distinct_requests = set(requests.values_list('technique__acronym', 'config__facility__acronym'))
-        available_requests = defaultdict(dict)
-        tracks = models.ReviewTrack.objects.in_bulk()
-        for pool, techniques in pool_techniques.items():
-            if not techniques.exists():
-                continue
-
-            for t in techniques.values_list('track__pk', flat=True).distinct():
-                track_techniques = techniques.filter(track=t)
-                track_techs = set(
-                    track_techniques.values_list('technique__acronym', 'config__facility__acronym')
-                )
-                track_matches = len(distinct_requests & track_techs)
-                track_score = 100 * track_matches / len(distinct_requests) if distinct_requests else 0
-                available_requests[pool][tracks[t]] = {
-                    'score': track_score,
-                    'matched': track_techs,
-                    'techniques': track_techniques,
-                    'missing': distinct_requests - track_techs,
-                }
+        evaluation = utils.evaluate_submission(self.request.user, cycle, requirements)
+        available_requests = evaluation['available']
 
         # determine if any pools are available
         available_pools = list(available_requests.keys())
@@ -386,8 +336,9 @@ class SubmitProposal(RolePermsViewMixin, ModalUpdateView):
         pool_ids = [p.pk for p in available_pools]
         info = {
             "message": mark_safe(message),
-            "requests": requests,
-            "available": dict(available_requests),
+            "requests": evaluation['requests'],
+            "available": available_requests,
+            "checks": evaluation['checks'],
             "cycle": cycle,
             'pools': models.AccessPool.objects.filter(pk__in=pool_ids),
         }
@@ -716,6 +667,8 @@ class EditReview(RolePermsViewMixin, DynUpdateView):
 
         queryset = self.get_queryset()
         queryset.filter(pk=self.object.pk).update(**data)
+        if isinstance(self.object.reference, models.Submission):
+            models.SubmissionScore.refresh(self.object.reference)
         messages.success(self.request, activity_description)
         ActivityLog.objects.log(self.request, self.object, kind=activity_type, description=activity_description)
 
@@ -966,6 +919,7 @@ class EditConfig(RolePermsViewMixin, ModalUpdateView):
         # save configuration
         data['modified'] = timezone.localtime(timezone.now())
         models.FacilityConfig.objects.filter(pk=self.object.pk).update(**data)
+        touch_versions('facility-configs')  # bulk writes and updates do not send the signals which invalidate caches
         msg = f"Configuration modified. {len(to_delete)} techniques deleted, {len(new_items)} added."
         messages.success(
             self.request, msg
@@ -1026,6 +980,7 @@ class AddFacilityConfig(RolePermsViewMixin, ModalCreateView):
         # save configuration
         data['modified'] = timezone.localtime(timezone.now())
         models.FacilityConfig.objects.filter(pk=config.pk).update(**data)
+        touch_versions('facility-configs')  # bulk writes and updates do not send the signals which invalidate caches
         msg = f"New configuration with {len(new_items)} items added."
         messages.success(
             self.request, msg
@@ -1160,15 +1115,13 @@ def _fmt_submission_state(val, obj=None):
             return mark_safe('<i class="bi-patch-exclamation-fill text-danger"></i> Rejected')
 
 
-class SubmissionList(RolePermsViewMixin, ItemListView):
+class SubmissionList(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Submission
     template_name = "item-list.html"
     list_columns = ['title', 'code', 'spokesperson', 'cycle', 'pool', 'facilities', 'state']
     list_filters = ['created', 'state', 'track', 'pool', 'cycle']
-    list_search = [
-        'proposal__title', 'proposal__id', 'proposal__spokesperson__last_name', 'proposal__keywords',
-        'code', 'proposal__details'
-    ]
+    list_search = ['code', 'proposal__code']
+    search_path = 'proposal__'
     ordering = ['-cycle_id']
     list_title = 'Submitted Proposals'
     list_transforms = {
@@ -1266,11 +1219,12 @@ def _adjusted_score(val, obj=None):
         return ""
 
 
-class ReviewEvaluationList(RolePermsViewMixin, ItemListView):
+class ReviewEvaluationList(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Submission
     template_name = "item-list.html"
     list_filters = ['created', 'pool', 'techniques__config__facility']
-    list_search = ['proposal__title', 'proposal__code', 'proposal__team', 'proposal__keywords']
+    list_search = ['code', 'proposal__code']
+    search_path = 'proposal__'
     link_url = "submission-detail"
     ordering = ['proposal__id', '-cycle_id',]
     list_title = 'Review Evaluation'
@@ -1482,14 +1436,14 @@ class ReviewCompatibility(RolePermsViewMixin, detail.DetailView):
         return context
 
 
-class AssignedSubmissionList(RolePermsViewMixin, ItemListView):
+class AssignedSubmissionList(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Submission
     template_name = "proposals/assignment-list.html"
     paginate_by = 5
     list_columns = ['proposal', 'cycle', 'track', 'state']
     list_filters = ['created', 'state', 'track', 'cycle']
-    list_search = ['proposal__title', 'proposal__id', 'proposal__team', 'proposal__keywords',
-                   'proposal__spokesperson__last_name']
+    list_search = ['code', 'proposal__code']
+    search_path = 'proposal__'
     link_url = "submission-detail"
     list_styles = {'proposal': 'col-sm-6'}
     ordering = ['-cycle__start_date', '-created']
@@ -1497,9 +1451,18 @@ class AssignedSubmissionList(RolePermsViewMixin, ItemListView):
     allowed_roles = USO_ADMIN_ROLES
 
     def get_queryset(self, *args, **kwargs):
-        self.stage = models.ReviewStage.objects.get(pk=self.kwargs['stage'])
+        self.stage = models.ReviewStage.objects.select_related('kind').get(pk=self.kwargs['stage'])
         self.cycle = models.ReviewCycle.objects.get(pk=self.kwargs['cycle'])
-        self.queryset = self.cycle.submissions.filter(track=self.stage.track).all()
+        stage_reviews = models.Review.objects.filter(stage=self.stage).select_related(
+            'reviewer__reviewer__committee'
+        ).prefetch_related(
+            'reviewer__reviewer__techniques', 'reviewer__reviewer__areas'
+        ).order_by('reviewer__reviewer__committee')
+        self.queryset = self.cycle.submissions.filter(track=self.stage.track).select_related(
+            'proposal__spokesperson__institution'
+        ).prefetch_related(
+            'techniques', 'proposal__areas', Prefetch('reviews', queryset=stage_reviews, to_attr='stage_reviews')
+        )
         return super().get_queryset(*args, **kwargs)
 
     def get_context_data(self, **kwargs):
@@ -1509,14 +1472,14 @@ class AssignedSubmissionList(RolePermsViewMixin, ItemListView):
         return context
 
 
-class ReviewerAssignments(RolePermsViewMixin, ItemListView):
+class ReviewerAssignments(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Submission
     template_name = "item-list.html"
     paginate_by = 20
     list_columns = ['proposal', 'cycle', 'track', 'state']
     list_filters = ['created', 'state', 'track', 'cycle']
-    list_search = ['proposal__title', 'proposal__id', 'proposal__team', 'proposal__keywords',
-                   'proposal__spokesperson__last_name']
+    list_search = ['code', 'proposal__code']
+    search_path = 'proposal__'
     link_url = "submission-detail"
     list_styles = {'proposal': 'col-sm-6'}
     ordering = ['-cycle__start_date', '-created']
@@ -1546,14 +1509,14 @@ class ReviewerAssignments(RolePermsViewMixin, ItemListView):
         return f'{self.reviewer.user} ~ {self.cycle}'
 
 
-class PRCAssignments(RolePermsViewMixin, ItemListView):
+class PRCAssignments(RolePermsViewMixin, ProposalSearchMixin, ItemListView):
     model = models.Submission
     template_name = "item-list.html"
     paginate_by = 20
     list_columns = ['proposal', 'cycle', 'track', 'state']
     list_filters = ['created', 'state', 'track', 'cycle']
-    list_search = ['proposal__title', 'proposal__id', 'proposal__team', 'proposal__keywords',
-                   'proposal__spokesperson__last_name']
+    list_search = ['code', 'proposal__code']
+    search_path = 'proposal__'
     link_url = "submission-detail"
     list_styles = {'proposal': 'col-sm-6'}
     ordering = ['-cycle__start_date', '-created']
@@ -3,6 +3,11 @@ from . import api_views
 from . import models
 
 urlpatterns = [
+    path('feeds/publications/', api_views.PublicationFeedAPI.as_view(), name="api-publication-feed"),
+    path('feeds/publications/<str:facility>/', api_views.PublicationFeedAPI.as_view(),
+         name="api-facility-publication-feed"),
+    path('feeds/publications/<str:category>/<str:facility>/', api_views.PublicationFeedAPI.as_view(),
+         name="api-category-publication-feed"),
     path('publications/<str:facility>/', api_views.PublicationListAPI.as_view(model=models.Publication),
          name="api-publication-list"),
     path('publications/<str:facility>/latest/', api_views.RecentListAPI.as_view(model=models.Publication),
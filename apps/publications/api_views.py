@@ -1,7 +1,15 @@
+from django.conf import settings
+from django.db.models import Q
 from rest_framework import generics
 from rest_framework import serializers
-from django.db.models import Q
-from . import models
+from rest_framework.pagination import CursorPagination
+
+from scheduler.views import ConditionalFeedMixin
+from . import metrics, models
+from .citations import CITATION_STYLES
+
+FEED_PAGE_SIZE = getattr(settings, 'PUBLICATION_FEED_PAGE_SIZE', 50)
+FEED_MAX_AGE = getattr(settings, 'PUBLICATION_FEED_MAX_AGE', 300)
 
 
 class PublicationSerializer(serializers.ModelSerializer):
@@ -81,3 +89,62 @@ class CategoryListAPI(generics.ListAPIView):
         facility = self.kwargs['facility']
         flt = {'beamlines__acronym__icontains': facility}
         return self.model.objects.filter(**flt).values('kind').distinct()
+
+
+class FeedPagination(CursorPagination):
+    """
+    Keyset pagination of publication feeds, newest first. Each page continues from the date of the last entry
+    of the previous page, so the cost of a page does not grow with its position in the feed.
+    """
+    page_size = FEED_PAGE_SIZE
+    page_size_query_param = 'size'
+    max_page_size = 500
+    ordering = ('-date', '-id')
+
+
+class FeedSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    kind = serializers.CharField()
+    date = serializers.DateField()
+    code = serializers.CharField(allow_null=True)
+    cite = serializers.SerializerMethodField()
+    text = serializers.SerializerMethodField()
+
+    def get_citation(self, obj):
+        style = self.context['request'].GET.get('style', 'full')
+        return obj['citations'].get(style if style in CITATION_STYLES else 'full', {})
+
+    def get_cite(self, obj):
+        return self.get_citation(obj).get('html', '')
+
+    def get_text(self, obj):
+        return self.get_citation(obj).get('text', '')
+
+
+class PublicationFeedAPI(ConditionalFeedMixin, generics.ListAPIView):
+    """
+    Feed of publications with their stored citations, optionally limited to a facility and a category.
+    Pages are selected with the `cursor` parameter returned in the `next` and `previous` links, the `size`
+    parameter sets the number of entries per page and the `style` parameter selects the citation style.
+    Responses carry validators so that clients and proxies can revalidate them cheaply.
+    """
+    serializer_class = FeedSerializer
+    pagination_class = FeedPagination
+    model = models.Publication
+
+    def get_version_scopes(self):
+        return [metrics.VERSION_SCOPE]
+
+    def get_queryset(self):
+        facility = self.kwargs.get('facility')
+        category = self.kwargs.get('category')
+        queryset = metrics.beamline_publications(facility) if facility else models.Publication.objects.all()
+        if category:
+            queryset = queryset.filter(kind__iexact=category)
+        return queryset.values('id', 'kind', 'date', 'code', 'citations')
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.headers['Cache-Control'] = f'public, max-age={FEED_MAX_AGE}'
+        return response
+
@@ -21,6 +21,9 @@ def title_case(text: str ) -> str:
 class PublicationsBlock(BaseBlock):
     block_type = BLOCK_TYPES.dashboard
     template_name = "publications/blocks/publications.html"
+    lazy = True
+    cache_timeout = 900
+    cache_scopes = ('publications',)
     priority = 4
 
     def get_context_data(self):
@@ -0,0 +1,238 @@
+"""
+Offline transports for the harvesting client. A Cassette records real responses to a JSON file once and replays
+them deterministically afterward. A SyntheticSource generates plausible Crossref, OpenCitations, Event Data and
+PDB responses for any identifier, for tests and benchmarks which need large result sets.
+
+Both are passed to HarvestClient as the `transport`:
+
+    with Cassette('publications.json', record=True) as cassette:
+        client = HarvestClient(cache=False, transport=cassette)
+        create_publications(dois, client=client)
+"""
+
+import base64
+import json
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit, unquote
+
+from .httpcache import STORED_HEADERS, build_response, make_key
+
+
+class CassetteMiss(LookupError):
+    """
+    Raised when replaying a request which was not recorded
+    """
+
+
+class Cassette:
+    """
+    Records and replays HTTP interactions keyed by method, URL, parameters and body.
+
+    :param path: path of the JSON cassette file
+    :param record: fetch and record requests missing from the cassette, otherwise missing requests raise
+        CassetteMiss
+    """
+
+    def __init__(self, path: str | Path, record: bool = False):
+        self.path = Path(path)
+        self.record = record
+        self.lock = threading.Lock()
+        self.changed = False
+        self.interactions = json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.save()
+
+    def __len__(self):
+        return len(self.interactions)
+
+    def save(self):
+        """
+        Write the cassette to disk if new interactions were recorded
+        """
+        with self.lock:
+            if self.changed:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.path.write_text(json.dumps(self.interactions, indent=1, sort_keys=True))
+                self.changed = False
+
+    def add(self, key: str, method: str, url: str, response):
+        content = response.content
+        try:
+            body = {'text': content.decode('utf-8')}
+        except UnicodeDecodeError:
+            body = {'base64': base64.b64encode(content).decode()}
+        with self.lock:
+            self.interactions[key] = {
+                'method': method.upper(),
+                'url': urlsplit(url)._replace(query='').geturl(),  # query strings may hold API keys
+                'status': response.status_code,
+                'headers': {name: response.headers[name] for name in STORED_HEADERS if name in response.headers},
+                **body,
+            }
+            self.changed = True
+
+    def play(self, key: str):
+        with self.lock:
+            entry = self.interactions.get(key)
+        if entry is None:
+            return None
+        body = entry['text'].encode('utf-8') if 'text' in entry else base64.b64decode(entry['base64'])
+        return build_response(entry['url'], entry['status'], entry['headers'], body)
+
+    def wrap(self, send):
+        def replay(method: str, url: str, **kwargs):
+            key = make_key(method, url, kwargs.get('params'), kwargs.get('json', kwargs.get('data')))
+            response = self.play(key)
+            if response is not None:
+                return response
+            if not self.record:
+                raise CassetteMiss(f'No recorded response for {method} {url}')
+            response = send(method, url, **kwargs)
+            self.add(key, method, url, response)
+            return response
+        return replay
+
+
+class SyntheticSource:
+    """
+    Generates deterministic responses for publication sources. Every identifier resolves to a record derived
+    from the seed and the identifier alone, so results do not depend on the order of requests.
+
+    :param seed: random seed
+    :param journals: number of distinct journals which works are published in
+    :param latency: simulated network latency of each request in seconds
+    """
+    DOI_PREFIX = '10.99999/synthetic'
+    WORDS = (
+        'crystal structure protein synchrotron diffraction imaging spectroscopy catalyst membrane enzyme soil '
+        'battery polymer nanoparticle thin film magnetic oxide complex binding dynamics in situ high pressure'
+    ).split()
+    NAMES = ['Smith', 'Nguyen', 'Garcia', 'Chen', 'Okafor', 'Müller', 'Kowalski', 'Tanaka', 'Silva', 'Dubois']
+
+    def __init__(self, seed: int = 0, journals: int = 50, latency: float = 0.0):
+        self.seed = seed
+        self.journals = journals
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def dois(self, count: int, start: int = 0) -> list[str]:
+        return [f'{self.DOI_PREFIX}.{i:07d}' for i in range(start, start + count)]
+
+    def pdb_codes(self, count: int, start: int = 0) -> list[str]:
+        return [f'S{i:03X}' for i in range(start, start + count)]
+
+    def rng(self, *identifiers) -> random.Random:
+        return random.Random(':'.join(str(item) for item in (self.seed, *identifiers)))
+
+    def issn(self, index: int) -> str:
+        return f'{9000 + index:04d}-{index % 10000:04d}'
+
+    def journal(self, issn: str) -> dict:
+        index = int(issn.split('-')[1])
+        rng = self.rng('journal', index)
+        words = rng.sample(self.WORDS, 2)
+        return {
+            'title': f'Journal of {words[0].title()} {words[1].title()}',
+            'ISSN': [issn],
+            'publisher': f'Publisher {index % 7}',
+            'subjects': [{'name': word.title(), 'ASJC': 1000 + rng.randint(0, 999)} for word in words],
+        }
+
+    def work(self, doi: str) -> dict:
+        rng = self.rng('work', doi)
+        year = rng.randint(2000, 2024)
+        journal = self.journal(self.issn(rng.randrange(self.journals)))
+        return {
+            'DOI': doi,
+            'type': 'journal-article',
+            'title': [' '.join(rng.sample(self.WORDS, 6)).capitalize()],
+            'author': [
+                {
+                    'family': rng.choice(self.NAMES), 'given': chr(65 + rng.randrange(26)),
+                    'affiliation': [{'name': f'Institute {rng.randrange(20)}'}],
+                }
+                for i in range(rng.randint(1, 8))
+            ],
+            'published-online': {'date-parts': [[year, rng.randint(1, 12), rng.randint(1, 28)]]},
+            'created': {'date-parts': [[year, 1, 1]]},
+            'ISSN': journal['ISSN'],
+            'container-title': [journal['title']],
+            'short-container-title': [journal['title'][:20]],
+            'publisher': journal['publisher'],
+            'volume': str(rng.randint(1, 200)),
+            'issue': str(rng.randint(1, 12)),
+            'page': f'{rng.randint(1, 900)}-{rng.randint(901, 999)}',
+            'funder': [{'name': f'Funder {i}', 'DOI': f'10.13039/synthetic.{i}'} for i in rng.sample(range(10), 2)],
+        }
+
+    def citations(self, doi: str) -> list[dict]:
+        rng = self.rng('citations', doi)
+        return [
+            {'creation': f'{rng.randint(2015, 2024)}-{rng.randint(1, 12):02d}-01',
+             'author_sc': 'yes' if rng.random() < 0.1 else 'no'}
+            for i in range(rng.randint(0, 40))
+        ]
+
+    def events(self, doi: str) -> dict:
+        rng = self.rng('events', doi)
+        events = [{'timestamp': f'{rng.randint(2015, 2024)}-01-01T00:00:00Z'} for i in range(rng.randint(0, 10))]
+        return {'message': {'events': events, 'total-results': len(events), 'next-cursor': None}}
+
+    def pdb_entry(self, code: str) -> dict:
+        rng = self.rng('pdb', code)
+        year = rng.randint(2000, 2024)
+        return {
+            'rcsb_id': code,
+            'struct': {'title': ' '.join(rng.sample(self.WORDS, 5)).capitalize()},
+            'rcsb_accession_info': {
+                'initial_release_date': f'{year}-{rng.randint(1, 12):02d}-01T00:00:00Z',
+                'deposit_date': f'{year}-01-01T00:00:00Z',
+            },
+            'rcsb_entry_info': {'diffrn_resolution_high': {'provenance_source': 'Depositor', 'value': 1.5}},
+            'diffrn_detector': [{'pdbx_collection_date': f'{year}-01-01T00:00:00Z'}],
+            'diffrn_source': [{'pdbx_synchrotron_beamline': 'BL-1', 'pdbx_synchrotron_site': 'SYNTHETIC'}],
+            'rcsb_primary_citation': {
+                'rcsb_authors': [f'{rng.choice(self.NAMES)}, {chr(65 + rng.randrange(26))}.'],
+                'pdbx_database_id_DOI': rng.choice([None, *self.dois(1, start=rng.randrange(1000))]),
+                'year': year,
+            },
+        }
+
+    def respond(self, method: str, url: str, params: dict = None, body=None) -> tuple[int, object]:
+        """
+        Generate the status and JSON content of a response
+        """
+        path = unquote(urlsplit(url).path)
+        if match := re.search(r'/works/(.+)$', path):
+            return 200, {'status': 'ok', 'message': self.work(match.group(1))}
+        if match := re.search(r'/journals/(.+)$', path):
+            return 200, {'status': 'ok', 'message': self.journal(match.group(1))}
+        if match := re.search(r'/citations/doi:(.+)$', path):
+            return 200, self.citations(match.group(1))
+        if 'events' in path and params and params.get('obj-id'):
+            return 200, self.events(params['obj-id'])
+        if 'graphql' in path and isinstance(body, dict):
+            codes = re.findall(r'"([^"]+)"', body.get('query', '').split('entry_ids:', 1)[-1].split(']', 1)[0])
+            return 200, {'data': {'entries': [self.pdb_entry(code) for code in codes]}}
+        return 404, {}
+
+    def wrap(self, send):
+        def synthesize(method: str, url: str, **kwargs):
+            with self.lock:
+                self.requests += 1
+            if self.latency:
+                time.sleep(self.latency)
+            status, content = self.respond(
+                method, url, kwargs.get('params'), kwargs.get('json', kwargs.get('data'))
+            )
+            return build_response(url, status, {'Content-Type': 'application/json'}, json.dumps(content).encode())
+        return synthesize
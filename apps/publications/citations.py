@@ -0,0 +1,94 @@
+"""
+Formatted citations of publications. Citations are rendered once when a publication is saved and stored with
+the publication, as HTML and as plain text for each of the supported styles, so that lists and feeds can serve
+them without formatting every row on each request.
+
+Styles:
+    full: authors, year, title, source and identifier
+    short: as full, with titles longer than SHORT_TITLE_LENGTH characters truncated
+"""
+
+import html
+import re
+
+CITATION_STYLES = ('full', 'short')
+SHORT_TITLE_LENGTH = 70
+MAX_AUTHORS = 5
+TAGS = re.compile(r'<[^<]*?>')
+SPACES = re.compile(r'\s+')
+
+
+def abbrev_authors(authors) -> str:
+    """
+    Author list of a citation, truncated to the first MAX_AUTHORS authors
+    """
+    authors = authors or []
+    if len(authors) < MAX_AUTHORS:
+        return "; ".join(authors)
+    return "; ".join(authors[:MAX_AUTHORS]) + " et al."
+
+
+def render_citation(pub, journal: str = None, style: str = 'full') -> str:
+    """
+    HTML citation of a publication in the given style
+    :param pub: publication or any object with the same fields
+    :param journal: title of the journal, if any
+    :param style: one of CITATION_STYLES
+    """
+    title = pub.title or ''
+    if style == 'short' and len(title) > SHORT_TITLE_LENGTH:
+        title = title[:SHORT_TITLE_LENGTH] + ' ...'
+    parts = [f"{abbrev_authors(pub.authors)} ({pub.date.year}). {title}"]
+    issue = f'({pub.issue})' if pub.issue else ''
+    pages = f', {pub.pages}' if pub.pages else ''
+    volume = f'{pub.volume}' if pub.volume else ''
+    address = f', {pub.address}' if pub.address else ''
+    publisher = f'{pub.publisher}{address}' if pub.publisher else ''
+    main_title = f'<em>{pub.main_title}</em>' if pub.main_title else ''
+    edition = f'({pub.edition})' if pub.edition else ''
+    editors = f"{pub.editors} (Eds.)" if pub.editors else ''
+    supervisor = f"{pub.editors} (Sup.) " if pub.editors else ''
+
+    if pub.kind in ['article', 'proceeding', 'magazine']:
+        if journal:
+            parts.append(f"<em>{journal}</em> {volume}{issue}{pages}")
+        else:
+            parts.append(f"{publisher} {volume}{edition}{pages}")
+    elif pub.kind == 'pdb':
+        parts.append("Protein Data Bank")
+    elif pub.kind == 'patent':
+        parts.append("Patent")
+    elif pub.kind == 'book':
+        parts.append(f"{publisher}")
+    elif pub.kind == 'msc_thesis':
+        parts.append("Masters Thesis")
+        parts.append(f"{supervisor}{publisher}")
+    elif pub.kind == 'phd_thesis':
+        parts.append('Doctoral Dissertation')
+        parts.append(f"{supervisor}{publisher}")
+    elif pub.kind == 'chapter':
+        parts.append(f"In {editors}{main_title}{pages}, {publisher}")
+    if pub.code:
+        parts.append(pub.code)
+    return '. '.join(parts)
+
+
+def plain_text(text: str) -> str:
+    """
+    Plain text version of an HTML citation
+    """
+    return SPACES.sub(' ', html.unescape(TAGS.sub('', text))).strip()
+
+
+def render_citations(pub, journal: str = None) -> dict:
+    """
+    Citations of a publication in all supported styles
+    :param pub: publication or any object with the same fields
+    :param journal: title of the journal, if any
+    :return: dictionary mapping each style to a dictionary with 'html' and 'text' entries
+    """
+    citations = {}
+    for style in CITATION_STYLES:
+        text = render_citation(pub, journal=journal, style=style)
+        citations[style] = {'html': text, 'text': plain_text(text)}
+    return citations
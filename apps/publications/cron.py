@@ -9,22 +9,28 @@ from . import utils
 
 class FetchPDBEntries(BaseCronJob):
     """
-    Fetch the latest Deposition data from the PDB and update the local database.
+    Fetch the latest Deposition data from the PDB and update the local database. Interrupted runs are resumed
+    from their last checkpoint.
     """
     run_every = "P10D"
     pdb_codes: list[str] = []
 
     def is_ready(self):
+        from .models import SyncCheckpoint
+        if SyncCheckpoint.objects.filter(name=utils.PDB_SYNC_NAME).exists():
+            self.pdb_codes = []
+            return True
         self.pdb_codes = utils.fetch_pdb_codes()
         return len(self.pdb_codes) > 0
 
     def do(self):
-        # create PDB depositions
-        entries = utils.fetch_pdb_entries(self.pdb_codes)
-        out = utils.create_pdb_entries(entries)
+        # create or update PDB depositions
+        out = utils.sync_pdb_entries(self.pdb_codes or None)
         logs = [
-            f'Fetched {out["created"]} new PDB entries",'
-            f'Updated {out["updated"]} existing entries.'
+            f'Fetched {out["pages"]} pages of PDB entries{", resuming an interrupted run" if out["resumed"] else ""}.',
+            f'Created {out["created"]} new PDB entries.',
+            f'Updated {out["updated"]} existing entries.',
+            f'Added {out["linked"]} beamline links.',
         ]
         return '\n'.join(logs)
 
@@ -52,7 +58,7 @@ class UpdatePDBReferences(BaseCronJob):
 
 class UpdateArticleMetrics(BaseCronJob):
     """
-    Fetch the latest citation counts for articles published in the current month.
+    Fetch the latest citation counts and mentions for all articles whose metrics are missing or out of date.
     """
     run_every = "P7D"
 
@@ -63,7 +69,8 @@ class UpdateArticleMetrics(BaseCronJob):
         out = utils.update_publication_metrics()
         logs = [
             f'Updated {out["updated"]} article metrics.',
-            f'Created {out["created"]} new metrics for articles.'
+            f'Created {out["created"]} new metrics for articles.',
+            f'Failed to fetch metrics for {out["failed"]} articles.'
         ]
         return '\n'.join(logs)
 
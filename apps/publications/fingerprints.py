@@ -0,0 +1,200 @@
+"""
+Normalized fingerprints of publications used to detect duplicates. Identifiers such as DOIs are compared
+case-insensitively without resolver prefixes, titles are compared after removing accents, markup, punctuation
+and case. Both fingerprints are stored in indexed columns so that exact duplicates can be found without
+scanning the table.
+
+Author names are reduced to a normalized surname and the initials of the given names so that publications can be
+matched to users through an indexed table.
+
+Near-duplicates are found by clustering titles whose character n-grams are similar. Candidate pairs are
+generated with prefix filtering, so only pairs sharing at least one of their rarest n-grams are compared.
+"""
+
+import hashlib
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Iterable, NamedTuple
+
+CODE_PREFIX = re.compile(r'^(https?://(dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+MARKUP = re.compile(r'<[^>]+>')
+NON_WORD = re.compile(r'[\W_]+')
+NGRAM_SIZE = 3
+SIMILARITY_THRESHOLD = 0.85
+MAX_YEAR_GAP = 1  # maximum difference in publication year between title duplicates
+
+
+def normalize_code(code: str | None) -> str | None:
+    """
+    Normalize a DOI or other publication identifier
+    """
+    code = CODE_PREFIX.sub('', (code or '').strip()).strip().lower()
+    return code or None
+
+
+def normalize_title(title: str | None) -> str:
+    """
+    Reduce a title to lower-case ASCII words separated by single spaces
+    """
+    text = unicodedata.normalize('NFKD', MARKUP.sub(' ', title or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return NON_WORD.sub(' ', text.lower()).strip()
+
+
+def code_fingerprint(code: str | None) -> str | None:
+    """
+    Fingerprint of an identifier, the normalized identifier itself
+    """
+    return normalize_code(code)
+
+
+def title_fingerprint(title: str | None) -> str | None:
+    """
+    Fingerprint of a title, a SHA-1 digest of the normalized title
+    """
+    text = normalize_title(title)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest() if text else None
+
+
+def parse_author(name: str) -> tuple[str, str] | None:
+    """
+    Split an author name written as "Surname, Given Names" or "Given Names Surname" into a normalized surname
+    and the lower-case initials of the given names, e.g. "García-López, J. Alberto" gives ("garcia lopez", "ja")
+    :param name: author name
+    :return: (surname, initials) tuple or None if the name has no surname
+    """
+    if ',' in name:
+        surname, given = name.split(',', 1)
+    else:
+        parts = name.split()
+        surname, given = (parts[-1], ' '.join(parts[:-1])) if parts else ('', '')
+    surname = normalize_title(surname)
+    return (surname, given_initials(given)) if surname else None
+
+
+def given_initials(names: str | None) -> str:
+    """
+    Lower-case initials of given names, e.g. "Jean-Paul A." gives "jpa"
+    """
+    return ''.join(word[0] for word in normalize_title(names).split())
+
+
+def author_list(authors) -> list[str]:
+    """
+    List of author names from a publication author list, which may also be a semicolon separated string
+    """
+    if isinstance(authors, str):
+        authors = authors.split(';')
+    return [name.strip() for name in authors or [] if isinstance(name, str) and name.strip()]
+
+
+def ngrams(text: str, size: int = NGRAM_SIZE) -> set[str]:
+    """
+    Set of character n-grams of a normalized text
+    """
+    text = f' {text} '
+    return {text[i:i + size] for i in range(max(1, len(text) - size + 1))}
+
+
+def similarity(first: set, second: set) -> float:
+    """
+    Jaccard similarity of two n-gram sets
+    """
+    if not first or not second:
+        return 0.0
+    common = len(first & second)
+    return common / (len(first) + len(second) - common)
+
+
+class Record(NamedTuple):
+    pk: int
+    code: str | None     # code fingerprint
+    title: str           # normalized title
+    year: int | None
+
+
+class Clusters:
+    """
+    Union-find structure over records which never joins two groups holding different identifiers
+    """
+
+    def __init__(self, records: list[Record]):
+        self.parent = {record.pk: record.pk for record in records}
+        self.codes = {record.pk: {record.code} if record.code else set() for record in records}
+
+    def find(self, pk):
+        while self.parent[pk] != pk:
+            self.parent[pk] = self.parent[self.parent[pk]]
+            pk = self.parent[pk]
+        return pk
+
+    def union(self, first, second) -> bool:
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return True
+        if self.codes[first] and self.codes[second] and self.codes[first] != self.codes[second]:
+            return False
+        first, second = sorted([first, second])
+        self.parent[second] = first
+        self.codes[first] |= self.codes.pop(second)
+        return True
+
+    def groups(self) -> list[list[int]]:
+        members = defaultdict(list)
+        for pk in self.parent:
+            members[self.find(pk)].append(pk)
+        return sorted(sorted(group) for group in members.values() if len(group) > 1)
+
+
+def find_duplicates(records: Iterable[Record], threshold: float = SIMILARITY_THRESHOLD,
+                    size: int = NGRAM_SIZE) -> list[list[int]]:
+    """
+    Cluster records which share an identifier, or whose titles have an n-gram similarity of at least
+    `threshold` and were published within a year of each other. Records without a year are only compared with
+    each other. Records with different identifiers are never placed in the same cluster.
+
+    :param records: Record tuples
+    :param threshold: minimum Jaccard similarity of title n-grams
+    :param size: n-gram size
+    :return: list of clusters, each a sorted list of primary keys with at least two members
+    """
+    records = list(records)
+    clusters = Clusters(records)
+
+    # exact duplicates by identifier
+    by_code = defaultdict(list)
+    for record in records:
+        if record.code:
+            by_code[record.code].append(record.pk)
+    for pks in by_code.values():
+        for pk in pks[1:]:
+            clusters.union(pks[0], pk)
+
+    # near duplicates by title, using prefix filtering on n-grams ordered from rarest to most common
+    grams = {record.pk: ngrams(record.title, size) for record in records if record.title}
+    frequency = defaultdict(int)
+    for items in grams.values():
+        for gram in items:
+            frequency[gram] += 1
+    rank = {gram: i for i, gram in enumerate(sorted(frequency, key=lambda gram: (frequency[gram], gram)))}
+
+    index = defaultdict(list)  # records keyed by n-gram and year
+    for record in sorted(records, key=lambda item: len(grams.get(item.pk, ()))):
+        items = grams.get(record.pk)
+        if not items:
+            continue
+        ordered = sorted(items, key=rank.__getitem__)
+        prefix = ordered[:len(ordered) - math.ceil(threshold * len(ordered)) + 1]
+        years = [None] if record.year is None else range(record.year - MAX_YEAR_GAP, record.year + MAX_YEAR_GAP + 1)
+        candidates = {pk for gram in prefix for year in years for pk in index[(gram, year)]}
+        for pk in candidates:
+            if len(grams[pk]) < threshold * len(items):
+                continue
+            if similarity(items, grams[pk]) >= threshold:
+                clusters.union(pk, record.pk)
+        for gram in prefix:
+            index[(gram, record.year)].append(record.pk)
+
+    return clusters.groups()
@@ -0,0 +1,230 @@
+"""
+Concurrent harvesting of publication data from remote APIs. A single HarvestClient wraps a shared requests
+Session and limits each host both in the number of requests in flight and in the number of requests per second
+using a token bucket. Failed requests are retried with exponential backoff, honouring Retry-After headers.
+Requests which name their source are served from the persistent response cache, see publications.httpcache.
+
+Settings:
+    HARVEST_WORKERS: number of worker threads used by HarvestClient.map
+    HARVEST_HOST_LIMITS: dictionary mapping a host name to a (concurrency, requests per second) pair
+    HARVEST_RETRIES: number of times a failed request is retried
+    HARVEST_TIMEOUT: timeout in seconds for each request
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterable
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .httpcache import ResponseCache, get_cache
+
+HARVEST_WORKERS = getattr(settings, 'HARVEST_WORKERS', 8)
+HARVEST_RETRIES = getattr(settings, 'HARVEST_RETRIES', 4)
+HARVEST_TIMEOUT = getattr(settings, 'HARVEST_TIMEOUT', 30)
+HARVEST_HOST_LIMITS = {
+    'api.eventdata.crossref.org': (3, 5),
+    'api.crossref.org': (3, 10),
+    'opencitations.net': (4, 10),
+    **getattr(settings, 'HARVEST_HOST_LIMITS', {}),
+}
+DEFAULT_HOST_LIMIT = (2, 5)  # (concurrency, requests per second) for hosts without an explicit limit
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_BACKOFF = 60
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket which allows bursts of up to `capacity` requests and `rate` requests per second
+    on average.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and consume it
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        """
+        Stop handing out tokens for the given number of seconds, used when a server asks clients to back off
+        """
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class HostLimit:
+    """
+    Concurrency and rate limits for a single host
+    """
+
+    def __init__(self, concurrency: int, rate: float):
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.bucket = TokenBucket(rate)
+
+    def __enter__(self):
+        self.slots.acquire()
+        self.bucket.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.slots.release()
+
+
+def retry_delay(response: requests.Response | None, attempt: int) -> float:
+    """
+    Number of seconds to wait before retrying a request
+    :param response: the failed response or None if the request raised a connection error
+    :param attempt: number of attempts so far, starting at 1
+    """
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return min(MAX_BACKOFF, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                return min(MAX_BACKOFF, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return min(MAX_BACKOFF, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+class HarvestClient:
+    """
+    HTTP client shared by all harvesting threads.
+
+    :param workers: number of worker threads used by map
+    :param limits: dictionary mapping host names to (concurrency, requests per second) pairs
+    :param retries: number of times a failed request is retried
+    :param timeout: timeout in seconds for each request
+    :param cache: response cache, the shared cache is used if not provided, False disables caching
+    :param transport: optional object whose `wrap(send)` method returns a replacement for `send`, used to
+        record, replay or synthesize responses. See publications.cassettes.
+    """
+
+    def __init__(self, workers: int = HARVEST_WORKERS, limits: dict = None, retries: int = HARVEST_RETRIES,
+                 timeout: float = HARVEST_TIMEOUT, cache: ResponseCache | bool = None, transport=None):
+        self.cache = get_cache() if cache is None else (cache or None)
+        if transport is not None:
+            self.send = transport.wrap(self.send)
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.limits = {**HARVEST_HOST_LIMITS, **(limits or {})}
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(10, len(self.limits)), pool_maxsize=max(10, workers))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_limit(self, url: str) -> HostLimit:
+        host = urlsplit(url).hostname or ''
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostLimit(*self.limits.get(host, DEFAULT_HOST_LIMIT))
+            return self.hosts[host]
+
+    def request(self, method: str, url: str, source: str = None, **kwargs) -> requests.Response:
+        """
+        Make a request within the limits of the host, retrying failures with exponential backoff.
+        The response of the last attempt is returned, raises requests.RequestException if the last attempt
+        failed to connect.
+
+        :param method: HTTP method
+        :param url: URL
+        :param source: name of the data source, responses are cached only if provided
+        :param kwargs: keyword arguments passed on to requests
+        """
+        if source and self.cache:
+            return self.cache.fetch(source, self.send, method, url, **kwargs)
+        return self.send(method, url, **kwargs)
+
+    def send(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        limit = self.get_limit(url)
+        for attempt in range(1, self.retries + 2):
+            response = None
+            try:
+                with limit:
+                    response = self.session.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt > self.retries:
+                    raise
+            if attempt > self.retries:
+                break
+            delay = retry_delay(response, attempt)
+            if response is not None and response.status_code == 429:
+                limit.bucket.pause(delay)
+            time.sleep(delay)
+        return response
+
+    def get(self, url: str, source: str = None, **kwargs) -> requests.Response:
+        return self.request('GET', url, source=source, **kwargs)
+
+    def post(self, url: str, source: str = None, **kwargs) -> requests.Response:
+        return self.request('POST', url, source=source, **kwargs)
+
+    def map(self, func: Callable, items: Iterable) -> Iterable[tuple]:
+        """
+        Call func on each item from a pool of worker threads, yielding results in order of completion.
+        :param func: callable taking a single item
+        :param items: items to process
+        :return: generator of (item, result, error) tuples, where error is the exception raised by func, if any
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(func, item): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    yield item, future.result(), None
+                except Exception as err:
+                    yield item, None, err
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HarvestClient:
+    """
+    Shared harvesting client for callers which do not manage their own
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HarvestClient()
+        return _client
@@ -0,0 +1,253 @@
+"""
+Persistent cache of HTTP responses from external bibliographic sources, stored in a SQLite database in the local
+directory. Entries expire after a time-to-live which depends on the source. Expired entries which carry an ETag or
+Last-Modified validator are revalidated with a conditional request instead of being fetched again. The total size
+of the cache is bounded, least recently used entries are evicted first.
+
+A cache can also be opened in offline mode, in which every stored entry is served regardless of age and misses
+fail without touching the network, so that a recorded cache can be replayed in tests.
+
+Settings:
+    HTTP_CACHE_PATH: path of the SQLite database, None disables the cache
+    HTTP_CACHE_MAX_SIZE: maximum total size of cached bodies in bytes
+    HTTP_CACHE_TTLS: dictionary mapping a source name to a time-to-live in seconds
+    HTTP_CACHE_OFFLINE: serve only from the cache
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.structures import CaseInsensitiveDict
+
+DAY = 86400
+HTTP_CACHE_PATH = getattr(settings, 'HTTP_CACHE_PATH', str(Path(settings.LOCAL_DIR) / 'cache' / 'http.db'))
+HTTP_CACHE_MAX_SIZE = getattr(settings, 'HTTP_CACHE_MAX_SIZE', 256 * 1024 * 1024)
+HTTP_CACHE_OFFLINE = getattr(settings, 'HTTP_CACHE_OFFLINE', False)
+HTTP_CACHE_TTLS = {
+    'crossref': 30 * DAY,           # work and journal metadata
+    'crossref-events': 7 * DAY,     # mentions
+    'opencitations': 7 * DAY,       # citations
+    'books': 90 * DAY,              # Google Books volumes
+    'pdb-search': 1 * DAY,          # PDB code searches
+    'pdb': 7 * DAY,                 # PDB entry reports
+    'scimago': 365 * DAY,           # journal rankings for a year
+    'web': 7 * DAY,                 # thesis and patent pages
+    **getattr(settings, 'HTTP_CACHE_TTLS', {}),
+}
+DEFAULT_TTL = 1 * DAY
+EVICT_FRACTION = 0.9  # evict down to this fraction of the maximum size
+STORED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+
+
+def make_key(method: str, url: str, params: dict = None, body=None) -> str:
+    """
+    Cache key of a request, independent of the order of parameters
+    """
+    payload = json.dumps(
+        [method.upper(), url, sorted((params or {}).items()), body], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def build_response(url: str, status: int, headers: dict, body: bytes) -> requests.Response:
+    """
+    Build a requests Response from stored parts
+    """
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response.url = url
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response._content = body
+    response._content_consumed = True
+    return response
+
+
+class CacheEntry:
+    def __init__(self, key, url, status, headers, body, expires):
+        self.key = key
+        self.url = url
+        self.status = status
+        self.headers = json.loads(headers)
+        self.body = body
+        self.expires = expires
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires > time.time()
+
+    def validators(self) -> dict:
+        """
+        Headers for a conditional request revalidating this entry
+        """
+        headers = {}
+        if self.headers.get('ETag'):
+            headers['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+    def response(self) -> requests.Response:
+        """
+        Rebuild a requests Response from the entry
+        """
+        response = build_response(self.url, self.status, self.headers, self.body)
+        response.from_cache = True
+        return response
+
+
+class ResponseCache:
+    """
+    SQLite-backed HTTP response cache, safe to share between threads.
+
+    :param path: path of the SQLite database
+    :param max_size: maximum total size of cached bodies in bytes
+    :param ttls: dictionary mapping a source name to a time-to-live in seconds
+    :param offline: serve every stored entry regardless of age and never fetch
+    """
+
+    def __init__(self, path: str, max_size: int = HTTP_CACHE_MAX_SIZE, ttls: dict = None,
+                 offline: bool = HTTP_CACHE_OFFLINE):
+        self.path = path
+        self.max_size = max_size
+        self.ttls = {**HTTP_CACHE_TTLS, **(ttls or {})}
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        if not self.ready:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self.ready:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, source TEXT, url TEXT, status INTEGER, headers TEXT, body BLOB, '
+                'size INTEGER, stored REAL, expires REAL, accessed REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed_idx ON responses (accessed)')
+            self.ready = True
+        return conn
+
+    def get_ttl(self, source: str) -> float:
+        return self.ttls.get(source, DEFAULT_TTL)
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self.lock, closing(self.connect()) as conn, conn:
+            row = conn.execute(
+                'SELECT key, url, status, headers, body, expires FROM responses WHERE key = ?', [key]
+            ).fetchone()
+            if row:
+                conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', [time.time(), key])
+        return CacheEntry(*row) if row else None
+
+    def store(self, key: str, source: str, response: requests.Response):
+        """
+        Store a successful response, responses which forbid storage are ignored
+        """
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            return
+        now = time.time()
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        body = response.content
+        url = urlsplit(response.url)._replace(query='').geturl()  # query strings may hold API keys
+        with self.lock, closing(self.connect()) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses (key, source, url, status, headers, body, size, stored, expires, '
+                'accessed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [key, source, url, response.status_code, json.dumps(headers), body, len(body), now,
+                 now + self.get_ttl(source), now]
+            )
+            self.evict(conn)
+
+    def refresh(self, key: str, source: str):
+        """
+        Extend the lifetime of an entry which was revalidated by the server
+        """
+        now = time.time()
+        with self.lock, closing(self.connect()) as conn, conn:
+            conn.execute(
+                'UPDATE responses SET expires = ?, accessed = ? WHERE key = ?', [now + self.get_ttl(source), now, key]
+            )
+
+    def evict(self, conn: sqlite3.Connection):
+        """
+        Remove least recently used entries until the cache fits within its maximum size
+        """
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_size:
+            return
+        excess = total - self.max_size * EVICT_FRACTION
+        removed = 0
+        keys = []
+        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY accessed'):
+            keys.append(key)
+            removed += size
+            if removed >= excess:
+                break
+        conn.executemany('DELETE FROM responses WHERE key = ?', [(key,) for key in keys])
+
+    def clear(self, source: str = None):
+        with self.lock, closing(self.connect()) as conn, conn:
+            if source:
+                conn.execute('DELETE FROM responses WHERE source = ?', [source])
+            else:
+                conn.execute('DELETE FROM responses')
+
+    def stats(self) -> dict:
+        """
+        Number of entries and total size per source
+        """
+        with self.lock, closing(self.connect()) as conn:
+            rows = conn.execute('SELECT source, COUNT(*), SUM(size) FROM responses GROUP BY source').fetchall()
+        return {source: {'entries': count, 'size': size} for source, count, size in rows}
+
+    def fetch(self, source: str, send, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Return the cached response of a request, fetching or revalidating it through `send` when needed.
+        :param source: name of the source, determines the time-to-live
+        :param send: callable with the signature of requests.request which performs the request
+        :param method: HTTP method
+        :param url: URL
+        :param kwargs: keyword arguments for `send`
+        """
+        key = make_key(method, url, kwargs.get('params'), kwargs.get('json', kwargs.get('data')))
+        entry = self.get(key)
+        if entry and (entry.fresh or self.offline):
+            return entry.response()
+        if self.offline:
+            return build_response(url, 504, {}, b'')
+
+        if entry:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **entry.validators()}
+        response = send(method, url, **kwargs)
+        if entry and response.status_code == 304:
+            self.refresh(key, source)
+            return entry.response()
+        if response.status_code == 200:
+            self.store(key, source, response)
+        return response
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache | None:
+    """
+    Shared response cache, None if disabled
+    """
+    global _cache
+    with _cache_lock:
+        if HTTP_CACHE_PATH and _cache is None:
+            _cache = ResponseCache(HTTP_CACHE_PATH)
+        return _cache
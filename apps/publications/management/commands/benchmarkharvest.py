@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from publications import models, utils
+from publications.cassettes import SyntheticSource
+from publications.harvest import HarvestClient
+
+STAGES = ['publications', 'metrics', 'pdb']
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the publication harvesting pipeline against synthetic sources, reporting records per second '
+        'through fetching, parsing, de-duplication and insertion. All records are created within a transaction '
+        'which is rolled back when the benchmark completes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=1000, help="Number of distinct records to harvest")
+        parser.add_argument('--duplicates', type=float, default=0.1, help="Fraction of repeated identifiers")
+        parser.add_argument('--journals', type=int, default=100, help="Number of distinct synthetic journals")
+        parser.add_argument('--latency', type=float, default=0.0, help="Simulated latency per request in ms")
+        parser.add_argument('--workers', type=int, default=8, help="Number of harvesting threads")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic sources")
+        parser.add_argument('--stage', choices=STAGES, action='append', help="Stages to run, all by default")
+
+    def handle(self, *args, **options):
+        source = SyntheticSource(seed=options['seed'], journals=options['journals'], latency=options['latency'] / 1000)
+        client = HarvestClient(workers=options['workers'], cache=False, transport=source)
+
+        count = options['records']
+        rng = random.Random(options['seed'])
+        stages = options['stage'] or STAGES
+        dois = source.dois(count)
+        dois += rng.choices(dois, k=int(count * options['duplicates']))
+        rng.shuffle(dois)
+
+        out = [f"{'Stage':<14s} {'Records':>8s} {'Requests':>9s} {'Seconds':>9s} {'Records/s':>10s}"]
+        with transaction.atomic():
+            for stage in stages:
+                requests = source.requests
+                start = time.perf_counter()
+                if stage == 'publications':
+                    before = models.Publication.objects.count()
+                    utils.create_publications(dois, client=client)
+                    records = models.Publication.objects.count() - before
+                elif stage == 'metrics':
+                    result = utils.update_publication_metrics(client=client, codes=source.dois(count))
+                    records = result['created'] + result['updated']
+                else:
+                    result = utils.sync_pdb_entries(source.pdb_codes(count), client=client, restart=True)
+                    records = result['created'] + result['updated']
+                duration = time.perf_counter() - start
+                out.append(
+                    f"{stage:<14s} {records:>8d} {source.requests - requests:>9d} {duration:>9.2f} "
+                    f"{records / duration if duration else 0:>10.1f}"
+                )
+            transaction.set_rollback(True)
+
+        self.stdout.write('\n'.join(out))
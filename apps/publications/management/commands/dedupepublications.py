@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from publications import models, utils
+from publications.fingerprints import Record, SIMILARITY_THRESHOLD, find_duplicates, normalize_title
+
+
+class Command(BaseCommand):
+    help = (
+        'Find duplicate publications, those sharing a DOI or other code, or with near-identical titles published '
+        'within a year of each other, and optionally merge each group into a single publication.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=float, default=SIMILARITY_THRESHOLD,
+            help="Minimum title similarity between 0 and 1"
+        )
+        parser.add_argument('--kind', type=str, action='append', help="Only consider publications of this type")
+        parser.add_argument('--merge', action='store_true', help="Merge each group of duplicates")
+        parser.add_argument('--refresh', action='store_true', help="Recompute all fingerprints first")
+
+    def handle(self, *args, **options):
+        publications = models.Publication.objects.all()
+        if options['kind']:
+            publications = publications.filter(kind__in=options['kind'])
+
+        start = time.perf_counter()
+        if options['refresh']:
+            to_update = list(publications.only('code', 'title'))
+            for pub in to_update:
+                pub.update_fingerprints()
+            models.Publication.objects.bulk_update(
+                to_update, ['code_fingerprint', 'title_fingerprint'], batch_size=500
+            )
+            self.stdout.write(f'Refreshed fingerprints of {len(to_update)} publications')
+
+        records = (
+            Record(pk, code, normalize_title(title), year)
+            for pk, code, title, year in publications.values_list('pk', 'code_fingerprint', 'title', 'date__year')
+        )
+        groups = find_duplicates(records, threshold=options['threshold'])
+        entries = models.Publication.objects.in_bulk([pk for group in groups for pk in group])
+
+        merged = 0
+        for group in groups:
+            pubs = [entries[pk] for pk in group]
+            self.stdout.write('')
+            for pub in pubs:
+                self.stdout.write(f'{pub.pk:>8d} {pub.date.year} {pub.code or "-":<30s} {pub.title[:70]}')
+            if options['merge']:
+                target = utils.merge_publications(pubs)
+                merged += len(pubs) - 1
+                self.stdout.write(f'  -> merged into {target.pk}')
+
+        duration = time.perf_counter() - start
+        summary = f'Found {len(groups)} groups of duplicates in {duration:0.2f} s'
+        if options['merge']:
+            summary += f', merged {merged} publications'
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from publications import models
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the author name index, keyword statistics and stored citations derived from publications.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of publications per batch")
+
+    def handle(self, *args, **options):
+        publications = models.Publication.objects.select_related('journal').order_by('pk')
+        batch_size = options['batch_size']
+
+        start = time.perf_counter()
+        count = 0
+        last = 0
+        while batch := list(publications.filter(pk__gt=last)[:batch_size]):
+            with transaction.atomic():
+                models.sync_author_names(batch)
+                models.sync_keywords(batch)
+                models.sync_citations(batch)
+            count += len(batch)
+            last = batch[-1].pk
+        duration = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} publications in {duration:0.2f} s'))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from publications import models, utils
+
+
+class Command(BaseCommand):
+    help = (
+        'Synchronize PDB depositions for the facility in pages of GraphQL queries. An interrupted run is resumed '
+        'from its last checkpoint unless --restart is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('codes', nargs='*', type=str, help="PDB codes, recently revised entries by default")
+        parser.add_argument('--page-size', type=int, default=utils.PDB_PAGE_SIZE, help="Number of codes per query")
+        parser.add_argument('--restart', action='store_true', help="Discard the checkpoint of an interrupted run")
+
+    def handle(self, *args, **options):
+        checkpoint = models.SyncCheckpoint.objects.filter(name=utils.PDB_SYNC_NAME).first()
+        if checkpoint and not options['restart']:
+            self.stdout.write(f'Resuming after {checkpoint.position} of {len(checkpoint.codes)} entries')
+
+        start = time.perf_counter()
+        out = utils.sync_pdb_entries(
+            [code.upper() for code in options['codes']] or None, page_size=options['page_size'],
+            restart=options['restart']
+        )
+        duration = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {out["created"]}, updated {out["updated"]} PDB entries and added {out["linked"]} beamline '
+            f'links in {out["pages"]} pages, {duration:0.2f} s'
+        ))
@@ -0,0 +1,227 @@
+"""
+Publication metrics computed in the database. Counts per type, citation sums, journal impact figures and
+h-indices are evaluated per publication year with grouped queries, the h-index using a window function which
+ranks publications by citations, so that the cost of a metrics page does not grow with the number of
+publications loaded into Python.
+
+Results are cached per scope (all publications, a beamline, a beam team or an institution) and period. Cached
+entries are keyed by the version of the 'publications' change-tracking scope, which is updated whenever
+publications or their citation metrics change. See scheduler.utils.touch_versions.
+
+Settings:
+    PUBLICATION_METRICS_TIMEOUT: number of seconds for which computed metrics are cached
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Count, Sum, Avg, F, OuterRef, Subquery, Window, QuerySet
+from django.db.models.functions import ExtractYear, RowNumber
+
+from scheduler.utils import get_versions, touch_versions
+
+METRICS_TIMEOUT = getattr(settings, 'PUBLICATION_METRICS_TIMEOUT', 6 * 3600)
+VERSION_SCOPE = 'publications'
+QUARTILES = (1, 2, 3, 4)
+
+
+def touch_publications():
+    """
+    Mark publications as modified, invalidating cached metrics and publication feeds. Called when publications
+    or their citation metrics change.
+    """
+    touch_versions(VERSION_SCOPE)
+
+
+def publications_version() -> int:
+    return get_versions(VERSION_SCOPE)[VERSION_SCOPE]
+
+
+def beamline_publications(acronym: str) -> QuerySet:
+    """
+    Publications from a beamline or from any of its branches
+    """
+    from .models import Publication
+
+    matching = Publication.objects.filter(
+        Q(beamlines__acronym__iexact=acronym) | Q(beamlines__parent__acronym__iexact=acronym)
+    )
+    return Publication.objects.filter(pk__in=matching.values('pk'))
+
+
+def beamteam_publications(acronym: str) -> QuerySet:
+    """
+    Publications of the beam team of a beamline
+    """
+    from beamlines.models import Facility
+    from .models import Publication
+
+    facility = Facility.objects.filter(acronym__iexact=acronym).first()
+    pks = [] if not facility else facility.details.get('beamteam_publications', [])
+    return Publication.objects.filter(pk__in=pks)
+
+
+def institution_publications(pk: int) -> QuerySet:
+    """
+    Publications claimed by users of an institution, or with an author matching the surname and first initial
+    of one of its users in the author name index. Surnames are grouped by first initial so that the size of the
+    query depends on the number of distinct initials rather than the number of users.
+    """
+    from users.models import User
+    from .fingerprints import given_initials, normalize_title
+    from .models import AuthorName, Publication
+
+    surnames = defaultdict(set)
+    for last_name, first_name in User.objects.filter(institution_id=pk).values_list('last_name', 'first_name'):
+        surname, initials = normalize_title(last_name), given_initials(first_name)
+        if surname and initials:
+            surnames[initials[0]].add(surname)
+
+    authors = Q(pk__in=[])
+    for initial, names in sorted(surnames.items()):
+        authors |= Q(surname__in=sorted(names), initials__startswith=initial)
+
+    matching = Publication.objects.filter(
+        Q(users__institution_id=pk) | Q(pk__in=AuthorName.objects.filter(authors).values('publication'))
+    )
+    return Publication.objects.filter(pk__in=matching.values('pk'))
+
+
+SCOPES = {
+    'beamline': beamline_publications,
+    'beamteam': beamteam_publications,
+    'institution': institution_publications,
+}
+
+
+def scope_publications(scope: str = 'all', key=None) -> QuerySet:
+    """
+    Publications within a scope
+    :param scope: 'all', 'beamline', 'beamteam' or 'institution'
+    :param key: beamline acronym for beamline and beamteam scopes, institution primary key for institutions
+    """
+    from .models import Publication
+
+    if scope == 'all':
+        return Publication.objects.all()
+    return SCOPES[scope](key)
+
+
+def h_index(queryset: QuerySet, by_year: bool = False):
+    """
+    Largest number h such that h of the publications have at least h citations each. Publications are ranked by
+    their total citations with a window function and only the rows within the h-core are returned by the database.
+
+    :param queryset: publications
+    :param by_year: compute a separate h-index for the publications of each year
+    :return: h-index, or a dictionary mapping years to h-indices if by_year is True
+    """
+    from .models import ArticleMetric
+
+    totals = ArticleMetric.objects.filter(publication=OuterRef('pk')).values('publication').annotate(
+        total=Sum('citations')
+    ).values('total')
+    partition = [F('published')] if by_year else []
+    ranked = queryset.annotate(total=Subquery(totals), published=ExtractYear('date')).filter(total__gt=0).annotate(
+        rank=Window(RowNumber(), partition_by=partition, order_by=[F('total').desc(), F('pk').asc()])
+    ).filter(rank__lte=F('total'))
+
+    if not by_year:
+        return ranked.count()
+    indices = {}
+    for year in ranked.values_list('published', flat=True):
+        indices[year] = indices.get(year, 0) + 1
+    return indices
+
+
+def compute_metrics(queryset: QuerySet, start: int = None, end: int = None) -> dict:
+    """
+    Metrics of a set of publications for each year in which they were published, and for the whole period
+    :param queryset: publications
+    :param start: first year to include
+    :param end: last year to include
+    :return: dictionary with 'kinds', 'years' and 'summary' entries, see get_metrics
+    """
+    from .models import ArticleMetric, Publication
+
+    if start:
+        queryset = queryset.filter(date__year__gte=start)
+    if end:
+        queryset = queryset.filter(date__year__lte=end)
+
+    kinds = {f'kind_{kind}': Count('pk', filter=Q(kind=kind)) for kind in Publication.TYPES.values}
+    quartiles = {
+        f'q{quartile}': Count('pk', filter=Q(journal_metric__sjr_quartile=quartile)) for quartile in QUARTILES
+    }
+    counts = queryset.annotate(year=ExtractYear('date')).values('year').annotate(
+        total=Count('pk'),
+        rated=Count('journal_metric__impact_factor'),
+        impact=Avg('journal_metric__impact_factor'),
+        **kinds, **quartiles,
+    ).order_by('year')
+
+    citations = {
+        entry['published']: entry for entry in ArticleMetric.objects.filter(
+            publication__in=queryset.values('pk')
+        ).values(published=ExtractYear('publication__date')).annotate(
+            citations=Sum('citations'), self_cites=Sum('self_cites'), cited=Count('publication', distinct=True),
+        ).order_by('published')
+    }
+    indices = h_index(queryset, by_year=True)
+
+    used = [(kind, label) for kind, label in Publication.TYPES.choices if any(row[f'kind_{kind}'] for row in counts)]
+    years = []
+    for row in counts:
+        cited = citations.get(row['year'], {})
+        years.append({
+            'year': row['year'],
+            'total': row['total'],
+            'kinds': [row[f'kind_{kind}'] for kind, label in used],
+            'citations': cited.get('citations') or 0,
+            'self_cites': cited.get('self_cites') or 0,
+            'cited': cited.get('cited') or 0,
+            'h_index': indices.get(row['year'], 0),
+            'rated': row['rated'],
+            'impact_factor': row['impact'],
+            'quartiles': [row[f'q{quartile}'] for quartile in QUARTILES],
+        })
+
+    rated = sum(year['rated'] for year in years)
+    impact = sum(year['impact_factor'] * year['rated'] for year in years if year['rated'])
+    summary = {
+        'total': sum(year['total'] for year in years),
+        'kinds': [sum(year['kinds'][i] for year in years) for i in range(len(used))],
+        'citations': sum(year['citations'] for year in years),
+        'self_cites': sum(year['self_cites'] for year in years),
+        'cited': sum(year['cited'] for year in years),
+        'h_index': h_index(queryset),
+        'rated': rated,
+        'impact_factor': impact / rated if rated else None,
+        'quartiles': [sum(year['quartiles'][i] for year in years) for i in range(len(QUARTILES))],
+    }
+    return {'kinds': used, 'years': years, 'summary': summary}
+
+
+def get_metrics(scope: str = 'all', key=None, start: int = None, end: int = None) -> dict:
+    """
+    Cached metrics of the publications within a scope and period.
+
+    :param scope: 'all', 'beamline', 'beamteam' or 'institution', see scope_publications
+    :param key: beamline acronym or institution primary key
+    :param start: first year to include
+    :param end: last year to include
+    :return: dictionary with the following entries
+        - kinds: list of (kind, label) pairs of the publication types present
+        - years: list of dictionaries, one per year, with 'year', 'total', 'kinds' (counts in the order of kinds),
+          'citations', 'self_cites', 'cited' (number of cited publications), 'h_index', 'rated' (number of
+          publications in journals with an impact factor), 'impact_factor' (mean impact factor) and
+          'quartiles' (number of publications in SJR quartiles 1 to 4)
+        - summary: the same figures for the whole period
+    """
+    cache_key = f'publication-metrics:{publications_version()}:{scope}:{str(key).lower()}:{start}:{end}'
+    metrics = cache.get(cache_key)
+    if metrics is None:
+        metrics = compute_metrics(scope_publications(scope, key), start=start, end=end)
+        cache.set(cache_key, metrics, timeout=METRICS_TIMEOUT)
+    return metrics
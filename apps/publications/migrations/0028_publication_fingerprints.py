@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+from publications.fingerprints import code_fingerprint, title_fingerprint
+
+
+def update_fingerprints(apps, schema_editor):
+    Publication = apps.get_model('publications', 'Publication')
+
+    to_update = Publication.objects.only('code', 'title')
+    for pub in to_update:
+        pub.code_fingerprint = code_fingerprint(pub.code)
+        pub.title_fingerprint = title_fingerprint(pub.title)
+
+    Publication.objects.bulk_update(to_update, ['code_fingerprint', 'title_fingerprint'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publications', '0027_focusarea_remove_publication_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publication',
+            name='code_fingerprint',
+            field=models.CharField(db_index=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='publication',
+            name='title_fingerprint',
+            field=models.CharField(db_index=True, editable=False, max_length=40, null=True),
+        ),
+        migrations.RunPython(update_fingerprints, migrations.RunPython.noop),
+    ]
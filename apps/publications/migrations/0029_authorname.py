@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from publications.fingerprints import author_list, parse_author
+
+
+def index_author_names(apps, schema_editor):
+    Publication = apps.get_model('publications', 'Publication')
+    AuthorName = apps.get_model('publications', 'AuthorName')
+
+    entries = (
+        AuthorName(publication_id=pk, surname=parts[0][:100], initials=parts[1][:20], position=position)
+        for pk, authors in Publication.objects.values_list('pk', 'authors').iterator()
+        for position, parts in enumerate(map(parse_author, author_list(authors)))
+        if parts
+    )
+    AuthorName.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publications', '0028_publication_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorName',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('surname', models.CharField(max_length=100)),
+                ('initials', models.CharField(blank=True, max_length=20)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('publication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_names', to='publications.publication')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['surname', 'initials'], name='publications_author_name_idx')],
+            },
+        ),
+        migrations.RunPython(index_author_names, migrations.RunPython.noop),
+    ]
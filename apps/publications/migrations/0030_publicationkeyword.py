@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from publications.stats import extract_keywords
+
+
+def count_keywords(apps, schema_editor):
+    Publication = apps.get_model('publications', 'Publication')
+    PublicationKeyword = apps.get_model('publications', 'PublicationKeyword')
+
+    entries = (
+        PublicationKeyword(publication_id=pk, word=word, year=published.year, count=count)
+        for pk, keywords, title, published in Publication.objects.values_list(
+            'pk', 'keywords', 'title', 'date'
+        ).iterator()
+        for word, count in extract_keywords(keywords, title).items()
+    )
+    PublicationKeyword.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publications', '0029_authorname'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicationKeyword',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=50)),
+                ('year', models.IntegerField()),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('publication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='keyword_counts', to='publications.publication')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['word'], name='publications_keyword_idx'), models.Index(fields=['year', 'word'], name='publications_keyword_year_idx')],
+            },
+        ),
+        migrations.RunPython(count_keywords, migrations.RunPython.noop),
+    ]
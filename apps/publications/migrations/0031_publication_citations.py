@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:10
+
+from django.db import migrations, models
+
+from publications.citations import render_citations
+
+
+def render_stored_citations(apps, schema_editor):
+    Publication = apps.get_model('publications', 'Publication')
+
+    to_update = []
+    for pub in Publication.objects.select_related('journal').iterator(chunk_size=500):
+        pub.citations = render_citations(pub, journal=pub.journal.title if pub.journal_id else None)
+        to_update.append(pub)
+        if len(to_update) >= 500:
+            Publication.objects.bulk_update(to_update, ['citations'])
+            to_update = []
+    Publication.objects.bulk_update(to_update, ['citations'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publications', '0030_publicationkeyword'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publication',
+            name='citations',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.RunPython(render_stored_citations, migrations.RunPython.noop),
+    ]
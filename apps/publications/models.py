@@ -1,8 +1,14 @@
 
 
+import functools
+import operator
+
 from beamlines.models import Facility
 from django.db import models
-from django.db.models import F
+from django.db.models import F, Case, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import gettext as _
 from django.utils import timezone
 from misc.functions import Year
@@ -12,6 +18,12 @@ from django.conf import settings
 
 
 from misc.models import ActivityLog
+from .citations import abbrev_authors, render_citations
+from .metrics import touch_publications
+from .stats import extract_keywords
+from .fingerprints import (
+    author_list, code_fingerprint, given_initials, normalize_title, parse_author, title_fingerprint
+)
 
 User = getattr(settings, "AUTH_USER_MODEL")
 
@@ -137,8 +149,42 @@ class Publication(TimeStampedModel):
     beamlines = models.ManyToManyField(Facility, related_name="publications", blank=True)
     users = models.ManyToManyField(User, related_name="publications", verbose_name="Users", blank=True)
     funders = models.ManyToManyField(FundingSource, related_name="publications", verbose_name="Funding Sources", blank=True)
+    code_fingerprint = models.CharField(max_length=255, null=True, editable=False, db_index=True)
+    title_fingerprint = models.CharField(max_length=40, null=True, editable=False, db_index=True)
+    citations = models.JSONField(default=dict, editable=False)
     objects = PublicationManager()
 
+    def update_fingerprints(self):
+        """
+        Update the normalized code and title fingerprints used to detect duplicates. Called on save, must be
+        called explicitly before bulk operations.
+        """
+        self.code_fingerprint = code_fingerprint(self.code)
+        self.title_fingerprint = title_fingerprint(self.title)
+
+    def update_citations(self):
+        """
+        Render the stored citations in all styles. Called on save, must be called explicitly before bulk operations.
+        """
+        self.citations = render_citations(self, journal=self.journal.title if self.journal_id else None)
+
+    def save(self, *args, **kwargs):
+        self.update_fingerprints()
+        self.update_citations()
+        super().save(*args, **kwargs)
+
+    def sync_authors(self):
+        """
+        Rebuild the author name index of this publication. Called automatically when the publication is saved.
+        """
+        sync_author_names([self])
+
+    def sync_keywords(self):
+        """
+        Rebuild the keyword statistics of this publication. Called automatically when the publication is saved.
+        """
+        sync_keywords([self])
+
     def is_owned_by(self, user):
         return user in self.users.all()
 
@@ -149,40 +195,13 @@ class Publication(TimeStampedModel):
             object_id=self.id
         ).order_by('-created')
 
-    def cite(self):
-        parts = [f"{self.abbrev_authors()} ({self.date.year}). {self.title}"]
-        issue = f'({self.issue})' if self.issue else ''
-        pages = f', {self.pages}' if self.pages else ''
-        volume = f'{self.volume}' if self.volume else ''
-        address = f', {self.address}' if self.address else ''
-        publisher = f'{self.publisher}{address}' if self.publisher else ''
-        main_title = f'<em>{self.main_title}</em>' if self.main_title else ''
-        edition = f'({self.edition})' if self.edition else ''
-        editors = f"{self.editors} (Eds.)" if self.editors else ''
-        supervisor = f"{self.editors} (Sup.) " if self.editors else ''
-
-        if self.kind in [Publication.TYPES.article, Publication.TYPES.proceeding, Publication.TYPES.magazine]:
-            if self.journal:
-                parts.append(f"<em>{self.journal.title}</em> {volume}{issue}{pages}")
-            else:
-                parts.append(f"{publisher} {volume}{edition}{pages}")
-        elif self.kind == Publication.TYPES.pdb:
-            parts.append(f"Protein Data Bank")
-        elif self.kind == Publication.TYPES.patent:
-            parts.append(f"Patent")
-        elif self.kind == Publication.TYPES.book:
-            parts.append(f"{publisher}")
-        elif self.kind == Publication.TYPES.msc_thesis:
-            parts.append(f"Masters Thesis")
-            parts.append(f"{supervisor}{publisher}")
-        elif self.kind == Publication.TYPES.phd_thesis:
-            parts.append('Doctoral Dissertation')
-            parts.append(f"{supervisor}{publisher}")
-        elif self.kind == Publication.TYPES.chapter:
-            parts.append(f"In {editors}{main_title}{pages}, {publisher}")
-        if self.code:
-            parts.append(self.code)
-        return '. '.join(parts)
+    def cite(self, style='full'):
+        """
+        HTML citation in the given style, as stored when the publication was last saved
+        """
+        if style not in self.citations:
+            self.update_citations()
+        return self.citations[style]['html']
 
     cite.sort_field = 'authors'
     cite.short_description = 'Publication'
@@ -199,16 +218,10 @@ class Publication(TimeStampedModel):
 
     @property
     def short_citation(self):
-        cite = self.cite()
-        if len(self.title) > 70:
-            cite = cite.replace(self.title, self.title[:70] + ' ...')
-        return cite
+        return self.cite('short')
 
     def abbrev_authors(self):
-        if len(self.authors) < 5:
-            return "; ".join(self.authors)
-        else:
-            return "; ".join(self.authors[:5]) + " et al."
+        return abbrev_authors(self.authors)
 
     def __str__(self):
         return "{0} ({1}). {2}".format(
@@ -231,6 +244,170 @@ class ArticleMetric(TimeStampedModel):
         return "{} > {}".format(self.publication, self.year)
 
 
+class AuthorName(models.Model):
+    """
+    Normalized surname and initials of each author of a publication, used to match publications to users
+    """
+    publication = models.ForeignKey(Publication, related_name='author_names', on_delete=models.CASCADE)
+    surname = models.CharField(max_length=100)
+    initials = models.CharField(max_length=20, blank=True)
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['surname', 'initials'], name='publications_author_name_idx')]
+
+    def __str__(self):
+        return f"{self.surname}, {self.initials}"
+
+
+def sync_author_names(publications):
+    """
+    Rebuild the author name index for the given publications
+    :param publications: list or queryset of saved publications
+    """
+    publications = list(publications)
+    entries = [
+        AuthorName(publication=pub, surname=parts[0][:100], initials=parts[1][:20], position=position)
+        for pub in publications
+        for position, parts in enumerate(map(parse_author, author_list(pub.authors)))
+        if parts
+    ]
+    AuthorName.objects.filter(publication__in=[pub.pk for pub in publications]).delete()
+    AuthorName.objects.bulk_create(entries, batch_size=500)
+
+
+class PublicationKeyword(models.Model):
+    """
+    Number of times a word occurs in the keywords and title of a publication, used for keyword statistics
+    """
+    publication = models.ForeignKey(Publication, related_name='keyword_counts', on_delete=models.CASCADE)
+    word = models.CharField(max_length=50)
+    year = models.IntegerField()
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['word'], name='publications_keyword_idx'),
+            models.Index(fields=['year', 'word'], name='publications_keyword_year_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.word} ({self.count})"
+
+
+def sync_keywords(publications):
+    """
+    Rebuild the keyword statistics for the given publications
+    :param publications: list or queryset of saved publications
+    """
+    publications = list(publications)
+    entries = [
+        PublicationKeyword(publication=pub, word=word, year=pub.date.year, count=count)
+        for pub in publications
+        for word, count in extract_keywords(pub.keywords, pub.title).items()
+    ]
+    PublicationKeyword.objects.filter(publication__in=[pub.pk for pub in publications]).delete()
+    PublicationKeyword.objects.bulk_create(entries, batch_size=500)
+
+
+def sync_citations(publications):
+    """
+    Render the stored citations of the given publications again, for example after a journal has been renamed
+    :param publications: list or queryset of saved publications with their journals
+    """
+    publications = list(publications)
+    for pub in publications:
+        pub.update_citations()
+    Publication.objects.bulk_update(publications, fields=['citations'], batch_size=500)
+
+
+class SyncCheckpoint(TimeStampedModel):
+    """
+    Progress of a resumable synchronization run, the list of codes to process and the number already processed.
+    Saved after each batch within the same transaction as the changes, and deleted when the run completes.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    codes = models.JSONField(default=list)
+    position = models.PositiveIntegerField(default=0)
+    totals = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.name}: {self.position}/{len(self.codes)}"
+
+    @property
+    def pending(self) -> list:
+        return self.codes[self.position:]
+
+
+def match_authors(surnames, initials, full_initials=(), include: Q = None) -> models.QuerySet:
+    """
+    Publications with an author having one of the given surnames and given-name initials, found through the
+    author name index. Results are annotated with an `author_score` ranking how well the best matching author
+    fits: 3 if all initials match one of `full_initials`, 2 if only a first initial was given, and 1 if the
+    other initials differ.
+
+    :param surnames: normalized surnames
+    :param initials: first initials of the given names
+    :param full_initials: complete initials of the given names
+    :param include: optional filter for additional publications to include
+    """
+    if surnames and initials:
+        names = AuthorName.objects.filter(surname__in=list(surnames)).filter(
+            functools.reduce(operator.or_, [Q(initials__startswith=initial) for initial in initials])
+        )
+    else:
+        names = AuthorName.objects.none()
+    scores = names.filter(publication=OuterRef('pk')).annotate(
+        score=Case(
+            When(initials__in=list(full_initials), then=Value(3)),
+            When(initials__in=list(initials), then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by('-score').values('score')[:1]
+    query = Q(pk__in=names.values('publication'))
+    if include is not None:
+        query |= include
+    return Publication.objects.filter(query).annotate(author_score=Coalesce(Subquery(scores), 0))
+
+
+def match_user(user, include: Q = None) -> models.QuerySet:
+    """
+    Publications with an author matching the user's last name, or other names used as a surname, and the
+    initials of the user's first or preferred name. See match_authors.
+    """
+    surnames = {normalize_title(name) for name in [user.last_name, user.other_names] if normalize_title(name)}
+    firsts = {given_initials(name) for name in [user.first_name, user.preferred_name] if given_initials(name)}
+    others = given_initials(user.other_names)
+    return match_authors(
+        surnames, {name[0] for name in firsts}, {f'{name}{others}' for name in firsts}, include=include
+    )
+
+
+@receiver(post_save, sender=Publication)
+def on_publication_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.sync_authors()
+        instance.sync_keywords()
+        touch_publications()
+
+
+@receiver(post_delete, sender=Publication)
+def on_publication_delete(sender, instance, **kwargs):
+    touch_publications()
+
+
+@receiver(m2m_changed, sender=Publication.users.through)
+def on_publication_users_change(sender, instance, **kwargs):
+    touch_publications()
+
+
+@receiver(post_save, sender=Journal)
+def on_journal_save(sender, instance, raw=False, created=False, **kwargs):
+    if not (raw or created):
+        sync_citations(instance.articles.select_related('journal'))
+
+
 Patent = Publication
 Book = Publication
 Article = Publication
@@ -238,17 +415,22 @@ PDBDeposition = Publication
 
 
 def check_unique(title=None, authors=None, code=None):
-    qf = None
-    if title:
-        qf = models.Q(title__icontains=title)
-        if authors:
-            qf &= models.Q(authors__icontains=authors)
-    elif authors:
-        qf = models.Q(authors__icontains=authors)
-    if code:
-        if not qf:
-            qf = models.Q()
-        qf |= models.Q(code__icontains=code)
-
-    matches = qf and Publication.objects.filter(qf) or Publication.objects.none()
-    return matches.count() and matches or matches.none()
+    """
+    Find existing publications with the same code or title, compared by their indexed fingerprints. When authors
+    are given, a title match also requires at least one author surname in common, so that generic titles such as
+    "Editorial" are not reported as duplicates of unrelated publications.
+    :param title: title
+    :param authors: author list or semicolon separated string of authors
+    :param code: DOI or other identifier
+    :return: queryset of matching publications
+    """
+    qf = models.Q()
+    if code_fingerprint(code):
+        qf |= models.Q(code_fingerprint=code_fingerprint(code))
+    if title_fingerprint(title):
+        title_q = models.Q(title_fingerprint=title_fingerprint(title))
+        surnames = {parts[0][:100] for parts in map(parse_author, author_list(authors)) if parts}
+        if surnames:
+            title_q &= models.Q(pk__in=AuthorName.objects.filter(surname__in=surnames).values('publication'))
+        qf |= title_q
+    return Publication.objects.filter(qf) if qf else Publication.objects.none()
@@ -1,7 +1,8 @@
-import itertools
 import re
 from collections import defaultdict
 
+from django.db.models import Sum
+
 
 def html2text(html):
     html = re.sub(r'[\s\n]+', ' ', html)
@@ -9,33 +10,85 @@ def html2text(html):
     return html
 
 
-STOPWORDS = re.compile(
-    r"\s(i|me|my|myself|we|us|our|ours|ourselves|you|your|yours|yourself|yourselves|he|him|his|himself|she|her|hers|"
-    r"herself|it|its|itself|they|them|their|theirs|themselves|what|which|who|whom|whose|this|that|these|those|am|is|"
-    r"are|was|were|be|been|being|have|has|had|having|do|does|did|doing|will|would|should|can|could|ought|i'm|you're|"
-    r"he's|she's|it's|we're|they're|i've|you've|we've|they've|i'd|you'd|he'd|she'd|we'd|they'd|i'll|you'll|he'll|"
-    r"she'll|we'll|they'll|isn't|aren't|wasn't|weren't|hasn't|haven't|hadn't|doesn't|don't|didn't|won't|wouldn't|"
-    r"shan't|shouldn't|can't|cannot|couldn't|mustn't|let's|that's|who's|what's|here's|there's|when's|where's|why's|"
-    r"how's|a|an|the|and|but|if|or|because|as|until|while|of|at|by|for|with|about|against|between|into|through|during|"
-    r"before|after|above|below|to|from|up|upon|down|in|out|on|off|over|under|again|further|then|once|here|there|when|"
-    r"where|why|how|all|any|both|each|few|more|most|other|some|such|no|nor|not|only|own|same|so|than|too|very|say|says|"
-    r"said|shall)\s"
-)
+STOPWORDS = {
+    'i', 'me', 'my', 'myself', 'we', 'us', 'our', 'ours', 'ourselves', 'you', 'your', 'yours', 'yourself',
+    'yourselves', 'he', 'him', 'his', 'himself', 'she', 'her', 'hers', 'herself', 'it', 'its', 'itself', 'they',
+    'them', 'their', 'theirs', 'themselves', 'what', 'which', 'who', 'whom', 'whose', 'this', 'that', 'these',
+    'those', 'am', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having', 'do', 'does',
+    'did', 'doing', 'will', 'would', 'should', 'can', 'could', 'ought', "i'm", "you're", "he's", "she's", "it's",
+    "we're", "they're", "i've", "you've", "we've", "they've", "i'd", "you'd", "he'd", "she'd", "we'd", "they'd",
+    "i'll", "you'll", "he'll", "she'll", "we'll", "they'll", "isn't", "aren't", "wasn't", "weren't", "hasn't",
+    "haven't", "hadn't", "doesn't", "don't", "didn't", "won't", "wouldn't", "shan't", "shouldn't", "can't", 'cannot',
+    "couldn't", "mustn't", "let's", "that's", "who's", "what's", "here's", "there's", "when's", "where's", "why's",
+    "how's", 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until', 'while', 'of', 'at', 'by', 'for',
+    'with', 'about', 'against', 'between', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'to',
+    'from', 'up', 'upon', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further', 'then', 'once',
+    'here', 'there', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other',
+    'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 'say', 'says', 'said',
+    'shall',
+}
 SEPARATORS = re.compile(r"([&,:;\s\u3031-\u3035\u309b\u309c\u30a0\u30fc\uff70]+)")
+MIN_KEYWORD_LENGTH = 4
+MAX_KEYWORD_LENGTH = 50
+
+
+def extract_keywords(keywords, title) -> dict:
+    """
+    Count the words in the keywords and title of a publication, excluding stopwords and short words. Publications
+    without keywords have no words.
+    :param keywords: list of keywords
+    :param title: title
+    :return: dictionary mapping each word to the number of times it occurs
+    """
+    if not keywords:
+        return {}
+    counts = defaultdict(int)
+    for word in SEPARATORS.sub(' ', " ".join([*keywords, title or '']).lower()).split():
+        if MIN_KEYWORD_LENGTH <= len(word) <= MAX_KEYWORD_LENGTH and word not in STOPWORDS:
+            counts[word] += 1
+    return dict(counts)
+
+
+def get_keywords(queryset=None, transform=float, max_size=60, limit=100, year=None):
+    """
+    Keyword cloud of a set of publications, from the precomputed keyword table
+    :param queryset: publications to include, all publications if None
+    :param transform: function applied to counts to scale word sizes
+    :param max_size: size of the most frequent word
+    :param limit: maximum number of words
+    :param year: only include publications from this year
+    :return: list of dictionaries with 'text' and 'size' keys, largest first
+    """
+    from .models import PublicationKeyword
+
+    entries = PublicationKeyword.objects.all()
+    if year:
+        entries = entries.filter(year=year)
+    if queryset is not None:
+        entries = entries.filter(publication__in=queryset.values('pk'))
+    cloud = entries.values('word').annotate(total=Sum('count')).order_by('-total', 'word')[:limit]
+    cloud = [(entry['word'], entry['total']) for entry in cloud]
+    _mx = cloud and transform(cloud[0][1]) or 0.0
+    return [{'text': word, 'size': max_size * transform(total) / _mx} for word, total in cloud]
+
 
+def get_keyword_breakdown(field, queryset=None, limit=10) -> dict:
+    """
+    Most frequent keywords per year or per beamline
+    :param field: 'year' or 'beamline'
+    :param queryset: publications to include, all publications if None
+    :param limit: maximum number of words for each year or beamline
+    :return: dictionary mapping each year or beamline acronym to a list of (word, count) tuples
+    """
+    from .models import PublicationKeyword
 
-def get_keywords(queryset, transform=float, max_size=60):
-    cloud = defaultdict(int)
-    txt = " ".join(
-        itertools.chain.from_iterable([p.keywords + [p.title] for p in queryset.all() if p.keywords])).lower()
-    # txt = u" ".join([p.title for p in queryset.all()]).lower()
-    txt = re.sub(STOPWORDS, ' ', txt)
-    txt = re.sub(SEPARATORS, ' ', txt)
-    for kw in txt.split():
-        if len(kw) < 4:
-            continue
-        cloud[kw] += 1
-    _mx = cloud and transform(max(cloud.values())) or 0.0
-    kwcloud = [{'text': k, 'size': max_size * transform(v) / _mx} for k, v in list(cloud.items())]
-    kwcloud.sort(key=lambda v: v['size'], reverse=True)
-    return kwcloud[:100]
+    group = {'year': 'year', 'beamline': 'publication__beamlines__acronym'}[field]
+    entries = PublicationKeyword.objects.filter(**{f'{group}__isnull': False})
+    if queryset is not None:
+        entries = entries.filter(publication__in=queryset.values('pk'))
+    breakdown = defaultdict(list)
+    for entry in entries.values(group, 'word').annotate(total=Sum('count')).order_by(group, '-total', 'word'):
+        words = breakdown[entry[group]]
+        if len(words) < limit:
+            words.append((entry['word'], entry['total']))
+    return dict(breakdown)
@@ -1,8 +1,9 @@
 from django import template
 from django.db.models import Q, Count
 from django.utils.safestring import mark_safe
-from publications import stats
-from publications.models import Publication, check_unique
+from publications import metrics, stats
+from publications.fingerprints import parse_author
+from publications.models import AuthorName, Publication, check_unique, match_user
 from beamlines.models import Facility
 import json
 import re
@@ -15,21 +16,6 @@ CAT_COLORS = ['#7eb852', '#07997e', '#4f54a8', '#991c71', '#cf003e', '#e3690b',
 ALT_COLORS = ['#1F77B4', '#AEC7E8', '#FF7F0E', '#FFBB78', '#41A42D', '#98DF8A', '#D62728', '#FF94C8']
 
 
-@register.filter(name="get_table_quality")
-def get_table_quality(tbl):
-    data = []
-    xvals = tbl.pop(0)
-    types = get_measures(None, tbl)
-    for t in types:
-        line = [entry for entry in tbl if entry[0] == t] or [None]
-        entries = []
-        for i, yr in enumerate(xvals):
-            if i and isinstance(yr, int):
-                entries.append({'x': yr, 'y': line[0] and line[0][i] or 0})
-        data.append({str(t): entries})
-    return data
-
-
 @register.simple_tag(takes_context=True)
 def show_funding(context):
     tbl = stats.summarize_funding(
@@ -123,18 +109,9 @@ def my_pub_count(context):
 @register.simple_tag(takes_context=True)
 def get_quality_tables(context):
     facility = context.get('beamline')
-    acronym = None if not facility else facility.acronym
-    if acronym:
-        qset = models.Article.objects.filter(
-            beamlines__parent__acronym__iexact=acronym, kind='article'
-        ) | models.Article.objects.filter(
-            beamlines__acronym__iexact=acronym, kind='article'
-        )
-        single = True
-    else:
-        qset = models.Publication.objects.filter(kind='article')
-        single = False
-    return stats.get_metrics(qset.distinct(), single)
+    if facility:
+        return metrics.get_metrics('beamline', facility.acronym)
+    return metrics.get_metrics()
 
 
 @register.tag
@@ -146,27 +123,16 @@ class BTQTNode(template.Node):
 
     def render(self, context):
         facility = context.get('beamline')
-        acronym = None if not facility else facility.acronym
-        qset = models.Article.objects.filter(pk__in=facility.details.get('beamteam_publications', []),
-                                             kind='article').distinct()
-        single = True
-        context['quality_tables'] = stats.get_metrics(qset.distinct(), single)
+        context['quality_tables'] = metrics.get_metrics('beamteam', facility.acronym)
         return ''
 
 
 @register.simple_tag(takes_context=True)
 def my_claim_count(context):
     user = context['user']
-    if user.is_authenticated:
-        qf = Q(authors__icontains='{0}, {1}'.format(user.last_name, user.first_name[0]))
-        if user.preferred_name:
-            qf |= Q(authors__icontains='{0}, {1}'.format(user.last_name, user.preferred_name[0]))
-        if user.other_names:
-            qf |= Q(authors__icontains='{0}, {1}'.format(user.other_names, user.first_name[0]))
-            qf |= Q(authors__icontains='{0}, {1}'.format(user.last_name, user.other_names[0]))
-    else:
-        qf = Q(authors__icontains='xxxxxx')
-    return models.Publication.objects.filter(qf).exclude(users__id__exact=user.pk).count()
+    if not user.is_authenticated:
+        return 0
+    return match_user(user).exclude(users__id__exact=user.pk).count()
 
 
 @register.filter(name='get_matches')
@@ -177,12 +143,12 @@ def get_matches(obj):
 @register.simple_tag(takes_context=True)
 def bt_claim_count(context):
     bl = context['bl']
-    qf = Q(authors__icontains='xxxxxx')
-    if bl.details.get('beamteam', None):
-        for btm in bl.details.get('beamteam', '').split(';'):
-            last_name = btm.split(', ')[0]
-            first_name = btm.split(', ')[1]
-            qf |= Q(authors__icontains='{0}, {1}'.format(last_name, first_name[0]))
+    authors = Q(pk__in=[])
+    for name in bl.details.get('beamteam', '').split(';'):
+        parts = parse_author(name)
+        if parts:
+            authors |= Q(surname=parts[0], initials__startswith=parts[1][:1])
+    qf = Q(pk__in=AuthorName.objects.filter(authors).values('publication'))
     qf |= Q(kind__in=[models.Publication.TYPES.msc_thesis, models.Publication.TYPES.phd_thesis])
     qf &= (Q(beamlines__parent__acronym__iexact=bl.acronym) | Q(beamlines__acronym__iexact=bl.acronym))
     queryset = models.Publication.objects.filter(qf).exclude(
@@ -0,0 +1,732 @@
+import json
+import tempfile
+import threading
+import time
+from datetime import date
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management import call_command
+from django.db.models import Q
+from django.test import TestCase, RequestFactory
+from django.urls import reverse
+
+from publications import api_views, metrics, models, stats, utils, views
+from publications.cassettes import Cassette, CassetteMiss, SyntheticSource
+from publications.fingerprints import title_fingerprint
+from publications.harvest import HarvestClient, TokenBucket
+from publications.httpcache import ResponseCache
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Serves canned OpenCitations and Crossref Event Data responses. DOIs starting with 10.429 are rejected with
+    a 429 response on their first request and DOIs starting with 10.500 always fail.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, data, status=200, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_etag(self, path):
+        with self.server.lock:
+            self.server.requests.append(path)
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self.send_json({'path': path}, headers={'ETag': '"v1"'})
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        if url.path.startswith('/etag/'):
+            return self.send_etag(url.path)
+        if url.path.startswith('/citations/doi:'):
+            doi = unquote(url.path[len('/citations/doi:'):])
+        else:
+            doi = parse_qs(url.query).get('obj-id', [''])[0]
+
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            server.requests.append(doi)
+            attempts = server.requests.count(doi)
+        try:
+            time.sleep(0.02)
+            if doi.startswith('10.500'):
+                self.send_json({}, status=503)
+            elif doi.startswith('10.429') and attempts == 1:
+                self.send_json({}, status=429, headers={'Retry-After': '0'})
+            elif url.path.startswith('/citations/'):
+                self.send_json([
+                    {'creation': '2023-05-01', 'author_sc': 'no'},
+                    {'creation': '2023-07-01', 'author_sc': 'yes'},
+                    {'creation': '2024-01-01', 'author_sc': 'no'},
+                ])
+            else:
+                self.send_json({'message': {
+                    'events': [{'timestamp': '2024-02-01T00:00:00Z'}], 'total-results': 1, 'next-cursor': None
+                }})
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+class StubServerMixin:
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        cls.server.lock = threading.Lock()
+        cls.server.daemon_threads = True
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}/'
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.active = self.server.max_active = 0
+        self.server.requests = []
+
+    def get_client(self, concurrency=3, rate=1000, retries=2, cache=False):
+        return HarvestClient(
+            workers=8, limits={'127.0.0.1': (concurrency, rate)}, retries=retries, timeout=5, cache=cache
+        )
+
+
+class HarvestClientTests(StubServerMixin, TestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for i in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09, "Tokens should be handed out at the given rate")
+
+    def test_concurrency_limit(self):
+        client = self.get_client(concurrency=2)
+        urls = [f'{self.base_url}citations/doi:10.1000/{i}' for i in range(10)]
+        results = list(client.map(client.get, urls))
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(response.status_code == 200 for url, response, error in results))
+        self.assertLessEqual(self.server.max_active, 2)
+
+    def test_retry(self):
+        client = self.get_client()
+        response = client.get(f'{self.base_url}citations/doi:10.429/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.requests, ['10.429/1', '10.429/1'])
+
+        response = client.get(f'{self.base_url}citations/doi:10.500/1')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.requests.count('10.500/1'), 3, "Failures should be retried twice")
+
+
+class PublicationMetricsTests(StubServerMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(12):
+            models.Publication.objects.create(title=f'Article {i}', code=f'10.1000/{i}', date=date(2023, 1, 1))
+        models.Publication.objects.create(title='Retried', code='10.429/1', date=date(2023, 1, 1))
+        models.Publication.objects.create(title='Patent', code='US123456', date=date(2023, 1, 1))
+
+    def update(self, **kwargs):
+        client = self.get_client()
+        return utils.update_publication_metrics(
+            client=client, citations_api=utils.OpenCitations(client=client, base_url=self.base_url),
+            mentions_api=utils.CrossRef(client=client, events_url=f'{self.base_url}events'), **kwargs
+        )
+
+    def test_update_metrics(self):
+        out = self.update()
+        self.assertEqual(out, {'created': 26, 'updated': 0, 'failed': 0})
+        metric = models.ArticleMetric.objects.get(publication__code='10.1000/0', year=2023)
+        self.assertEqual((metric.citations, metric.self_cites, metric.mentions), (2, 1, 0))
+        metric = models.ArticleMetric.objects.get(publication__code='10.1000/0', year=2024)
+        self.assertEqual((metric.citations, metric.self_cites, metric.mentions), (1, 0, 1))
+
+        # recent metrics are not fetched again
+        self.assertEqual(self.update(), {'created': 0, 'updated': 0, 'failed': 0})
+
+    def test_update_limit(self):
+        out = self.update(limit=5)
+        self.assertEqual(out['created'], 10)
+        self.assertEqual(models.ArticleMetric.objects.values('publication').distinct().count(), 5)
+
+    def test_update_codes(self):
+        out = self.update(codes=['10.1000/1', '10.1000/2', 'US123456'])
+        self.assertEqual(out['created'], 4)
+        self.assertEqual(
+            set(models.ArticleMetric.objects.values_list('publication__code', flat=True)), {'10.1000/1', '10.1000/2'}
+        )
+
+
+class ResponseCacheTests(StubServerMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(str(Path(self.tmp_dir.name) / 'http.db'), ttls={'test': 60})
+        self.harvester = self.get_client(cache=self.cache)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cached(self):
+        url = f'{self.base_url}citations/doi:10.1000/1'
+        first = self.harvester.get(url, source='test')
+        second = self.harvester.get(url, source='test')
+        self.assertEqual(first.json(), second.json())
+        self.assertTrue(getattr(second, 'from_cache', False))
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.harvester.get(url)
+        self.assertEqual(len(self.server.requests), 2, "Requests without a source should not be cached")
+
+    def test_revalidation(self):
+        url = f'{self.base_url}etag/1'
+        self.cache.ttls['test'] = 0
+        first = self.harvester.get(url, source='test')
+        second = self.harvester.get(url, source='test')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json(), second.json())
+        self.assertTrue(getattr(second, 'from_cache', False), "Expired entries should be revalidated")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_size_limit(self):
+        self.cache.max_size = 500
+        for i in range(10):
+            self.harvester.get(f'{self.base_url}citations/doi:10.1000/{i}', source='test')
+        self.assertLessEqual(self.cache.stats()['test']['size'], 500)
+
+    def test_offline(self):
+        url = f'{self.base_url}citations/doi:10.1000/1'
+        self.harvester.get(url, source='test')
+        self.cache.ttls['test'] = 0
+        self.cache.offline = True
+        self.assertEqual(self.harvester.get(url, source='test').status_code, 200)
+        self.assertEqual(self.harvester.get(f'{url}0', source='test').status_code, 504)
+        self.assertEqual(len(self.server.requests), 1)
+
+
+class CassetteTests(StubServerMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / 'cassette.json'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_citations(self, cassette) -> dict:
+        client = HarvestClient(cache=False, transport=cassette)
+        return utils.OpenCitations(client=client, base_url=self.base_url).citations('10.1000/1')
+
+    def test_record_replay(self):
+        with Cassette(self.path, record=True) as cassette:
+            recorded = self.get_citations(cassette)
+        self.assertEqual(len(self.server.requests), 1)
+
+        with Cassette(self.path) as cassette:
+            self.assertEqual(self.get_citations(cassette), recorded)
+            with self.assertRaises(CassetteMiss):
+                HarvestClient(cache=False, transport=cassette).get(f'{self.base_url}citations/doi:10.1000/2')
+        self.assertEqual(len(self.server.requests), 1, "Replayed requests should not reach the server")
+
+
+class SyntheticHarvestTests(TestCase):
+
+    def setUp(self):
+        self.source = SyntheticSource(seed=1, journals=3)
+        self.client = HarvestClient(cache=False, transport=self.source)
+
+    def test_create_publications(self):
+        dois = self.source.dois(20)
+        out = utils.create_publications(dois + dois[:5], client=self.client)
+        self.assertEqual(out, {
+            'journals': 3, 'publications': 20, 'inserted': 20, 'updated': 0, 'skipped': 5, 'failed': 0
+        })
+        self.assertEqual(models.Publication.objects.filter(code__in=dois).count(), 20)
+        self.assertEqual(models.Journal.objects.count(), 3)
+
+        out = utils.create_publications(dois, client=self.client)
+        self.assertEqual(out['publications'], 0, "Existing publications should not be fetched again")
+        self.assertEqual(out['skipped'], 20)
+
+    def test_bulk_ingest(self):
+        dois = self.source.dois(30)
+        works = [self.source.work(doi) for doi in dois]
+        funders = {funder['DOI'] for work in works for funder in work['funder']}
+        with self.assertNumQueries(17):
+            out = utils.ingest_works(works, client=self.client)
+        self.assertEqual((out['inserted'], out['updated'], out['skipped']), (30, 0, 0))
+        self.assertEqual(models.FundingSource.objects.count(), len(funders))
+        self.assertEqual(models.Publication.funders.through.objects.count(), 60)
+        self.assertEqual(
+            models.Publication.objects.filter(code__in=dois, journal__isnull=False).count(), 30,
+            "Publications should be linked to their journals"
+        )
+
+        # existing publications are updated only if they changed
+        models.Publication.objects.filter(code=dois[0]).update(title='Changed')
+        out = utils.ingest_works(works, client=self.client, update=True)
+        self.assertEqual((out['journals'], out['inserted'], out['updated'], out['skipped']), (0, 0, 1, 29))
+        self.assertEqual(models.Publication.objects.get(code=dois[0]).title, works[0]['title'][0])
+        self.assertEqual(models.Publication.funders.through.objects.count(), 60)
+
+    def test_deterministic(self):
+        other = SyntheticSource(seed=1, journals=3)
+        doi = self.source.dois(1, start=42)[0]
+        self.assertEqual(self.source.work(doi), other.work(doi))
+        self.assertNotEqual(self.source.work(doi), SyntheticSource(seed=2).work(doi))
+
+    def test_pdb_entries(self):
+        entries = utils.fetch_pdb_entries(self.source.pdb_codes(5), client=self.client)
+        self.assertEqual([entry['rcsb_id'] for entry in entries], self.source.pdb_codes(5))
+
+
+class PDBSyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from beamlines.models import Facility
+        cls.beamline = Facility.objects.create(name='Beamline One', acronym='BL1')
+
+    def setUp(self):
+        self.source = SyntheticSource(seed=1)
+        self.client = HarvestClient(cache=False, transport=self.source)
+        self.codes = self.source.pdb_codes(25)
+        site_map = patch.dict(utils.PDB_SITE_MAP, {'BL-1': 'BL1'})
+        site_map.start()
+        self.addCleanup(site_map.stop)
+
+    def test_sync(self):
+        out = utils.sync_pdb_entries(self.codes + self.codes[:5], client=self.client, page_size=10)
+        self.assertEqual(out, {'created': 25, 'updated': 0, 'linked': 25, 'pages': 3, 'resumed': False})
+        self.assertEqual(self.source.requests, 3, "Each page should be fetched with a single query")
+        self.assertEqual(self.beamline.publications.filter(kind='pdb').count(), 25)
+        self.assertFalse(models.SyncCheckpoint.objects.exists(), "Completed runs should remove their checkpoint")
+
+        # unchanged entries are neither updated nor linked again
+        models.Publication.objects.filter(code=self.codes[0]).update(title='Changed')
+        out = utils.sync_pdb_entries(self.codes, client=self.client, page_size=10)
+        self.assertEqual((out['created'], out['updated'], out['linked']), (0, 1, 0))
+        self.assertEqual(models.Publication.objects.filter(kind='pdb').count(), 25)
+        self.assertNotEqual(models.Publication.objects.get(code=self.codes[0]).title, 'Changed')
+
+    def test_resume(self):
+        models.SyncCheckpoint.objects.create(
+            name=utils.PDB_SYNC_NAME, codes=self.codes, position=20, totals={'created': 20, 'pages': 2}
+        )
+        out = utils.sync_pdb_entries(client=self.client, page_size=10)
+        self.assertTrue(out['resumed'])
+        self.assertEqual((out['created'], out['pages']), (25, 3))
+        self.assertEqual(self.source.requests, 1, "Only pending entries should be fetched")
+        self.assertEqual(
+            set(models.Publication.objects.filter(kind='pdb').values_list('code', flat=True)), set(self.codes[20:])
+        )
+
+        # a failed page keeps the checkpoint at the last completed page
+        with patch.object(utils, 'fetch_pdb_entries', side_effect=[
+            utils.fetch_pdb_entries(self.codes[:10], client=self.client), RuntimeError('interrupted')
+        ]):
+            with self.assertRaises(RuntimeError):
+                utils.sync_pdb_entries(self.codes, client=self.client, page_size=10)
+        checkpoint = models.SyncCheckpoint.objects.get(name=utils.PDB_SYNC_NAME)
+        self.assertEqual(checkpoint.position, 10)
+        self.assertEqual(checkpoint.pending, self.codes[10:])
+
+        out = utils.sync_pdb_entries(self.codes, client=self.client, page_size=10, restart=True)
+        self.assertFalse(out['resumed'])
+        self.assertEqual(out['pages'], 3)
+
+    def test_references(self):
+        entry = self.source.pdb_entry(self.codes[0])
+        doi = entry['rcsb_primary_citation']['pdbx_database_id_DOI'] = self.source.dois(1)[0]
+        article = models.Publication.objects.create(
+            kind='article', code=doi.upper(), title='Structure', date=date(2020, 1, 1), authors=['Smith, J.']
+        )
+        utils.create_pdb_entries([entry])
+        self.assertEqual(models.Publication.objects.get(code=self.codes[0]).reference, article)
+
+
+class DeduplicationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.original = models.Publication.objects.create(
+            title='Structure of the <i>Mn</i>-Catalase enzyme', code='10.1000/ABC.1', date=date(2021, 3, 1)
+        )
+        cls.copy = models.Publication.objects.create(
+            title='Structure of the Mn catalase enzyme.', date=date(2021, 6, 1), volume='12'
+        )
+        cls.variant = models.Publication.objects.create(
+            title='Structures of the Mn-catalase enzymes', code='https://doi.org/10.1000/abc.1', date=date(2022, 1, 1)
+        )
+        cls.other = models.Publication.objects.create(
+            title='Structure of the Mn-catalase enzyme', code='10.1000/xyz', date=date(2021, 1, 1)
+        )
+        cls.later = models.Publication.objects.create(title='Structure of the Mn-catalase enzyme', date=date(2015, 1, 1))
+        models.ArticleMetric.objects.create(publication=cls.copy, year=2022, citations=4)
+
+    def test_fingerprints(self):
+        self.assertEqual(self.original.code_fingerprint, '10.1000/abc.1')
+        self.assertEqual(self.original.code_fingerprint, self.variant.code_fingerprint)
+        self.assertEqual(self.original.title_fingerprint, self.copy.title_fingerprint)
+
+    def test_check_unique(self):
+        matches = models.check_unique(title='structure of the MN catalase ENZYME')
+        self.assertEqual(set(matches), {self.original, self.copy, self.other, self.later})
+        matches = models.check_unique(code='doi:10.1000/Abc.1')
+        self.assertEqual(set(matches), {self.original, self.variant})
+        self.assertFalse(models.check_unique().exists())
+
+    def test_check_unique_authors(self):
+        first = models.Publication.objects.create(title='Editorial', date=date(2020, 1, 1), authors=['Doe, Jane'])
+        second = models.Publication.objects.create(title='Editorial.', date=date(2021, 1, 1), authors=['Roe, R.'])
+
+        # generic titles only match when an author surname is shared
+        self.assertEqual(set(models.check_unique(title='Editorial', authors=['J. Doe'])), {first})
+        self.assertEqual(set(models.check_unique(title='Editorial', authors='Smith, A.; Roe, R.')), {second})
+        self.assertFalse(models.check_unique(title='Editorial', authors=['Smith, A.']).exists())
+        self.assertEqual(set(models.check_unique(title='Editorial')), {first, second})
+
+    def test_merge(self):
+        out = StringIO()
+        call_command('dedupepublications', stdout=out)
+        self.assertEqual(models.Publication.objects.count(), 5, "Duplicates should only be reported by default")
+
+        call_command('dedupepublications', merge=True, stdout=out)
+        self.assertEqual(
+            set(models.Publication.objects.values_list('pk', flat=True)),
+            {self.original.pk, self.other.pk, self.later.pk},
+            "Publications with different codes or years apart should be kept"
+        )
+        merged = models.Publication.objects.get(pk=self.original.pk)
+        self.assertEqual(merged.volume, '12')
+        self.assertEqual(merged.metrics.get().citations, 4)
+
+
+class AuthorMatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from users.models import User
+        cls.user = User.objects.create(
+            username='jsmith', first_name='Jane', other_names='Alice', last_name='Smith-Jones'
+        )
+        cls.exact = models.Publication.objects.create(
+            title='Exact', authors=['Doe, John', 'Smith-Jones, Jane A.'], date=date(2023, 1, 1)
+        )
+        cls.initial = models.Publication.objects.create(
+            title='Initial', authors=['J. Smith-Jones'], date=date(2022, 1, 1)
+        )
+        cls.ambiguous = models.Publication.objects.create(
+            title='Ambiguous', authors=['Smith-Jones, J. B.'], date=date(2021, 1, 1)
+        )
+        cls.other = models.Publication.objects.create(
+            title='Other', authors=['Smith-Jones, Peter', 'Smith, Jane'], date=date(2021, 1, 1)
+        )
+
+    def test_index(self):
+        self.assertEqual(
+            list(self.exact.author_names.order_by('position').values_list('surname', 'initials')),
+            [('doe', 'j'), ('smith jones', 'ja')]
+        )
+        self.exact.authors = ['Doe, John']
+        self.exact.save()
+        self.assertEqual(self.exact.author_names.count(), 1, "Index should be rebuilt on save")
+
+    def test_ranked_matches(self):
+        matches = models.match_user(self.user).order_by('-author_score')
+        self.assertEqual(
+            [(pub.title, pub.author_score) for pub in matches],
+            [('Exact', 3), ('Initial', 2), ('Ambiguous', 1)]
+        )
+
+        self.other.users.add(self.user)
+        matches = models.match_user(self.user, include=Q(pk__in=self.user.publications.values('pk')))
+        self.assertEqual(dict(matches.values_list('title', 'author_score'))['Other'], 0)
+
+
+class KeywordStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from beamlines.models import Facility
+        cls.beamline = Facility.objects.create(name='Beamline One', acronym='BL1')
+        cls.first = models.Publication.objects.create(
+            title='Protein crystallography of the enzyme', keywords=['protein', 'x-ray diffraction'],
+            date=date(2022, 1, 1)
+        )
+        cls.second = models.Publication.objects.create(
+            title='Soil imaging', keywords=['soil; imaging', 'protein'], date=date(2023, 1, 1)
+        )
+        cls.first.beamlines.add(cls.beamline)
+        models.Publication.objects.create(title='Without keywords', date=date(2023, 1, 1))
+
+    def test_extract_keywords(self):
+        self.assertEqual(
+            stats.extract_keywords(['in situ, high-pressure', 'catalysis'], 'Catalysis at high pressure'),
+            {'situ': 1, 'high-pressure': 1, 'catalysis': 2, 'high': 1, 'pressure': 1}
+        )
+        self.assertEqual(stats.extract_keywords([], 'Ignored title'), {})
+
+    def test_keyword_cloud(self):
+        words = stats.get_keywords()
+        self.assertEqual(words[0], {'text': 'protein', 'size': 60.0})
+        self.assertEqual({word['text'] for word in words}, {
+            'protein', 'crystallography', 'enzyme', 'x-ray', 'diffraction', 'soil', 'imaging'
+        })
+        words = stats.get_keywords(models.Publication.objects.filter(pk=self.second.pk))
+        self.assertEqual({word['text'] for word in words}, {'soil', 'imaging', 'protein'})
+        self.assertEqual([word['text'] for word in stats.get_keywords(year=2023)][0], 'imaging')
+
+        # statistics are updated on save
+        self.second.keywords = []
+        self.second.save()
+        self.assertEqual(stats.get_keywords(year=2023), [])
+
+    def test_breakdown(self):
+        self.assertEqual(stats.get_keyword_breakdown('year', limit=1), {2022: [('protein', 2)], 2023: [('imaging', 2)]})
+        self.assertEqual(list(stats.get_keyword_breakdown('beamline')), ['BL1'])
+
+    def test_cloud_view(self):
+        from beamlines.models import Facility
+        from users.models import User
+        self.client.force_login(User.objects.create(username='reader', first_name='Keyword', last_name='Reader'))
+        url = reverse('keyword-cloud')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['breakdown_field'], 'year')
+        self.assertEqual(list(response.context['breakdown']), [2022, 2023])
+
+        response = self.client.get(url, {'beamline': 'bl1'})
+        self.assertEqual(list(response.context['breakdown']), [2022])
+
+        response = self.client.get(url, {'year': '2022'})
+        self.assertEqual(response.context['breakdown_field'], 'beamline')
+        self.assertEqual(response.context['breakdown'], {'BL1': [
+            ('protein', 2), ('crystallography', 1), ('diffraction', 1), ('enzyme', 1), ('x-ray', 1)
+        ]})
+        self.assertEqual(self.client.get(url, {'year': '2023'}).context['breakdown'], {})
+
+        # a beamline without publications has no keywords
+        Facility.objects.create(name='Beamline Two', acronym='BL2')
+        response = self.client.get(url, {'year': '2022', 'beamline': 'BL2'})
+        self.assertEqual((response.context['words'], response.context['breakdown']), ([], {}))
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from beamlines.models import Facility
+        from users.models import Institution, User
+
+        cls.beamline = Facility.objects.create(name='Beamline One', acronym='BL1')
+        cls.institution = Institution.objects.create(name='University of Somewhere')
+        User.objects.create(username='jdoe', first_name='John', last_name='Doe', institution=cls.institution)
+        journal = models.Journal.objects.create(title='Journal of Things')
+        rated = models.JournalMetric.objects.create(journal=journal, year=2020, impact_factor=4.0, sjr_quartile=1)
+        for i, citations in enumerate([10, 5, 3, 3, 1, 0, 8]):
+            pub = models.Publication.objects.create(
+                title=f'Article {i}', date=date(2020 + i % 2, 1, 1), authors=['Doe, J.' if i < 3 else 'Roe, R.'],
+                journal_metric=rated if i % 2 else None,
+            )
+            if citations:
+                models.ArticleMetric.objects.create(publication=pub, year=2021, citations=citations - 1, self_cites=1)
+                models.ArticleMetric.objects.create(publication=pub, year=2022, citations=1)
+            if i < 4:
+                pub.beamlines.add(cls.beamline)
+        models.Publication.objects.create(title='Thesis', date=date(2021, 6, 1), kind='phd_thesis')
+
+    def test_h_index(self):
+        publications = models.Publication.objects.all()
+        self.assertEqual(metrics.h_index(publications), 3)
+        self.assertEqual(metrics.h_index(publications, by_year=True), {2020: 3, 2021: 2})
+        self.assertEqual(metrics.h_index(models.Publication.objects.none()), 0)
+
+    def test_metrics(self):
+        with self.assertNumQueries(4):
+            results = metrics.compute_metrics(models.Publication.objects.all())
+        self.assertEqual(results['kinds'], [('article', 'Peer-Reviewed Article'), ('phd_thesis', 'Doctoral Thesis')])
+        first, second = results['years']
+        self.assertEqual((first['year'], first['total'], first['kinds']), (2020, 4, [4, 0]))
+        self.assertEqual((first['citations'], first['self_cites'], first['cited'], first['h_index']), (22, 4, 4, 3))
+        self.assertEqual((second['total'], second['kinds'], second['citations'], second['h_index']), (4, [3, 1], 8, 2))
+        self.assertEqual((second['rated'], second['impact_factor'], second['quartiles']), (3, 4.0, [3, 0, 0, 0]))
+        summary = results['summary']
+        self.assertEqual((summary['total'], summary['kinds'], summary['citations']), (8, [7, 1], 30))
+        self.assertEqual((summary['h_index'], summary['impact_factor']), (3, 4.0))
+
+        period = metrics.compute_metrics(models.Publication.objects.all(), start=2021, end=2021)
+        self.assertEqual([row['year'] for row in period['years']], [2021])
+        self.assertEqual(period['summary']['h_index'], 2)
+
+    def test_scopes(self):
+        beamline = metrics.get_metrics('beamline', 'bl1')
+        self.assertEqual((beamline['summary']['total'], beamline['summary']['h_index']), (4, 3))
+        institution = metrics.get_metrics('institution', self.institution.pk)
+        self.assertEqual((institution['summary']['total'], institution['summary']['citations']), (3, 18))
+
+    def test_large_institution(self):
+        from users.models import User
+
+        User.objects.bulk_create([
+            User(username=f'user{i}', first_name='Jane', last_name=f'Surname{i}', institution=self.institution)
+            for i in range(1500)
+        ] + [User(username='aroe', first_name='Anna', last_name='Roe', institution=self.institution)])
+
+        # a surname only matches authors with the same first initial
+        publications = metrics.institution_publications(self.institution.pk)
+        self.assertEqual(set(publications.values_list('title', flat=True)), {'Article 0', 'Article 1', 'Article 2'})
+
+    def test_cache(self):
+        metrics.get_metrics(start=2020)
+        with self.assertNumQueries(0):
+            cached = metrics.get_metrics(start=2020)
+        self.assertEqual(cached['summary']['total'], 8)
+
+        # cached metrics are invalidated when publications change
+        models.Publication.objects.create(title='New', date=date(2022, 1, 1))
+        self.assertEqual(metrics.get_metrics(start=2020)['summary']['total'], 9)
+
+
+class CitationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from beamlines.models import Facility
+        cls.beamline = Facility.objects.create(name='Beamline One', acronym='BL1')
+        cls.journal = models.Journal.objects.create(title='Journal of Things')
+        cls.article = models.Publication.objects.create(
+            title='A rather long title about the structure of things which goes on for more than seventy characters',
+            authors=['Doe, J.', 'Roe, R.'], date=date(2022, 3, 1), journal=cls.journal, volume='12', issue='3',
+            pages='100-110', code='10.1000/abc'
+        )
+        cls.articles = [
+            models.Publication.objects.create(
+                title=f'Article {i}', authors=['Doe, J.'], date=date(2020, 1, 1 + i), journal=cls.journal
+            ) for i in range(5)
+        ]
+        cls.thesis = models.Publication.objects.create(
+            title='Thesis', authors=['Roe, R.'], date=date(2021, 1, 1), kind='phd_thesis', publisher='University'
+        )
+        for pub in [cls.article, cls.thesis, *cls.articles[:2]]:
+            pub.beamlines.add(cls.beamline)
+
+    def test_stored(self):
+        pub = models.Publication.objects.get(pk=self.article.pk)
+        with self.assertNumQueries(0):
+            citation = pub.cite()
+        self.assertEqual(
+            citation,
+            'Doe, J.; Roe, R. (2022). A rather long title about the structure of things which goes on for more than '
+            'seventy characters. <em>Journal of Things</em> 12(3), 100-110. 10.1000/abc'
+        )
+        self.assertEqual(pub.citations['full']['text'], citation.replace('<em>', '').replace('</em>', ''))
+        self.assertIn('structure of things which goes on for mo .... <em>Journal', pub.short_citation)
+        self.assertEqual(
+            models.Publication.objects.get(pk=self.thesis.pk).citation,
+            'Roe, R. (2021). Thesis. Doctoral Dissertation. University'
+        )
+
+    def test_regenerated(self):
+        self.thesis.title = 'Renamed'
+        self.thesis.save()
+        self.assertIn('Renamed', models.Publication.objects.get(pk=self.thesis.pk).citations['short']['text'])
+
+        self.journal.title = 'Annals of Things'
+        self.journal.save()
+        self.assertIn('<em>Annals of Things</em>', models.Publication.objects.get(pk=self.article.pk).cite())
+
+    def test_wizard_reentry(self):
+        from users.models import User
+
+        request = RequestFactory().post('/')
+        request.user = User.objects.create(username='author', first_name='Jane', last_name='Doe')
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        details = {
+            'kind': 'article', 'title': 'Structure of renamed things', 'authors': ['Smith, A.', 'Jones, B.'],
+            'date': '2022-03-01', 'code': '10.1000/ABC', 'keywords': ['crystals', 'proteins'],
+            'journal': self.journal.pk,
+        }
+        form = SimpleNamespace(cleaned_data={
+            'details': json.dumps(details), 'obj': self.article, 'notes': 'Corrected', 'beamlines': [],
+            'funders': [], 'author': False,
+        })
+        version = metrics.publications_version()
+        response = views.PublicationWizard(request=request).done([form])
+        self.assertEqual(response.status_code, 302)
+
+        pub = models.Publication.objects.get(pk=self.article.pk)
+        self.assertEqual(pub.title, details['title'])
+        self.assertEqual(pub.code_fingerprint, '10.1000/abc')
+        self.assertEqual(pub.title_fingerprint, title_fingerprint(details['title']))
+        self.assertIn('Smith, A.; Jones, B. (2022). Structure of renamed things', pub.cite())
+        self.assertEqual(set(pub.author_names.values_list('surname', flat=True)), {'smith', 'jones'})
+        self.assertTrue(pub.keyword_counts.filter(word='proteins').exists())
+        self.assertGreater(metrics.publications_version(), version)
+
+    def test_feed(self):
+        url = reverse('api-publication-feed')
+        response = self.client.get(url, {'size': 3})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [entry['id'] for entry in data['results']], [self.article.pk, self.thesis.pk, self.articles[4].pk]
+        )
+        self.assertEqual(data['results'][0]['cite'], self.article.cite())
+
+        pages = data['results']
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            pages.extend(data['results'])
+        self.assertEqual(len(pages), 7)
+        self.assertEqual(len({entry['id'] for entry in pages}), 7)
+
+        short = self.client.get(url, {'size': 1, 'style': 'short'}).json()['results'][0]
+        self.assertEqual(short['cite'], self.article.short_citation)
+
+        response = self.client.get(reverse('api-facility-publication-feed', args=['bl1']))
+        self.assertEqual(len(response.json()['results']), 4)
+        response = self.client.get(reverse('api-category-publication-feed', args=['phd_thesis', 'BL1']))
+        self.assertEqual([entry['id'] for entry in response.json()['results']], [self.thesis.pk])
+
+    def test_feed_revalidation(self):
+        url = reverse('api-publication-feed')
+        response = self.client.get(url)
+        self.assertEqual(response.headers['Cache-Control'], f'public, max-age={api_views.FEED_MAX_AGE}')
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        self.thesis.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(response.status_code, 200)
+
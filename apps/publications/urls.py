@@ -13,6 +13,13 @@ urlpatterns = [
 
     path('publications/funders/', views.FunderList.as_view(), name='funder-list'),
 
+    path('publications/quality/', views.QualitySummary.as_view(), name='quality-summary'),
+    path('publications/quality/<int:year>-<int:end_year>/', views.QualitySummary.as_view()),
+    path('publications/quality/beamline/<str:beamline>/', views.QualitySummary.as_view(), name='facility-quality-summary'),
+    path('publications/quality/beamline/<str:beamline>/<int:year>-<int:end_year>/', views.QualitySummary.as_view()),
+    path('publications/institutions/<int:pk>/', views.InstitutionMetrics.as_view(), name='institution-metrics'),
+    path('publications/institutions/<int:pk>/<int:year>-<int:end_year>/', views.InstitutionMetrics.as_view()),
+
     path('publications/topics/', views.SubjectAreaList.as_view(), name='subject-area-list'),
     path('publications/topics/<int:pk>/', views.EditSubjectArea.as_view(), name='edit-subject-area'),
 
@@ -4,15 +4,13 @@ import csv
 import itertools
 import json
 import operator
-import os
-import pickle
 import re
 import time
 from collections import defaultdict
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 from functools import reduce
 from io import BytesIO
-from pathlib import Path
+from urllib.parse import quote
 
 import pandas as pd
 import requests
@@ -27,6 +25,10 @@ from lxml import etree
 
 from misc.utils import MultiKeyDict
 from . import models
+from .citations import render_citations
+from .fingerprints import code_fingerprint
+from .harvest import HarvestClient, get_client
+from .metrics import touch_publications
 
 PDB_SITE = getattr(settings, 'USO_PDB_SITE', 'CLSI')
 PDB_SITE_MAP = getattr(settings, 'USO_PDB_SITE_MAP', {})
@@ -37,13 +39,25 @@ CROSSREF_THROTTLE = getattr(settings, 'CROSSREF_THROTTLE', 0.025)  # time delay
 CROSSREF_BATCH_SIZE = getattr(settings, 'CROSSREF_BATCH_SIZE', 10)
 GOOGLE_API_KEY = getattr(settings, 'GOOGLE_API_KEY', None)
 
-OPEN_CITATIONS_URL = "https://opencitations.net/index/api/v2/"
-CROSSREF_EVENTS_URL = "https://api.eventdata.crossref.org/v1/events/distinct"
+OPEN_CITATIONS_URL = getattr(settings, 'OPEN_CITATIONS_URL', "https://opencitations.net/index/api/v2/")
+CROSSREF_EVENTS_URL = getattr(settings, 'CROSSREF_EVENTS_URL', "https://api.eventdata.crossref.org/v1/events/distinct")
 CROSSREF_CITATIONS_URL = "https://www.crossref.org/openurl/"
+CROSSREF_API_URL = getattr(settings, 'CROSSREF_API_URL', "https://api.crossref.org/")
 PDB_SEARCH_URL = getattr(settings, 'PDB_SEARCH_URL', "https://search.rcsb.org/rcsbsearch/v2/query")
 PDB_REPORT_URL = getattr(settings, 'PDB_REPORT_URL', "https://data.rcsb.org/graphql")
+PDB_PAGE_SIZE = getattr(settings, 'PDB_PAGE_SIZE', 250)  # PDB codes per GraphQL query
+PDB_SYNC_NAME = 'pdb-entries'  # name of the checkpoint of PDB synchronization runs
 GOOGLE_BOOKS_API = getattr(settings, 'GOOGLE_BOOKS_API', "https://www.googleapis.com/books/v1/volumes")
 SCIMAGO_URL = getattr(settings, 'SCIMAGO_URL', "https://www.scimagojr.com/journalrank.php")
+BULK_BATCH_SIZE = getattr(settings, 'PUBLICATION_BATCH_SIZE', 500)  # maximum rows per bulk statement
+
+# Publication fields taken from CrossRef works, and those refreshed when existing publications are updated
+ARTICLE_FIELDS = ['date', 'authors', 'code', 'kind', 'title', 'publisher', 'volume', 'issue', 'pages', 'journal']
+UPDATE_FIELDS = [
+    'date', 'authors', 'kind', 'title', 'main_title', 'editors', 'publisher', 'volume', 'issue', 'pages',
+    'journal_id', 'journal_metric_id'
+]
+PDB_UPDATE_FIELDS = ['title', 'authors', 'date', 'pdb_doi']
 
 
 SEARCH_JSON = {
@@ -140,8 +154,36 @@ def flatten(d, parent_key='') -> dict:
 
 
 class CrossRef(Crossref):
-    def __init__(self):
+    def __init__(self, client: HarvestClient = None, events_url: str = CROSSREF_EVENTS_URL):
         super().__init__(mailto=CROSSREF_API_EMAIL, ua_string='USO')
+        self.client = client or get_client()
+        self.events_url = events_url
+
+    def fetch(self, route: str, ids):
+        """
+        Fetch one or more records by identifier through the harvesting client so that responses are cached.
+        Raises requests.HTTPError if a record can not be fetched.
+        :param route: API route, e.g. 'works' or 'journals'
+        :param ids: identifier or list of identifiers
+        :return: the JSON response, or a list of responses if a list of identifiers was given
+        """
+        params = {'mailto': self.mailto} if self.mailto else {}
+        results = []
+        for code in ([ids] if isinstance(ids, str) else ids):
+            response = self.client.get(f'{CROSSREF_API_URL}{route}/{quote(code)}', source='crossref', params=params)
+            response.raise_for_status()
+            results.append(response.json())
+        return results[0] if len(results) == 1 else results
+
+    def works(self, ids=None, **kwargs):
+        if ids is None or kwargs:
+            return super().works(ids=ids, **kwargs)
+        return self.fetch('works', ids)
+
+    def journals(self, ids=None, **kwargs):
+        if ids is None or kwargs:
+            return super().journals(ids=ids, **kwargs)
+        return self.fetch('journals', ids)
 
     def mentions(self, doi, year=None):
         headers = {
@@ -159,7 +201,7 @@ class CrossRef(Crossref):
         events = []
         more_results = True
         while more_results:
-            response = requests.get(CROSSREF_EVENTS_URL, params=params, headers=headers)
+            response = self.client.get(self.events_url, source='crossref-events', params=params, headers=headers)
             if response.status_code == 200:
                 result = response.json()
                 message = result.get('message', {})
@@ -184,10 +226,10 @@ class CrossRef(Crossref):
 
 
 class OpenCitations:
-    def __init__(self, api_key=None, rate_limit=10):
-        self.rate_limit = rate_limit
+    def __init__(self, api_key=None, client: HarvestClient = None, base_url: str = OPEN_CITATIONS_URL):
         self.api_key = api_key or OPEN_CITATIONS_API_KEY
-        self.base_url = OPEN_CITATIONS_URL
+        self.client = client or get_client()
+        self.base_url = base_url
         self.headers = {
             'Accept': 'application/json',
             'authorization': self.api_key,
@@ -201,9 +243,9 @@ class OpenCitations:
         :param year: Optional year to filter results by.
         :return: Citations as a list of dicts
         """
-        filters = '?filter=creation={year}' if year else ''
+        filters = f'?filter=creation={year}' if year else ''
         url = f"{self.base_url}citations/doi:{doi}{filters}"
-        response = requests.get(url, headers=self.headers)
+        response = self.client.get(url, source='opencitations', headers=self.headers)
         if response.status_code == 200:
             data = response.json()
             return data
@@ -393,6 +435,15 @@ class ArticleParser(ObjectParser):
         'monograph': models.Publication.TYPES.book,
     }
 
+    def __init__(self, entry, journals: dict = None):
+        """
+        :param entry: CrossRef work entry
+        :param journals: optional dictionary mapping ISSN codes to existing journal ids, used to resolve the
+            journal instead of querying the database for each entry
+        """
+        super().__init__(entry)
+        self.journals = journals
+
     def get_code(self):
         return self._entry['DOI']
 
@@ -452,10 +503,13 @@ class ArticleParser(ObjectParser):
         names += self._entry.get('container-title', [])
         names.sort(key=lambda v: len(v))
         names = list(filter(None, names))
-        issn_query = reduce(operator.__or__, [Q(codes__icontains=issn) | Q(issn__iexact=issn) for issn in issns], Q())
-        journal = models.Journal.objects.filter(issn_query).distinct().first()
+        if self.journals is not None:
+            journal = next((self.journals[issn] for issn in issns if issn in self.journals), None)
+        else:
+            issn_query = reduce(operator.__or__, [Q(codes__icontains=issn) | Q(issn__iexact=issn) for issn in issns], Q())
+            journal = models.Journal.objects.filter(issn_query).distinct().values_list('pk', flat=True).first()
         if journal:
-            return journal.pk
+            return journal
         elif issns:
             return {
                 'title': '; '.join(self._entry.get('container-title', [])),
@@ -553,9 +607,10 @@ class SCIMagoParser(ObjectParser):
         )
 
 
-def fetch_pdb_codes():
+def fetch_pdb_codes(client: HarvestClient = None):
     """
     Retrieve all revised PDB Codes for the facility as a list of strings
+    :param client: HarvestClient instance, the shared client is used if not provided
     """
     dt = timezone.localtime(timezone.now() - timedelta(days=180))
     search = copy.deepcopy(SEARCH_JSON)
@@ -563,7 +618,7 @@ def fetch_pdb_codes():
     search['query']['nodes'][1]['parameters']['value'] = f"{dt:%Y-%m-%d}"
     codes = []
     try:
-        response = requests.post(PDB_SEARCH_URL, json=search)
+        response = (client or get_client()).post(PDB_SEARCH_URL, source='pdb-search', json=search)
         if response.status_code == 200:
             result = response.json()
             codes = [item['identifier'].upper() for item in result.get('result_set', [])]
@@ -575,17 +630,18 @@ def fetch_pdb_codes():
     return codes
 
 
-def fetch_pdb_entries(codes) -> list[dict]:
+def fetch_pdb_entries(codes, client: HarvestClient = None) -> list[dict]:
     """
     Fetch the CSV data for all specified PDB codes
     :param codes:  list of strings representing pdbcodes
+    :param client: HarvestClient instance, the shared client is used if not provided
     :return: a list of dictionaries one for each entry containing the report rows
     """
 
     params = REPORT_QUERY
     params = params.format(', '.join([f'"{pdb}"' for pdb in codes]))
 
-    response = requests.post(PDB_REPORT_URL, json={'query': params})
+    response = (client or get_client()).post(PDB_REPORT_URL, source='pdb', json={'query': params})
 
     if response.status_code == 200:
         result = response.json()
@@ -595,78 +651,167 @@ def fetch_pdb_entries(codes) -> list[dict]:
         return []
 
 
-def create_pdb_entries(entries):
+def parse_pdb_entry(entry: dict) -> PDBParser:
     """
-    Create database entries for PDB results
-    :param entries: a list of dictionaries returned from PDB search reports
-    :return: a dictionary representing the numbers of entries created or updated
+    Parse a PDB GraphQL entry, keeping the diffraction source and detector at the facility site
+    :param entry: entry returned by the PDB GraphQL API
     """
-    from beamlines.models import Facility
+    sources = entry.get('diffrn_source') or []
+    index = next((i for i, src in enumerate(sources) if src.get('pdbx_synchrotron_site') == PDB_SITE), -1)
+    for key in ['diffrn_source', 'diffrn_detector']:
+        items = entry.get(key) or []
+        entry[key] = items[index] if items and -len(items) <= index < len(items) else None
+    return PDBParser(flatten(entry))
 
-    no_refs = models.Publication.objects.filter(
-        kind=models.Publication.TYPES.pdb, reference__isnull=True
-    ).distinct('code').in_bulk(field_name='code')
 
-    old_entries = models.Publication.objects.filter(kind=models.Publication.TYPES.pdb).values_list('code', flat=True)
-
-    new_entries = {}
-    updated_entries = []
+def create_pdb_entries(entries, batch_size: int = BULK_BATCH_SIZE) -> dict:
+    """
+    Create or update PDB depositions in bulk. Existing depositions are found by code in a single query, new ones
+    are inserted, changed ones are updated, and missing beamline links are added, each with batched statements.
 
-    entry_acronyms = defaultdict(list)  # a list of facility names for each pdb code
+    :param entries: a list of dictionaries returned from PDB GraphQL reports
+    :param batch_size: maximum number of rows per insert or update statement
+    :return: numbers of depositions created and updated, and of beamline links added
+    """
+    from beamlines.models import Facility
 
+    records = {}
+    acronyms = defaultdict(set)  # facility acronyms for each pdb code
     for entry in entries:
-        for i, src in enumerate(entry['diffrn_source']):
-            if src['pdbx_synchrotron_site'] == PDB_SITE:
-                break
-        for k in ['diffrn_source', 'diffrn_detector']:
-            entry[k] = entry.get(k) and entry.get(k, [])[i] or None
-        entry = flatten(entry)
-
-        record = PDBParser(entry)
+        record = parse_pdb_entry(entry)
         info = record.dict()
+        if isinstance(info['date'], datetime):
+            info['date'] = info['date'].date()
+        records.setdefault(info['code'], info)
+        acronyms[info['code']].update(filter(None, record['beamlines']))
+
+    existing = defaultdict(list)
+    fingerprints = {code_fingerprint(code): code for code in records}
+    for chunk in chunker(fingerprints, batch_size):
+        chunk_pubs = models.Publication.objects.filter(
+            kind=models.Publication.TYPES.pdb, code_fingerprint__in=list(chunk)
+        )
+        for pub in chunk_pubs:
+            existing[fingerprints[pub.code_fingerprint]].append(pub)
+
+    to_create = []
+    to_update = []
+    for code, info in records.items():
+        if code not in existing:
+            pub = models.Publication(**info)
+            pub.update_fingerprints()
+            pub.update_citations()
+            to_create.append(pub)
+            continue
+        for pub in existing[code]:
+            changed = [field for field in PDB_UPDATE_FIELDS if info.get(field) and getattr(pub, field) != info[field]]
+            for field in changed:
+                setattr(pub, field, info[field])
+            if changed:
+                pub.update_fingerprints()
+                pub.update_citations()
+                to_update.append(pub)
 
-        if info['code'] in old_entries:
-            # Update citation parameter if citation has changed
-            if info['code'] in no_refs and record['reference'] and not no_refs[info['code']].pdb_doi:
-                no_refs[info['code']].pdb_doi = record['reference']
-                updated_entries.append(no_refs[info['code']])
-        else:
-            # New entries
-            entry_acronyms[info['code']].extend(record['beamlines'])
-            if not info['code'] in new_entries:  # entry will exist already for multi-beamline entries
-                new_entries[info['code']] = models.Publication(**info)
-
-    # update old entries if any changes have happened
-    if updated_entries:
-        models.Publication.objects.bulk_update(updated_entries, fields=['citation'])
-
-    # create new entries if any
-    if new_entries:
-        models.Publication.objects.bulk_create(new_entries.values())
-
-    # finally, add beamline relationships to newly created depositions:
-    target_entries = models.Publication.objects.filter(
-        code__in=entry_acronyms.keys()
-    ).distinct('code').in_bulk(field_name='code')
     with transaction.atomic():
-        for code, deposition in target_entries.items():
-            deposition.beamlines.set(Facility.objects.filter(acronym__in=entry_acronyms[code]))
-    return {'created': len(new_entries), 'updated': len(updated_entries)}
+        models.Publication.objects.bulk_create(to_create, batch_size=batch_size)
+        models.Publication.objects.bulk_update(
+            to_update, fields=PDB_UPDATE_FIELDS + ['code_fingerprint', 'title_fingerprint', 'citations'],
+            batch_size=batch_size
+        )
+        created = to_create
+        if any(pub.pk is None for pub in to_create):
+            # backends which do not return primary keys from bulk inserts
+            created = list(models.Publication.objects.filter(
+                kind=models.Publication.TYPES.pdb, code__in=[pub.code for pub in to_create]
+            ))
+
+        # add missing beamline links to new and existing depositions
+        facilities = dict(Facility.objects.filter(
+            acronym__in={acronym for names in acronyms.values() for acronym in names}
+        ).values_list('acronym', 'pk'))
+        pks = defaultdict(list)
+        for pub in [*created, *(pub for pubs in existing.values() for pub in pubs)]:
+            pks[pub.code].append(pub.pk)
+        Link = models.Publication.beamlines.through
+        linked = set(Link.objects.filter(
+            publication__in=[pk for items in pks.values() for pk in items]
+        ).values_list('publication_id', 'facility_id'))
+        links = [
+            Link(publication_id=pk, facility_id=facilities[acronym])
+            for code, items in pks.items()
+            for pk in items
+            for acronym in sorted(acronyms[code])
+            if acronym in facilities and (pk, facilities[acronym]) not in linked
+        ]
+        Link.objects.bulk_create(links, batch_size=batch_size)
+
+        # link depositions to the publications of their primary citations, if already known
+        link_pdb_references([
+            pub for pub in [*created, *(pub for pubs in existing.values() for pub in pubs)] if not pub.reference_id
+        ], batch_size=batch_size)
+
+        models.sync_author_names(created + to_update)
+        models.sync_keywords(created + to_update)
+    touch_publications()
+    return {'created': len(to_create), 'updated': len(to_update), 'linked': len(links)}
 
 
-def fetch_book(isbn_list):
+def sync_pdb_entries(codes: list[str] = None, client: HarvestClient = None, page_size: int = PDB_PAGE_SIZE,
+                     restart: bool = False) -> dict:
+    """
+    Synchronize PDB depositions in pages of codes, each fetched with a single GraphQL query and applied in bulk
+    with create_pdb_entries. Progress is saved in a checkpoint after every page, so an interrupted run resumes
+    from the first unprocessed page when called again.
+
+    :param codes: PDB codes to synchronize, recently revised entries for the facility if not provided. Ignored
+        when resuming an interrupted run.
+    :param client: HarvestClient instance, the shared client is used if not provided
+    :param page_size: number of codes per GraphQL query
+    :param restart: discard the checkpoint of an interrupted run and start again
+    :return: numbers of depositions created and updated, beamline links added and pages processed, and whether
+        an interrupted run was resumed
+    """
+    client = client or get_client()
+    checkpoint = models.SyncCheckpoint.objects.filter(name=PDB_SYNC_NAME).first()
+    if checkpoint and restart:
+        checkpoint.delete()
+        checkpoint = None
+    resumed = checkpoint is not None
+    if not checkpoint:
+        codes = fetch_pdb_codes(client=client) if codes is None else codes
+        checkpoint = models.SyncCheckpoint.objects.create(name=PDB_SYNC_NAME, codes=list(dict.fromkeys(codes)))
+
+    totals = {'created': 0, 'updated': 0, 'linked': 0, 'pages': 0, **checkpoint.totals}
+    for page in chunker(checkpoint.pending, page_size):
+        page = list(page)
+        entries = fetch_pdb_entries(page, client=client)
+        with transaction.atomic():
+            out = create_pdb_entries(entries)
+            for key, value in out.items():
+                totals[key] += value
+            totals['pages'] += 1
+            checkpoint.position += len(page)
+            checkpoint.totals = totals
+            checkpoint.save(update_fields=['position', 'totals', 'modified'])
+
+    checkpoint.delete()
+    return {**totals, 'resumed': resumed}
+
+
+def fetch_book(isbn_list, client: HarvestClient = None):
     """
     Given a list of book ISBN numbers, return metadata for the first entry
     that successfully resolves using Google's Books API
 
     :param isbn_list: list of ISBN numbers
+    :param client: HarvestClient instance, the shared client is used if not provided
     :return: book parser
     """
 
     for isbn in isbn_list:
         isbn = re.sub(r'[\s_-]', '', isbn)
         params = {'q': f'isbn:{isbn}', 'key': GOOGLE_API_KEY}
-        response = requests.get(GOOGLE_BOOKS_API, params=params)
+        response = (client or get_client()).get(GOOGLE_BOOKS_API, source='books', params=params)
         if response.status_code == requests.codes.ok:
             result = response.json()
             if result['totalItems'] == 0:
@@ -692,135 +837,315 @@ def chunker(iterable, n):
     )
 
 
-def create_publications(doi_list):
+def get_journal_index() -> dict:
     """
-    Given a list of dois, create database entries for the publications
-    :param doi_list:
-    :return: a dictionary representing the numbers of entries created
+    Dictionary mapping every known ISSN code to the id of its journal
     """
+    index = {}
+    for pk, issn, codes in models.Journal.objects.values_list('pk', 'issn', 'codes'):
+        for code in [issn, *(codes or [])]:
+            if code:
+                index[code] = pk
+    return index
 
-    existing_pubs = set(models.Publication.objects.values_list('code', flat=True))
-    existing_journals = MultiKeyDict(
-        {
-            tuple(codes): pk
-            for codes, pk in models.Journal.objects.values_list('codes', 'pk')
-        }
-    )
-    # avoid fetching exising entries
-    pending_doi_list = list(set(doi_list) - existing_pubs)
-
-    if not pending_doi_list:
-        return {'journals': 0, 'publications': 0}
 
-    # fetch metadata from CrossRef
-    cr = CrossRef()
-    results = cr.works(ids=pending_doi_list)
+def fetch_journal(codes, cr: CrossRef) -> dict:
+    """
+    Fetch journal details from CrossRef trying each ISSN code in turn
+    :param codes: ISSN codes of the journal
+    :param cr: CrossRef instance
+    :return: dictionary of journal fields, empty if the journal could not be found
+    """
+    for code in codes:
+        try:
+            result = cr.journals(ids=code)
+        except requests.exceptions.HTTPError:
+            continue
+        return JournalParser(result['message']).dict()
+    return {}
 
-    # fix inconsistent JSON from works
-    results = results if isinstance(results, list) else [results]
 
-    new_publications = {}  # details of publications to create indexed by doi code
-    new_journals = MultiKeyDict({})  # journals to create
+def ingest_works(works: list[dict], client: HarvestClient = None, update: bool = False,
+                 batch_size: int = BULK_BATCH_SIZE) -> dict:
+    """
+    Create publications in bulk from CrossRef work entries. Entries are normalized in memory, existing
+    publications, journals, journal metrics and funders are resolved with one query each, then new rows and
+    funder relationships are inserted in batches within a single transaction. Missing journal and book details
+    are fetched concurrently.
+
+    :param works: list of CrossRef work entries
+    :param client: HarvestClient instance, the shared client is used if not provided
+    :param update: refresh the metadata of existing publications instead of skipping them
+    :param batch_size: maximum number of rows per insert or update statement
+    :return: numbers of journals created, and of publications inserted, updated or skipped
+    """
 
-    # first pass to create publication details
-    for item in results:
-        entry = ArticleParser(item['message'])
-        details = entry.dict()
+    client = client or get_client()
+    cr = CrossRef(client=client)
+    journal_index = get_journal_index()
+
+    entries = {}
+    for work in works:
+        entry = ArticleParser(work, journals=journal_index)
+        entries.setdefault(code_fingerprint(entry['code']), entry)
+
+    # records are identified by their code fingerprints from here on
+    existing = defaultdict(list)
+    for chunk in chunker(entries.keys(), batch_size):
+        for pub in models.Publication.objects.filter(code_fingerprint__in=list(chunk)):
+            existing[pub.code_fingerprint].append(pub)
+    skipped = len(works) - len(entries)
+    if not update:
+        skipped += len(existing)
+        entries = {code: entry for code, entry in entries.items() if code not in existing}
+
+    # normalize entries
+    records = {}
+    new_journals = MultiKeyDict({})
+    funders = {}
+    for code, entry in entries.items():
+        details = {field: entry[field] for field in ARTICLE_FIELDS}
+        details['funders'] = []
+        for funder in entry['funders']:
+            if funder['doi']:
+                funders.setdefault(funder['doi'], {'name': funder['name']})
+                details['funders'].append(funder['doi'])
+        journal = details.pop('journal')
+        if isinstance(journal, dict):
+            new_journals[journal['codes']] = journal
+            details['journal_issn'] = journal['codes']
+        else:
+            details['journal_id'] = journal
+        records[code] = details
 
-        if details['code'] in existing_pubs:
-            # publication exists already
+    # fetch book details for chapters and books
+    books = {
+        code: entry['isbn'] for code, entry in entries.items()
+        if records[code]['kind'] in [models.Publication.TYPES.chapter, models.Publication.TYPES.book]
+    }
+    for code, book, error in client.map(lambda code: fetch_book(books[code], client=client), books):
+        if not book:
             continue
-
+        details = records[code]
         if details['kind'] == models.Publication.TYPES.chapter:
-            book_entry = fetch_book(entry['isbn'])
-            details['main_title'] = book_entry['title']
-            details['editor'] = book_entry['authors']
-            details['publisher'] = book_entry['publisher']
-        elif details['kind'] == models.Publication.TYPES.book:
-            book_entry = fetch_book(entry['isbn'])
-            details.update(book_entry.dict())
+            details['main_title'] = book['title']
+            details['editors'] = book['authors']
+            details['publisher'] = book['publisher']
         else:
-            journal = entry['journal']
-            if isinstance(journal, dict):
-                codes = journal['codes']
-                if codes in existing_journals:
-                    details['journal_id'] = existing_journals[codes]
-                else:
-                    # add journal details to new journals to create
-                    new_journals[codes] = journal
-
-                # keep issn for later use to swap for journal_id
-                details['journal_issn'] = codes
-            elif isinstance(journal, int):
-                # journal_id is already set, no need to create a new journal
-                details['journal_id'] = journal
-
-        new_publications[details['code']] = details
-
-    # Fetch new journal entries
-    for codes, journal in new_journals.items():
-        found = False
-        for code in codes:
-            try:
-                results = cr.journals(ids=code)
-                found = True
-            except requests.exceptions.HTTPError as e:
-                continue
+            details.update({key: book[key] for key in ['title', 'publisher'] if book.get(key)})
 
-            # update journal details in new journals
-            entry = JournalParser(results['message'])
-            new_journals[codes].update(entry.dict())
-            break
+    # fetch details of new journals
+    for codes, info, error in client.map(lambda codes: fetch_journal(codes, cr), list(new_journals.keys())):
+        new_journals[codes].update(info or {})
 
-    # now ready to create journals
-    to_create = MultiKeyDict(
-        {
-            codes: models.Journal(**details) for codes, details in new_journals.items()
-            if codes
+    with transaction.atomic():
+        models.Journal.objects.bulk_create(
+            [models.Journal(**details) for details in new_journals.values()], batch_size=batch_size
+        )
+        if new_journals:
+            journal_index = get_journal_index()
+
+        for details in records.values():
+            if 'journal_issn' in details:
+                codes = details.pop('journal_issn')
+                details['journal_id'] = next(
+                    (journal_index[code] for code in codes if code in journal_index), None
+                )
+
+        # resolve journal metrics for the year of publication
+        journal_ids = {details['journal_id'] for details in records.values() if details['journal_id']}
+        years = {details['date'].year for details in records.values()}
+        journal_metrics = {
+            (journal, year): pk for pk, journal, year in models.JournalMetric.objects.filter(
+                journal__in=journal_ids, year__in=years
+            ).values_list('pk', 'journal', 'year')
         }
-    )
+        for details in records.values():
+            details['journal_metric_id'] = journal_metrics.get((details['journal_id'], details['date'].year))
+        journal_titles = dict(models.Journal.objects.filter(pk__in=journal_ids).values_list('pk', 'title'))
+
+        # create missing funding sources
+        known_funders = dict(models.FundingSource.objects.filter(doi__in=funders).values_list('doi', 'pk'))
+        models.FundingSource.objects.bulk_create(
+            [models.FundingSource(doi=doi, **info) for doi, info in funders.items() if doi not in known_funders],
+            batch_size=batch_size, ignore_conflicts=True
+        )
+        if len(known_funders) < len(funders):
+            known_funders = dict(models.FundingSource.objects.filter(doi__in=funders).values_list('doi', 'pk'))
+
+        # insert new publications and update existing ones
+        to_create = []
+        to_update = []
+        for code, details in records.items():
+            fields = {key: value for key, value in details.items() if key != 'funders'}
+            if code not in existing:
+                pub = models.Publication(**fields)
+                pub.update_fingerprints()
+                pub.citations = render_citations(pub, journal=journal_titles.get(pub.journal_id))
+                to_create.append(pub)
+                continue
+            for pub in existing[code]:
+                changed = [key for key in UPDATE_FIELDS if key in fields and getattr(pub, key) != fields[key]]
+                for key in changed:
+                    setattr(pub, key, fields[key])
+                if changed:
+                    pub.update_fingerprints()
+                    pub.citations = render_citations(pub, journal=journal_titles.get(pub.journal_id))
+                    to_update.append(pub)
+        models.Publication.objects.bulk_create(to_create, batch_size=batch_size)
+        models.Publication.objects.bulk_update(
+            to_update, fields=UPDATE_FIELDS + ['code_fingerprint', 'title_fingerprint', 'citations'],
+            batch_size=batch_size
+        )
+        skipped += sum(len(existing[code]) for code in records if code in existing) - len(to_update)
+
+        # link funders to new and existing publications, and index new and changed publications
+        publications = defaultdict(list)
+        to_index = []
+        changed = {pub.pk for pub in to_update}
+        for chunk in chunker(records.keys(), batch_size):
+            chunk_pubs = models.Publication.objects.filter(code_fingerprint__in=list(chunk))
+            for pub in chunk_pubs.only('pk', 'code_fingerprint', 'authors', 'keywords', 'title', 'date'):
+                publications[pub.code_fingerprint].append(pub.pk)
+                if pub.code_fingerprint not in existing or pub.pk in changed:
+                    to_index.append(pub)
+        models.sync_author_names(to_index)
+        models.sync_keywords(to_index)
+        Link = models.Publication.funders.through
+        links = [
+            Link(publication_id=pk, fundingsource_id=known_funders[doi])
+            for code, details in records.items()
+            for pk in publications[code]
+            for doi in details['funders']
+        ]
+        Link.objects.bulk_create(links, batch_size=batch_size, ignore_conflicts=True)
+    touch_publications()
+
+    return {
+        'journals': len(new_journals),
+        'inserted': len(to_create),
+        'updated': len(to_update),
+        'skipped': skipped,
+    }
 
-    models.Journal.objects.bulk_create(to_create.values())
 
-    # update journal_ids
-    existing_journals = MultiKeyDict(
-        {
-            tuple(j.codes): j
-            for j in models.Journal.objects.all()
-        }
-    )
+def create_publications(doi_list, client: HarvestClient = None, update: bool = False) -> dict:
+    """
+    Given a list of dois, fetch the metadata from CrossRef concurrently and create database entries for the
+    publications in bulk, see ingest_works.
+
+    :param doi_list: list of DOIs, duplicates are ignored
+    :param client: HarvestClient instance, the shared client is used if not provided
+    :param update: refresh the metadata of existing publications instead of skipping them
+    :return: a dictionary representing the numbers of entries created, updated, skipped and failed
+    """
+
+    codes = {code_fingerprint(doi): doi for doi in doi_list if code_fingerprint(doi)}
+    existing = set()
+    if not update:
+        for chunk in chunker(codes, BULK_BATCH_SIZE):
+            existing.update(
+                models.Publication.objects.filter(code_fingerprint__in=list(chunk)).values_list(
+                    'code_fingerprint', flat=True
+                )
+            )
+
+    # avoid fetching exising entries
+    pending_doi_list = sorted(doi for code, doi in codes.items() if code not in existing)
+    skipped = len(doi_list) - len(pending_doi_list)
+
+    # fetch metadata from CrossRef
+    cr = CrossRef(client=client)
+    works = []
+    failed = 0
+    for doi, result, error in cr.client.map(lambda doi: cr.works(ids=doi), pending_doi_list):
+        if error:
+            failed += 1
+        else:
+            works.append(result['message'])
+
+    out = ingest_works(works, client=cr.client, update=update)
+    out['skipped'] += skipped
+    out['failed'] = failed
+    out['publications'] = out['inserted']
+    return out
+
+
+MERGE_FIELDS = [
+    'code', 'main_title', 'editors', 'publisher', 'address', 'journal_id', 'journal_metric_id', 'volume', 'edition',
+    'issue', 'pages', 'pdb_doi', 'notes',
+]
+
+
+def merge_publications(publications: list[models.Publication]) -> models.Publication:
+    """
+    Merge duplicate publications into one. The publication with a code and a journal, or else the oldest one is
+    kept. Empty fields are filled from the duplicates, their relationships, metrics and PDB references are moved to
+    the kept publication and the duplicates are deleted.
+
+    :param publications: list of at least two duplicate publications
+    :return: the merged publication
+    """
+    target, *duplicates = sorted(publications, key=lambda pub: (not pub.code, not pub.journal_id, pub.pk))
+    duplicate_ids = [pub.pk for pub in duplicates]
+
+    with transaction.atomic():
+        for field in MERGE_FIELDS:
+            if not getattr(target, field):
+                setattr(target, field, next((getattr(pub, field) for pub in duplicates if getattr(pub, field)), None))
+        target.reviewed = target.reviewed or any(pub.reviewed for pub in duplicates)
+
+        for name in ['tags', 'areas', 'beamlines', 'users', 'funders']:
+            field = models.Publication._meta.get_field(name)
+            through = field.remote_field.through
+            related = through.objects.filter(**{f'{field.m2m_field_name()}__in': duplicate_ids}).values_list(
+                f'{field.m2m_reverse_field_name()}_id', flat=True
+            )
+            getattr(target, name).add(*set(related))
+
+        years = set(target.metrics.values_list('year', flat=True))
+        to_move = []
+        for metric in models.ArticleMetric.objects.filter(publication__in=duplicate_ids).order_by('-modified'):
+            if metric.year not in years:
+                metric.publication = target
+                years.add(metric.year)
+                to_move.append(metric)
+        models.ArticleMetric.objects.bulk_update(to_move, fields=['publication'])
+
+        models.Publication.objects.filter(reference__in=duplicate_ids).update(reference=target)
+        models.Publication.objects.filter(pk__in=duplicate_ids).delete()
+        target.save()
+    return target
 
-    # update publication details
-    for details in new_publications.values():
-        if 'journal_issn' in details:
-            details['journal'] = existing_journals[details.pop('journal_issn')]
-        elif 'journal' in details and isinstance(details['journal'], int):
-            details['journal_id'] = details.pop('journal', None)
-
-    # create publication entries
-    if new_publications:
-        for details in new_publications.values():
-            beamlines = details.pop('beamlines', [])
-            funders = details.pop('funders', [])
-            obj = models.Publication.objects.create(**details)
-
-            if beamlines:
-                items = {bl for bl in beamlines if not bl.kind == bl.Types.sector}
-                for bl in [x for x in beamlines if (x.kind == x.Types.sector)]:
-                    items.update(bl.children.all())
-                obj.beamlines.add(*items)
-
-            if funders:
-                new_funders = []
-                for funder in funders:
-                    doi = funder.pop('doi', None)
-                    if not doi:
-                        continue
-                    f, created = models.FundingSource.objects.get_or_create(doi=doi, defaults=funder)
-                    new_funders.append(f)
-                obj.funders.add(*new_funders)
-
-    return {'journals': len(new_journals), 'publications': len(new_publications)}
+
+def link_pdb_references(depositions, batch_size: int = BULK_BATCH_SIZE) -> int:
+    """
+    Link PDB depositions to the publications of their primary citations, found by the code fingerprints of
+    their citation DOIs
+    :param depositions: list of PDB depositions
+    :param batch_size: maximum number of codes per query and rows per update statement
+    :return: number of depositions linked
+    """
+    by_doi = defaultdict(list)
+    for deposition in depositions:
+        if deposition.pdb_doi:
+            by_doi[code_fingerprint(deposition.pdb_doi)].append(deposition)
+
+    references = {}
+    for chunk in chunker(by_doi.keys(), batch_size):
+        references.update(
+            models.Publication.objects.exclude(kind=models.Publication.TYPES.pdb).filter(
+                code_fingerprint__in=list(chunk)
+            ).values_list('code_fingerprint', 'pk')
+        )
+    to_update = []
+    for doi, items in by_doi.items():
+        for deposition in items:
+            if doi in references and deposition.reference_id != references[doi]:
+                deposition.reference_id = references[doi]
+                to_update.append(deposition)
+    models.Publication.objects.bulk_update(to_update, fields=['reference'], batch_size=batch_size)
+    return len(to_update)
 
 
 def update_pdb_references(pending: QuerySet) -> dict:
@@ -829,36 +1154,16 @@ def update_pdb_references(pending: QuerySet) -> dict:
     :param pending: Queryset of pending depositions
     :return: dictionary containing number of "pdbs" updated, and number of "references" added
     """
-    now = timezone.now()
-
-    # Pending items are PDBs with pdb_doi but no reference
-    pending_depositions = defaultdict(list)
-
-    # multiple depositions can exist for the same DOI so group them together
-    for deposition in pending:
-        doi = re.sub(r'^https?://(dx\.)?doi\.org/', '', deposition.pdb_doi)
-        pending_depositions[doi].append(deposition)
+    pending = list(pending)
+    dois = list({code_fingerprint(deposition.pdb_doi) for deposition in pending if deposition.pdb_doi})
 
     # process doi in chunks of CROSSREF_BATCH_SIZE, to avoid issues with CrossRef rate limits
-    for chunk in chunker(pending_depositions.keys(), CROSSREF_BATCH_SIZE):
-        doi_list = list(chunk)
-        create_publications(doi_list)
+    for chunk in chunker(dois, CROSSREF_BATCH_SIZE):
+        create_publications(list(chunk))
         time.sleep(CROSSREF_THROTTLE)
 
-    # Update references
-    added_references = models.Publication.objects.filter(
-        kind=models.Publication.TYPES.pdb, created__gt=now
-    ).distinct('code').in_bulk(
-        pending_depositions.keys(), field_name='code'
-    )
-
-    for code, depositions in pending_depositions.items():
-        for deposition in depositions:
-            deposition.reference = added_references.get(code)
-
-    models.Publication.objects.bulk_update(pending, fields=['reference'])
-
-    return {'references': len(pending_depositions), 'pdbs': len(pending)}
+    linked = link_pdb_references(pending)
+    return {'references': len(dois), 'pdbs': linked}
 
 
 def fetch_journal_metrics(year=None):
@@ -872,26 +1177,17 @@ def fetch_journal_metrics(year=None):
         'out': 'xls',
         'year': year if year else timezone.now().year
     }
-    cache_dir = Path(settings.LOCAL_DIR) / 'cache'
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    file_path = cache_dir / f'scimago-{params["year"]}.pickle'
-    if os.path.exists(file_path):
-        with open(file_path, 'rb') as handle:
-            return pickle.load(handle)
-    else:
-        response = requests.get(SCIMAGO_URL, params=params)
-        if response.status_code == 200:
-            dialect = csv.Sniffer().sniff(response.text[:5000])
-            text = codecs.iterdecode(response.iter_lines(), 'utf-8')
-            reader = csv.DictReader(text, dialect=dialect)
-            results = {
-                obj.get_codes(): obj.dict()
-                for row in reader
-                for obj in [SCIMagoParser(row)]
-            }
-            with open(file_path, 'wb') as handle:
-                pickle.dump(results, handle)
-            return results
+    response = get_client().get(SCIMAGO_URL, source='scimago', params=params)
+    if response.status_code == 200:
+        dialect = csv.Sniffer().sniff(response.text[:5000])
+        text = codecs.iterdecode(response.iter_lines(), 'utf-8')
+        reader = csv.DictReader(text, dialect=dialect)
+        results = {
+            obj.get_codes(): obj.dict()
+            for row in reader
+            for obj in [SCIMagoParser(row)]
+        }
+        return results
 
 
 def update_journal_metrics(year=None):
@@ -934,43 +1230,72 @@ def update_journal_metrics(year=None):
     models.JournalMetric.objects.bulk_update(
         to_update, fields=['h_index', 'impact_factor', 'sjr_rank', 'sjr_quartile', 'modified']
     )
+    touch_publications()
     return {'created': len(to_create), 'updated': num_updated}
 
 
-def update_publication_metrics(rate_limit=10):
+def fetch_publication_metrics(doi: str, citations_api: 'OpenCitations', mentions_api: CrossRef) -> dict:
     """
-    Fetch and create/or update publication metrics for current year or a given year
+    Fetch the citations and mentions of a publication per year. Safe to call from worker threads.
 
-    :param rate_limit: maximum number of requests per second
-    :return: number of entries created or deleted
+    :param doi: DOI of the publication
+    :param citations_api: OpenCitations instance
+    :param mentions_api: CrossRef instance
+    :return: dictionary mapping a year string to a dictionary of citations, self_cites and mentions
+    """
+    citations = citations_api.citations(doi)
+    mentions = mentions_api.mentions(doi)
+    for yr, count in mentions.items():
+        citations[yr] = citations.get(str(yr), {'citations': 0, 'self_cites': 0})
+        citations[yr]['mentions'] = count
+    return citations
+
+
+def update_publication_metrics(limit: int = None, client: HarvestClient = None,
+                               citations_api: 'OpenCitations' = None, mentions_api: CrossRef = None,
+                               codes: list[str] = None):
+    """
+    Fetch and create/or update publication metrics for all publications which have no metrics or whose
+    metrics are older than four weeks. Remote data is fetched concurrently within the per-host limits of the
+    harvesting client and all database changes are applied in bulk afterward.
+
+    :param limit: maximum number of publications to refresh, all if None
+    :param client: HarvestClient instance, the shared client is used if not provided
+    :param citations_api: OpenCitations instance, created from the client if not provided
+    :param mentions_api: CrossRef instance, created from the client if not provided
+    :param codes: only consider publications with these DOIs, all if None
+    :return: number of entries created, updated and publications which could not be fetched
     """
 
-    # fetch metrics for the year
     now = timezone.localtime(timezone.now())
-    cr = CrossRef()
-    oc = OpenCitations()
+    client = client or get_client()
+    oc = citations_api or OpenCitations(client=client)
+    cr = mentions_api or CrossRef(client=client)
 
     last_month = now - timedelta(weeks=4)
     target_publications = models.Publication.objects.filter(code__regex=r'^10\.').filter(
         Q(metrics__isnull=True) | Q(metrics__modified__lte=last_month)
-    )
+    ).distinct()
+    if codes is not None:
+        target_publications = target_publications.filter(code__in=codes)
 
-    publications = target_publications.distinct('code').in_bulk(field_name='code')
+    publications = {pub.code: pub for pub in target_publications.order_by('pk')}
+    doi_list = list(publications.keys())[:limit]
 
-    # Process at most CROSSREF_BATCH_SIZE publications at a time
-    doi_list = list(publications.keys())
-    to_create = []
-    update_count = 0
-    for doi in doi_list[:CROSSREF_BATCH_SIZE]:
-        pub = publications.get(doi)
-        citations = oc.citations(doi)
-        mentions = cr.mentions(doi)
-        to_update = models.ArticleMetric.objects.filter(publication=pub).distinct('year')
-        entries = {item.year: item for item in to_update}
-        for yr, count in mentions.items():
-            citations[yr] = citations.get(str(yr), {'citations': 0, 'self_cites': 0})
-            citations[yr]['mentions'] = count
+    existing = defaultdict(dict)
+    for metric in models.ArticleMetric.objects.filter(publication__in=target_publications.values('pk')):
+        existing[metric.publication_id][metric.year] = metric
 
+    to_create = []
+    to_update = []
+    failed = 0
+    results = client.map(lambda doi: fetch_publication_metrics(doi, oc, cr), doi_list)
+    for doi, citations, error in results:
+        if error:
+            failed += 1
+            continue
+        pub = publications[doi]
+        entries = existing[pub.pk]
         for yr, info in citations.items():
             if not yr:
                 continue
@@ -982,21 +1307,18 @@ def update_publication_metrics(rate_limit=10):
                 metric.self_cites = info['self_cites']
                 metric.mentions = info.get('mentions', 0)
                 metric.modified = now
-                update_count += 1
+                to_update.append(metric)
             else:
                 to_create.append(models.ArticleMetric(publication=pub, year=year, **info))
 
-        # Update the publication modified date
+    with transaction.atomic():
         models.ArticleMetric.objects.bulk_update(
-            entries.values(), fields=['citations', 'self_cites', 'mentions', 'modified']
+            to_update, fields=['citations', 'self_cites', 'mentions', 'modified'], batch_size=500
         )
-        time.sleep(1 / rate_limit)
-
-    # Create new metrics entries
-    if to_create:
-        models.ArticleMetric.objects.bulk_create(to_create)
+        models.ArticleMetric.objects.bulk_create(to_create, batch_size=500)
+    touch_publications()
 
-    return {'created': len(to_create), 'updated': update_count}
+    return {'created': len(to_create), 'updated': len(to_update), 'failed': failed}
 
 
 def get_thesis_kind(field) -> models.Publication.TYPES:
@@ -1064,7 +1386,7 @@ def get_url_meta(url, extras=None) -> dict:
     :param extras: additional properties to fetch name, value keyword pairs
     """
     extras = {} if not extras else extras
-    r = requests.get(url)
+    r = get_client().get(url, source='web')
     if r.status_code == requests.codes.ok:
         root = etree.parse(BytesIO(r.content), etree.HTMLParser())
         raw_info = [
@@ -1089,7 +1411,7 @@ def get_schema_meta(url: str) -> dict:
     Fetch metadata from a URL using schema.org JSON-LD format
     :param url: url to fetch
     """
-    r = requests.get(url)
+    r = get_client().get(url, source='web')
     if r.status_code == requests.codes.ok:
         root = etree.parse(BytesIO(r.content), etree.HTMLParser())
         schema_info = root.xpath('//script[@type="application/ld+json"]')
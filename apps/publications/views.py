@@ -1,16 +1,16 @@
-import functools
 import json
 import math
-import operator
 from datetime import date
 
 from crisp_modals.views import ModalDeleteView, ModalUpdateView, ModalCreateView
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.http import HttpResponseRedirect
+from django.shortcuts import get_object_or_404
 from django.urls import reverse_lazy
+from django.utils.dateparse import parse_date
 from django.utils.safestring import mark_safe
 from django.views.generic import TemplateView, View
 from django.views.generic.edit import UpdateView
@@ -21,7 +21,7 @@ from beamlines.filters import BeamlineFilterFactory
 from misc.filters import DateLimitFilterFactory, DateLimit
 from misc.models import ActivityLog
 from roleperms.views import RolePermsViewMixin
-from . import models, forms, stats
+from . import models, forms, metrics, stats
 
 USO_ADMIN_ROLES = getattr(settings, "USO_ADMIN_ROLES", ['admin:uso'])
 USO_STAFF_ROLES = getattr(settings, "USO_STAFF_ROLES", ['staff', 'employee'])
@@ -131,20 +131,8 @@ class UserPublicationList(RolePermsViewMixin, ItemListView):
         return super().get_queryset(*args, **kwargs)
 
 
-def get_author_names(user):
-    if hasattr(user, 'get_name_variants'):
-        return user.get_name_variants()
-    else:
-        return [user.get_full_name()]
-
-
 def get_author_matches(user):
-    names = get_author_names(user)
-    query = functools.reduce(operator.or_, [Q(authors__icontains=name) for name in names], Q())
-
-    return models.Publication.objects.exclude(
-        users__id__exact=user.pk
-    ).filter(query).count()
+    return models.match_user(user).exclude(users__id__exact=user.pk).count()
 
 
 def _claim_link(claimed, obj):
@@ -171,7 +159,7 @@ class ClaimPublicationList(RolePermsViewMixin, ItemListView):
         'claimed': _claim_link
     }
     list_search = ['authors', 'title', 'date']
-    ordering = ['kind', '-year', 'authors']
+    ordering = ['claimed', '-author_score', 'kind', '-year', 'authors']
     list_styles = {
         'date': 'text-nowrap',
         'claimed': 'col-auto text-center'
@@ -180,12 +168,10 @@ class ClaimPublicationList(RolePermsViewMixin, ItemListView):
 
     def get_queryset(self, *args, **kwargs):
         user = self.request.user
-        names = get_author_names(user)
-        query = functools.reduce(operator.__or__, [Q(authors__icontains=name) for name in names], Q())
-
-        self.queryset = models.Publication.objects.annotate(
-            claimed=Q(users__id__exact=user.pk)
-        ).filter(query | Q(users=user)).all().order_by('claimed')
+        claims = models.Publication.users.through.objects.filter(publication=OuterRef('pk'), user=user)
+        self.queryset = models.match_user(
+            user, include=Q(pk__in=user.publications.values('pk'))
+        ).annotate(claimed=Exists(claims))
         return super().get_queryset(*args, **kwargs)
 
 
@@ -234,20 +220,15 @@ class QualitySummary(RolePermsViewMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        self.facility = None
         acronym = self.kwargs.get('beamline')
+        start, end = get_period(self.kwargs)
+        context['beamline'] = None
         if acronym:
-            self.facility = models.Facility.objects.filter(acronym__iexact=acronym).first()
-            if self.facility:
-                context['beamline'] = self.facility
-                context['beamline_activity'] = {
-                    'qset': models.Publication.objects.filter(
-                        Q(beamlines__parent__acronym__iexact=acronym) | Q(beamlines__acronym__iexact=acronym)
-                    ).distinct(), 'name': self.facility.name, 'description': self.facility.description
-                }
-            else:
-                context['beamline'] = None
-
+            context['beamline'] = get_object_or_404(models.Facility, acronym__iexact=acronym)
+            context['metrics'] = metrics.get_metrics('beamline', context['beamline'].acronym, start=start, end=end)
+        else:
+            context['metrics'] = metrics.get_metrics(start=start, end=end)
+        context['period'] = (start, end)
         return context
 
 
@@ -274,7 +255,27 @@ class KeywordCloud(RolePermsViewMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['words'] = stats.get_keywords(models.Article.objects, transform=math.sqrt)
+        year = self.request.GET.get('year')
+        year = int(year) if year and year.isdigit() else None
+        beamline = self.request.GET.get('beamline')
+        publications = None
+        if beamline:
+            publications = models.Publication.objects.filter(
+                Q(beamlines__acronym__iexact=beamline) | Q(beamlines__parent__acronym__iexact=beamline)
+            )
+        context['words'] = stats.get_keywords(publications, transform=math.sqrt, year=year)
+
+        # top words of each beamline within the selected year, otherwise of each year
+        if year:
+            context['breakdown_field'] = 'beamline'
+            if publications is None:
+                publications = models.Publication.objects.all()
+            publications = publications.filter(date__year=year)
+        else:
+            context['breakdown_field'] = 'year'
+        context['breakdown'] = stats.get_keyword_breakdown(context['breakdown_field'], publications, limit=5)
+        context['year'] = year
+        context['beamline'] = beamline
         if self.request.user.is_authenticated:
             context['admin'] = self.request.user.has_any_role(*self.admin_roles)
         else:
@@ -352,6 +353,8 @@ class PublicationWizard(SessionWizardView):
         details = json.loads(data['details'])
         info = details
         info.update(notes=data.get('notes'))
+        if isinstance(info.get('date'), str):
+            info['date'] = parse_date(info['date'])
 
         if details.get('journal'):
             journal = details['journal']
@@ -371,7 +374,10 @@ class PublicationWizard(SessionWizardView):
                 description=f'Publication Added by {self.request.user}'
             )
         else:
-            models.Publication.objects.filter(pk=obj.pk).update(**info)
+            # save the instance so that fingerprints, citations and the author and keyword indices are refreshed
+            for field, value in info.items():
+                setattr(obj, field, value)
+            obj.save()
             ActivityLog.objects.log(
                 self.request, obj, kind=ActivityLog.TYPES.create,
                 description=f'Publication Re-entered by {self.request.user}'
@@ -456,12 +462,12 @@ class PublicationWizard(SessionWizardView):
         return form
 
 
-def abbrev_author(name):
-    parts = [x.strip() for x in name.strip().split(',')]
-    if len(parts) > 1:
-        return f"{parts[0].upper()}, {'' if not parts[1] else parts[1][0].upper()}"
-    else:
-        return name.strip().upper()
+def get_period(kwargs) -> tuple:
+    """
+    First and last year of the period requested through the year and end_year URL parameters
+    """
+    year, end_year = kwargs.get('year'), kwargs.get('end_year')
+    return year, end_year or year
 
 
 class InstitutionMetrics(RolePermsViewMixin, TemplateView):
@@ -472,20 +478,10 @@ class InstitutionMetrics(RolePermsViewMixin, TemplateView):
     def get_context_data(self, **kwargs):
         from users.models import Institution
         context = super().get_context_data(**kwargs)
-
-        institution = Institution.objects.get(pk=self.kwargs.get('pk'))
-        context['institution'] = institution
-        authors = {f"{u.last_name.upper()}, {u.first_name[0]}" for u in institution.users.all()}
-        pks = set()
-        for p in models.Publication.objects.all():
-            pub_authors = {abbrev_author(x) for x in p.authors.upper().split(';') if x}
-            if (pub_authors & authors):
-                pks.add(p.pk)
-        queryset = models.Publication.objects.filter(pk__in=pks)
-        articles = models.Article.objects.filter(pk__in=pks)
-        context['metrics'] = stats.get_metrics(articles, True)
-        context['queryset'] = queryset
-        context['pub_info'] = stats.get_publist(queryset)
+        start, end = get_period(self.kwargs)
+        context['institution'] = get_object_or_404(Institution, pk=self.kwargs.get('pk'))
+        context['metrics'] = metrics.get_metrics('institution', context['institution'].pk, start=start, end=end)
+        context['period'] = (start, end)
         return context
 
 
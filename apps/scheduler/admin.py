@@ -5,3 +5,4 @@ admin.site.register(models.Mode)
 admin.site.register(models.ModeTag)
 admin.site.register(models.ShiftConfig)
 admin.site.register(models.Schedule)
+admin.site.register(models.ScheduleSnapshot)
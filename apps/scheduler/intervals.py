@@ -0,0 +1,88 @@
+"""
+Interval arithmetic on half-open [start, end) spans. Spans are (start, end) tuples of comparable values,
+usually aware datetimes. Functions which accept "busy" spans expect them sorted and disjoint, as returned
+by merge().
+"""
+
+from bisect import bisect_right
+from typing import Iterable, Sequence
+
+
+def merge(spans: Iterable[tuple], adjacent: bool = True) -> list[tuple]:
+    """
+    Sort spans and coalesce those which overlap. Empty spans are dropped.
+    :param spans: iterable of (start, end) tuples
+    :param adjacent: also coalesce spans which touch end to start
+    :return: sorted list of disjoint spans
+    """
+    merged = []
+    for start, end in sorted(span for span in spans if span[0] < span[1]):
+        if merged and (start < merged[-1][1] or (adjacent and start == merged[-1][1])):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def overlapping(busy: Sequence[tuple], span: tuple, adjacent: bool = False) -> list[tuple]:
+    """
+    Busy spans which overlap the given span, found by bisection.
+    :param busy: sorted disjoint spans
+    :param span: (start, end) tuple
+    :param adjacent: also include spans which touch the span
+    """
+    start, end = span
+    index = bisect_right(busy, start, key=lambda other: other[1])
+    if adjacent and index > 0 and busy[index - 1][1] == start:
+        index -= 1
+    found = []
+    for i in range(index, len(busy)):
+        other = busy[i]
+        if other[0] > end or (other[0] == end and not adjacent):
+            break
+        found.append(other)
+    return found
+
+
+def subtract(span: tuple, busy: Sequence[tuple]) -> list[tuple]:
+    """
+    Parts of span which are not covered by any of the busy spans.
+    :param span: (start, end) tuple
+    :param busy: sorted disjoint spans
+    :return: sorted list of remaining spans, empty if span is fully covered
+    """
+    start, end = span
+    pieces = []
+    for other_start, other_end in overlapping(busy, span):
+        if other_start > start:
+            pieces.append((start, other_start))
+        start = max(start, other_end)
+    if start < end:
+        pieces.append((start, end))
+    return pieces
+
+
+def difference(spans: Iterable[tuple], busy: Iterable[tuple]) -> list[tuple]:
+    """
+    Subtract all busy spans from all spans.
+    :param spans: iterable of (start, end) tuples
+    :param busy: iterable of (start, end) tuples
+    :return: sorted list of disjoint spans covered by spans but not by busy
+    """
+    busy = merge(busy)
+    return [piece for span in merge(spans) for piece in subtract(span, busy)]
+
+
+def intersection(spans: Iterable[tuple], others: Iterable[tuple]) -> list[tuple]:
+    """
+    Parts covered by both sets of spans.
+    :param spans: iterable of (start, end) tuples
+    :param others: iterable of (start, end) tuples
+    :return: sorted list of disjoint spans
+    """
+    others = merge(others)
+    return [
+        (max(span[0], other[0]), min(span[1], other[1]))
+        for span in merge(spans)
+        for other in overlapping(others, span)
+    ]
@@ -0,0 +1,78 @@
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, time as dt_time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from scheduler.models import Schedule, ShiftConfig, ModeType, Mode
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark interval look-ups on mode events as the event history grows. Synthetic schedules are created '
+        'within a transaction which is rolled back when the benchmark completes.'
+    )
+    can_import_settings = True
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=10, help="Number of years of history to generate")
+        parser.add_argument('--window', type=int, default=31, help="Size of the queried window in days")
+        parser.add_argument('--repeat', type=int, default=25, help="Number of times to repeat each query")
+
+    @staticmethod
+    def time_query(queryset, repeat) -> float:
+        """
+        Return the median time in milliseconds to evaluate the queryset
+        """
+        timings = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            list(queryset.values_list('pk', flat=True))
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        years = options['years']
+        window = timedelta(days=options['window'])
+        repeat = options['repeat']
+        first_year = timezone.localtime(timezone.now()).year - years + 1
+
+        out = [f"{'Year':>6s} {'Events':>8s} {'overlaps (ms)':>14s} {'start/end (ms)':>15s} {'Matches':>8s}"]
+        with transaction.atomic():
+            config = ShiftConfig.objects.create(start=dt_time(8, 0), duration=8, number=3, names='A,B,C')
+            kind = ModeType.objects.create(acronym='BENCH', name='Benchmark Mode')
+
+            for year in range(first_year, first_year + years):
+                schedule = Schedule.objects.create(
+                    description=f'Benchmark {year}', config=config,
+                    start_date=datetime(year, 1, 1).date(), end_date=datetime(year, 12, 31).date(),
+                )
+                first = timezone.make_aware(datetime(year, 1, 1, 8, 0))
+                shifts = (datetime(year + 1, 1, 1) - datetime(year, 1, 1)).days * config.number
+                Mode.objects.bulk_create([
+                    Mode(
+                        schedule=schedule, kind=kind,
+                        start=first + timedelta(hours=i * config.duration),
+                        end=first + timedelta(hours=(i + 1) * config.duration)
+                    )
+                    for i in range(shifts)
+                ], batch_size=1000)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ANALYZE {Mode._meta.db_table}')
+
+                start = timezone.make_aware(datetime(year, 6, 1))
+                end = start + window
+                indexed = Mode.objects.overlaps(start, end)
+                legacy = Mode.objects.filter(start__lt=end, end__gt=start)
+                out.append(
+                    f"{year:>6d} {Mode.objects.count():>8d} {self.time_query(indexed, repeat):>14.2f} "
+                    f"{self.time_query(legacy, repeat):>15.2f} {indexed.count():>8d}"
+                )
+            if options.get('verbosity', 0) > 1:
+                out.append('\n' + indexed.explain(analyze=True))
+            transaction.set_rollback(True)
+
+        sys.stdout.write('\n'.join(out) + '\n')
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:07
+
+import django.contrib.postgres.indexes
+import misc.functions
+from django.db import migrations, models
+
+SPAN_INDEX = django.contrib.postgres.indexes.GistIndex(misc.functions.TimeSpan('start', 'end'), name='scheduler_mode_span_gist')
+
+
+def add_span_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('scheduler', 'Mode'), SPAN_INDEX)
+
+
+def remove_span_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('scheduler', 'Mode'), SPAN_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0009_auto_20250705_1752'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mode',
+            index=models.Index(fields=['start', 'end'], name='scheduler_mode_start_end_idx'),
+        ),
+        # The GiST index only exists on PostgreSQL, other databases fall back to the B-tree indexes
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='mode',
+                    index=SPAN_INDEX,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_span_index, remove_span_index),
+            ],
+        ),
+    ]
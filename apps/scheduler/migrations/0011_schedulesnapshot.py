@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:12
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0010_mode_span_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('label', models.CharField(blank=True, default='', max_length=100)),
+                ('state', models.CharField(choices=[('draft', 'Draft'), ('tentative', 'Tentative'), ('live', 'Live')], default='draft', max_length=20)),
+                ('events', models.JSONField(default=dict, editable=False)),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='scheduler.schedule')),
+            ],
+            options={
+                'get_latest_by': 'created',
+            },
+        ),
+    ]
@@ -1,16 +1,21 @@
-from django.db import models
+from dateutil import parser
+from django.contrib.postgres.indexes import GistIndex
+from django.db import connections, models, transaction
 from django.db.models.functions import Round
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import gettext as _
 from model_utils import Choices
 from model_utils.models import TimeStampedModel, TimeFramedModel
 from misc.utils import Struct
 from django.db.models import Q, F, Sum
-from misc.functions import Hours, Shifts
+from misc.functions import Hours, Shifts, TimeSpan
 from misc.models import DateSpanMixin
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta, datetime, date
 from misc.models import GenericContentMixin
+from .utils import touch_versions, diff_events
 
 
 User = getattr(settings, "AUTH_USER_MODEL")
@@ -71,6 +76,19 @@ class Schedule(TimeStampedModel, DateSpanMixin):
         return f"{self.description} [{self.state}]"
 
 
+def _as_datetime(value) -> datetime:
+    """
+    Convert an ISO string, date or datetime into an aware datetime in the current timezone
+    """
+    if isinstance(value, str):
+        value = parser.parse(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
 class EventQuerySet(models.QuerySet):
     def active(self, dt=None):
         dt = timezone.now()
@@ -81,9 +99,9 @@ class EventQuerySet(models.QuerySet):
     def _clean_event(event):
         event = event if not isinstance(event, dict) else Struct(**event)
         current_timezone = timezone.get_current_timezone()
-        if isinstance(event.start, date):
+        if isinstance(event.start, date) and not isinstance(event.start, datetime):
             event.start = datetime.combine(event.start, datetime.min.time(), tzinfo=current_timezone)
-        if isinstance(event.end, date):
+        if isinstance(event.end, date) and not isinstance(event.end, datetime):
             event.end = datetime.combine(event.end, datetime.min.time(), tzinfo=current_timezone)
         return event
 
@@ -168,6 +186,19 @@ class EventQuerySet(models.QuerySet):
         event = self._clean_event(event)
         return self.filter(start__lt=event.start, end__gt=event.end)
 
+    def overlaps(self, start, end):
+        """
+        Filter events overlapping the half-open interval [start, end). On PostgreSQL, the look-up uses the same
+        range expression as the GiST span indexes on event tables so that the cost stays flat as the event history
+        grows. Events which end before they start never overlap.
+        :param start: start of the interval, as a datetime, date or ISO string
+        :param end: end of the interval, as a datetime, date or ISO string
+        """
+        start, end = _as_datetime(start), _as_datetime(end)
+        if connections[self.db].vendor == 'postgresql':
+            return self.alias(span=TimeSpan('start', 'end')).filter(span__overlap=(start, end))
+        return self.filter(start__lt=end, end__gt=start).filter(end__gt=F('start'))
+
     def intersects(self, event):
         event = self._clean_event(event)
         return self.filter(
@@ -217,3 +248,178 @@ class Mode(Event):
 
     class Meta:
         unique_together = [('schedule', 'start', 'end')]
+        indexes = [
+            models.Index(fields=['start', 'end'], name='scheduler_mode_start_end_idx'),
+            GistIndex(TimeSpan('start', 'end'), name='scheduler_mode_span_gist'),
+        ]
+
+
+def _event_models() -> list:
+    """
+    Concrete Event models which belong to schedules
+    """
+    return [
+        rel.related_model for rel in Schedule._meta.related_objects
+        if issubclass(rel.related_model, Event) and rel.field.name == 'schedule'
+    ]
+
+
+def _event_layout(model) -> tuple[list, list]:
+    """
+    Column layout of serialized events for a model, as a tuple of (key attnames, attribute attnames).
+    Keys are the relations which identify what an event is for (e.g. mode type, project or beamline), while
+    attributes are the remaining values which may change on an event without changing its identity.
+    """
+    skip = ['id', 'created', 'modified', 'schedule', 'start', 'end']
+    fields = [f for f in model._meta.concrete_fields if f.name not in skip]
+    return [f.attname for f in fields if f.is_relation], [f.attname for f in fields if not f.is_relation]
+
+
+def _serialize_model(schedule, model, keys: list, attrs: list) -> list[tuple]:
+    """
+    Serialize the events of one model for a schedule, using one query for the events and one for their tags.
+    :return: list of (primary key, row) tuples ordered by start time
+    """
+    tags = {}
+    if 'tags' in [f.name for f in model._meta.many_to_many]:
+        field = model._meta.get_field('tags')
+        links = field.remote_field.through.objects.filter(
+            **{f'{field.m2m_field_name()}__schedule': schedule}
+        ).values_list(f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id')
+        for event_id, tag_id in links:
+            tags.setdefault(event_id, []).append(tag_id)
+
+    return [
+        (pk, [int(start.timestamp()), int(end.timestamp()), *values, sorted(tags.get(pk, []))])
+        for pk, start, end, *values in model.objects.filter(schedule=schedule).values_list(
+            'pk', 'start', 'end', *keys, *attrs
+        ).order_by('start', 'pk')
+    ]
+
+
+def serialize_events(schedule) -> dict:
+    """
+    Serialize all events of a schedule into a compact form. Each event is a row of
+    [start, end, *keys, *attributes, tags] with times as POSIX time stamps and tags as a sorted list of
+    primary keys.
+    :param schedule: the schedule
+    :return: dictionary mapping model labels to {'keys': [...], 'attrs': [...], 'rows': [...]}
+    """
+    data = {}
+    for model in _event_models():
+        keys, attrs = _event_layout(model)
+        rows = [row for pk, row in _serialize_model(schedule, model, keys, attrs)]
+        data[model._meta.label_lower] = {'keys': keys, 'attrs': attrs, 'rows': rows}
+    return data
+
+
+class ScheduleSnapshot(TimeStampedModel):
+    schedule = models.ForeignKey(Schedule, related_name='snapshots', on_delete=models.CASCADE)
+    label = models.CharField(max_length=100, blank=True, default='')
+    state = models.CharField(max_length=20, choices=Schedule.STATES, default=Schedule.STATES.draft)
+    events = models.JSONField(default=dict, editable=False)
+
+    class Meta:
+        get_latest_by = 'created'
+
+    def __str__(self):
+        return f"{self.schedule.description} - {self.label or self.created}"
+
+    @classmethod
+    def capture(cls, schedule, label=''):
+        """
+        Take a snapshot of all events in the schedule
+        :param schedule: the schedule
+        :param label: a descriptive label
+        """
+        return cls.objects.create(
+            schedule=schedule, label=label, state=schedule.state, events=serialize_events(schedule)
+        )
+
+    def diff(self, other=None) -> dict:
+        """
+        Changes between this snapshot and another snapshot, or the current state of the schedule.
+        :param other: a later snapshot, defaults to the current events
+        """
+        current = serialize_events(self.schedule) if other is None else other.events
+        return diff_events(self.events, current)
+
+    def restore(self):
+        """
+        Restore the events of the schedule to the state of this snapshot. Events which already match are kept,
+        all other changes are applied in bulk within a single transaction.
+        :raises ValueError: if the layout of any event model has changed since the snapshot was taken, in which
+            case nothing is restored
+        """
+        layouts = {model: _event_layout(model) for model in _event_models()}
+        changed = []
+        for model, (keys, attrs) in layouts.items():
+            saved = self.events.get(model._meta.label_lower, {})
+            if saved.get('keys') != keys or saved.get('attrs') != attrs:
+                changed.append(model._meta.label_lower)
+        if changed:
+            raise ValueError(f"Event layout has changed since the snapshot was taken: {', '.join(changed)}")
+
+        scopes = {'modes', f'schedule:{self.schedule.pk}'}
+        with transaction.atomic():
+            for model, (keys, attrs) in layouts.items():
+                saved = self.events[model._meta.label_lower]
+                pending = {}
+                for row in saved['rows']:
+                    pending.setdefault(repr(row), []).append(row)
+
+                obsolete = []
+                for pk, row in _serialize_model(self.schedule, model, keys, attrs):
+                    if pending.get(repr(row)):
+                        pending[repr(row)].pop()
+                    else:
+                        obsolete.append(pk)
+                        scopes |= _row_scopes(keys, row)
+
+                missing = [row for rows in pending.values() for row in rows]
+                model.objects.filter(pk__in=obsolete).delete()
+                created = model.objects.bulk_create([
+                    model(
+                        schedule=self.schedule,
+                        start=datetime.fromtimestamp(row[0], tz=timezone.get_current_timezone()),
+                        end=datetime.fromtimestamp(row[1], tz=timezone.get_current_timezone()),
+                        **dict(zip(keys + attrs, row[2:-1]))
+                    ) for row in missing
+                ])
+                if 'tags' in [f.name for f in model._meta.many_to_many]:
+                    field = model._meta.get_field('tags')
+                    through = field.remote_field.through
+                    through.objects.bulk_create([
+                        through(**{
+                            f'{field.m2m_field_name()}_id': obj.pk, f'{field.m2m_reverse_field_name()}_id': tag
+                        })
+                        for obj, row in zip(created, missing) for tag in row[-1]
+                    ])
+                for row in missing:
+                    scopes |= _row_scopes(keys, row)
+        touch_versions(*scopes)
+
+
+def _row_scopes(keys: list, row: list) -> set:
+    """
+    Change-tracking scopes affected by a serialized event row
+    """
+    scope_names = {'beamline_id': 'facility', 'facility_id': 'facility', 'project_id': 'project'}
+    return {
+        f'{scope_names[key]}:{value}' for key, value in zip(keys, row[2:]) if key in scope_names
+    }
+
+
+@receiver([post_save, post_delete], sender=Schedule)
+def on_schedule_change(sender, instance, **kwargs):
+    touch_versions('modes', f'schedule:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=Mode)
+def on_mode_change(sender, instance, **kwargs):
+    touch_versions('modes', f'schedule:{instance.schedule_id}')
+
+
+@receiver([post_save, post_delete], sender=ModeType)
+def on_mode_type_change(sender, instance, **kwargs):
+    touch_versions('modes')
@@ -1,3 +1,328 @@
+import unittest
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from misc.testing import QueryBudgetMixin
+from scheduler import intervals, models
+from scheduler.utils import clear_event, create_recurring_events, expand_recurrence, diff_events
+from users.models import User
+
+
+class TestIntervals(unittest.TestCase):
+
+    def test_merge(self):
+        self.assertEqual(intervals.merge([(5, 7), (1, 3), (2, 4)]), [(1, 4), (5, 7)])
+        self.assertEqual(intervals.merge([(1, 3), (3, 5)]), [(1, 5)])
+        self.assertEqual(intervals.merge([(1, 3), (3, 5)], adjacent=False), [(1, 3), (3, 5)])
+        self.assertEqual(intervals.merge([(1, 1), (2, 3)]), [(2, 3)], "Empty spans should be dropped")
+
+    def test_overlapping(self):
+        busy = [(1, 3), (4, 6), (8, 10)]
+        self.assertEqual(intervals.overlapping(busy, (2, 5)), [(1, 3), (4, 6)])
+        self.assertEqual(intervals.overlapping(busy, (6, 8)), [])
+        self.assertEqual(intervals.overlapping(busy, (6, 8), adjacent=True), [(4, 6), (8, 10)])
+
+    def test_subtract(self):
+        busy = [(2, 3), (5, 6)]
+        self.assertEqual(intervals.subtract((1, 8), busy), [(1, 2), (3, 5), (6, 8)])
+        self.assertEqual(intervals.subtract((2, 3), busy), [])
+        self.assertEqual(intervals.subtract((3, 5), busy), [(3, 5)])
+
+    def test_difference_and_intersection(self):
+        spans = [(0, 10), (20, 30)]
+        busy = [(5, 25)]
+        self.assertEqual(intervals.difference(spans, busy), [(0, 5), (25, 30)])
+        self.assertEqual(intervals.intersection(spans, busy), [(5, 10), (20, 25)])
+
+
+class TestRecurrence(unittest.TestCase):
+    def setUp(self):
+        self.start = timezone.make_aware(datetime(2024, 1, 3, 8, 0))   # a Wednesday
+        self.end = self.start + timedelta(hours=8)
+        self.until = timezone.make_aware(datetime(2024, 2, 1))
+
+    def test_weekly(self):
+        spans = expand_recurrence('FREQ=WEEKLY;BYDAY=WE', self.start, self.end, self.until)
+        self.assertEqual(len(spans), 5)
+        self.assertEqual(spans[0], (self.start, self.end))
+        self.assertTrue(all(end - start == timedelta(hours=8) for start, end in spans))
+
+    def test_exclusions(self):
+        spans = expand_recurrence(
+            'RRULE:FREQ=WEEKLY;BYDAY=WE', self.start, self.end, self.until, exclude=['2024-01-10']
+        )
+        self.assertEqual(len(spans), 4)
+        self.assertNotIn(datetime(2024, 1, 10).date(), [timezone.localtime(start).date() for start, end in spans])
+
+    def test_limit(self):
+        spans = expand_recurrence('FREQ=DAILY', self.start, self.end, self.start + timedelta(days=2, hours=8))
+        self.assertEqual(len(spans), 3, "Occurrences must end before the limit")
+
+
+class TestEventDiff(unittest.TestCase):
+    def setUp(self):
+        self.before = {
+            'projects.beamtime': {
+                'keys': ['project_id', 'beamline_id'], 'attrs': ['cancelled'],
+                'rows': [[0, 100, 1, 10, False, []], [200, 300, 2, 10, False, []]],
+            }
+        }
+
+    def test_no_changes(self):
+        diff = diff_events(self.before, self.before)
+        self.assertEqual(diff['projects.beamtime'], {'added': [], 'removed': [], 'changed': []})
+
+    def test_added_removed_changed(self):
+        after = {
+            'projects.beamtime': {
+                'keys': ['project_id', 'beamline_id'], 'attrs': ['cancelled'],
+                'rows': [[0, 50, 1, 10, False, []], [200, 300, 2, 10, True, []], [400, 500, 3, 10, False, [4]]],
+            }
+        }
+        diff = diff_events(self.before, after)['projects.beamtime']
+        self.assertEqual(len(diff['added']), 1)
+        self.assertEqual(diff['added'][0]['project_id'], 3)
+        self.assertEqual(len(diff['removed']), 1)
+        self.assertEqual(diff['removed'][0]['project_id'], 1)
+        self.assertEqual(len(diff['changed']), 1)
+        self.assertEqual(diff['changed'][0]['after'], {'cancelled': True, 'tags': []})
+
+
+class TestModeFeedQueries(QueryBudgetMixin, TestCase):
+    """
+    The mode feeds must be served with a fixed number of queries regardless of the number of modes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        config = models.ShiftConfig.objects.create(start=time(8), duration=8, number=3, names='A,B,C')
+        cls.schedule = models.Schedule.objects.create(
+            description='Schedule', config=config, start_date=date(2024, 1, 1), end_date=date(2024, 1, 31),
+            state=models.Schedule.STATES.live,
+        )
+        cls.user = User.objects.create(username='staff', first_name='Staff', last_name='User')
+        tag = models.ModeTag.objects.create(name='Special')
+        kinds = [
+            models.ModeType.objects.create(acronym=f'M{i}', name=f'Mode {i}', color='#000') for i in range(3)
+        ]
+        start = timezone.make_aware(datetime(2024, 1, 1, 8))
+        for i in range(30):
+            mode = models.Mode.objects.create(
+                schedule=cls.schedule, kind=kinds[i % 3], start=start + timedelta(hours=8 * i),
+                end=start + timedelta(hours=8 * (i + 1)),
+            )
+            mode.tags.add(tag)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_schedule_modes(self):
+        url = reverse('schedule-modes-api', kwargs={'pk': self.schedule.pk})
+        with self.assertQueryBudget(max_queries=6):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()), 30)
+
+    def test_facility_modes(self):
+        url = reverse('facility-modes-api')
+        with self.assertQueryBudget(max_queries=6):
+            response = self.client.get(url, {'start': '2024-01-01', 'end': '2024-02-01'})
+        self.assertEqual(len(response.json()), 30)
+
+
+class TestEventLookups(TestCase):
+    """
+    Range look-ups keep the time of day of datetime arguments, dates are taken as midnight.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        config = models.ShiftConfig.objects.create(start=time(8), duration=8, number=3, names='A,B,C')
+        cls.schedule = models.Schedule.objects.create(
+            description='Schedule', config=config, start_date=date(2024, 1, 1), end_date=date(2024, 1, 31),
+        )
+        kind = models.ModeType.objects.create(acronym='N', name='Normal', is_normal=True)
+        cls.first, cls.second = [
+            models.Mode.objects.create(
+                schedule=cls.schedule, kind=kind, start=timezone.make_aware(datetime(2024, 1, day, 8)),
+                end=timezone.make_aware(datetime(2024, 1, day, 16))
+            ) for day in (1, 2)
+        ]
+
+    @staticmethod
+    def at(day: int, hour: int) -> datetime:
+        return timezone.make_aware(datetime(2024, 1, day, hour))
+
+    def test_datetimes(self):
+        modes = models.Mode.objects.all()
+        self.assertEqual(list(modes.within({'start': self.at(1, 6), 'end': self.at(1, 20)})), [self.first])
+        self.assertEqual(list(modes.encloses({'start': self.at(2, 9), 'end': self.at(2, 10)})), [self.second])
+        self.assertEqual(modes.within({'start': date(2024, 1, 1), 'end': date(2024, 1, 3)}).count(), 2)
+
+    def test_overlaps(self):
+        modes = models.Mode.objects.all()
+        self.assertEqual(list(modes.overlaps(self.at(1, 12), self.at(2, 8))), [self.first])
+        self.assertEqual(list(modes.overlaps('2024-01-01T16:00', '2024-01-02T09:00')), [self.second])
+        self.assertEqual(modes.overlaps(date(2024, 1, 1), date(2024, 1, 3)).count(), 2)
+
+        # events which end before they start never overlap
+        models.Mode.objects.create(
+            schedule=self.schedule, kind=self.first.kind, start=self.at(3, 16), end=self.at(3, 8)
+        )
+        self.assertEqual(modes.overlaps(self.at(3, 0), self.at(4, 0)).count(), 0)
+
+    def test_clear_event(self):
+        clear_event(self.schedule, models.Mode.objects.all(), {'start': self.at(1, 10), 'end': self.at(1, 12)})
+        spans = models.Mode.objects.filter(start__date=date(2024, 1, 1)).order_by('start').values_list('start', 'end')
+        self.assertEqual(list(spans), [(self.at(1, 8), self.at(1, 10)), (self.at(1, 12), self.at(1, 16))])
+
+
+class TestRecurringEvents(QueryBudgetMixin, TestCase):
+    """
+    Painting a recurring event merges matching events and clips, splits or replaces the others in bulk.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        config = models.ShiftConfig.objects.create(start=time(8), duration=8, number=3, names='A,B,C')
+        cls.schedule = models.Schedule.objects.create(
+            description='Schedule', config=config, start_date=date(2024, 1, 1), end_date=date(2024, 1, 31),
+        )
+        cls.normal = models.ModeType.objects.create(acronym='N', name='Normal', is_normal=True)
+        cls.development = models.ModeType.objects.create(acronym='MD', name='Development')
+        cls.tag = models.ModeTag.objects.create(name='Special')
+
+    @staticmethod
+    def at(day: int, hour: int) -> datetime:
+        return timezone.make_aware(datetime(2024, 1, day, hour))
+
+    def add_mode(self, kind, start, end, tags=()):
+        mode = models.Mode.objects.create(schedule=self.schedule, kind=kind, start=start, end=end, comments='')
+        mode.tags.add(*tags)
+        return mode
+
+    def paint(self, rule='FREQ=DAILY;COUNT=3', **kwargs):
+        data = {
+            'kind': self.normal, 'start': self.at(1, 8), 'end': self.at(1, 16), 'comments': '', 'tags': [], **kwargs
+        }
+        return create_recurring_events(self.schedule, models.Mode.objects.filter(schedule=self.schedule), data, rule)
+
+    def spans(self, kind) -> list:
+        return list(models.Mode.objects.filter(kind=kind).order_by('start').values_list('start', 'end'))
+
+    def test_merge(self):
+        self.add_mode(self.normal, self.at(1, 8), self.at(1, 16))
+        self.add_mode(self.normal, self.at(2, 12), self.at(2, 20))
+        self.add_mode(self.normal, self.at(3, 16), self.at(3, 18))     # touches the last occurrence
+        other = self.add_mode(self.normal, self.at(3, 10), self.at(3, 12), tags=[self.tag])   # different tags
+        self.assertEqual(self.paint(), status.HTTP_201_CREATED)
+        self.assertEqual(models.Mode.objects.filter(kind=self.normal).count(), 3)
+        self.assertEqual(self.spans(self.normal), [
+            (self.at(1, 8), self.at(1, 16)), (self.at(2, 8), self.at(2, 20)), (self.at(3, 8), self.at(3, 18))
+        ])
+        self.assertFalse(models.Mode.objects.filter(pk=other.pk).exists(), "Enclosed events should be replaced")
+
+    def test_clip(self):
+        self.add_mode(self.development, self.at(1, 0), self.at(1, 10))
+        self.add_mode(self.development, self.at(3, 14), self.at(3, 22))
+        with self.assertQueryBudget(max_queries=12):
+            self.paint()
+        self.assertEqual(
+            self.spans(self.development), [(self.at(1, 0), self.at(1, 8)), (self.at(3, 16), self.at(3, 22))]
+        )
+
+    def test_split(self):
+        mode = self.add_mode(self.development, self.at(1, 0), self.at(3, 0), tags=[self.tag])
+        self.paint()
+        self.assertEqual(self.spans(self.development), [
+            (self.at(1, 0), self.at(1, 8)), (self.at(1, 16), self.at(2, 8)), (self.at(2, 16), self.at(3, 0))
+        ])
+        self.assertEqual(models.Mode.objects.get(pk=mode.pk).end, self.at(1, 8))
+        self.assertTrue(all(
+            list(split.tags.all()) == [self.tag] for split in models.Mode.objects.filter(kind=self.development)
+        ), "Split copies should keep their tags")
+
+    def test_schedule_limits(self):
+        self.assertEqual(
+            self.paint(start=self.at(1, 8) - timedelta(days=1), end=self.at(1, 0)), status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(self.paint(rule='FREQ=SOMETIMES'), status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(models.Mode.objects.exists())
+
+
+class TestScheduleSnapshots(TestCase):
+    """
+    Restoring a snapshot reverts all events of the schedule and their tags, or nothing at all.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        config = models.ShiftConfig.objects.create(start=time(8), duration=8, number=3, names='A,B,C')
+        cls.schedule = models.Schedule.objects.create(
+            description='Schedule', config=config, start_date=date(2024, 1, 1), end_date=date(2024, 1, 31),
+        )
+        cls.normal = models.ModeType.objects.create(acronym='N', name='Normal', is_normal=True)
+        cls.development = models.ModeType.objects.create(acronym='MD', name='Development')
+        cls.tag = models.ModeTag.objects.create(name='Special')
+        cls.admin = User.objects.create(username='admin', first_name='Admin', last_name='User', roles=['admin:uso'])
+
+    def setUp(self):
+        self.modes = []
+        for day in range(1, 4):
+            mode = models.Mode.objects.create(
+                schedule=self.schedule, kind=self.normal, start=self.at(day, 8), end=self.at(day, 16)
+            )
+            mode.tags.add(self.tag)
+            self.modes.append(mode)
+
+    @staticmethod
+    def at(day: int, hour: int) -> datetime:
+        return timezone.make_aware(datetime(2024, 1, day, hour))
+
+    def edit(self):
+        self.modes[0].delete()
+        self.modes[1].kind = self.development
+        self.modes[1].save()
+        self.modes[2].tags.clear()
+        self.modes[2].comments = 'Changed'
+        self.modes[2].save()
+        models.Mode.objects.create(schedule=self.schedule, kind=self.normal, start=self.at(4, 8), end=self.at(4, 16))
+
+    def test_round_trip(self):
+        snapshot = models.ScheduleSnapshot.capture(self.schedule, label='Before')
+        self.edit()
+        diff = snapshot.diff()['scheduler.mode']
+        self.assertEqual((len(diff['added']), len(diff['removed']), len(diff['changed'])), (2, 2, 1))
+
+        snapshot.restore()
+        self.assertEqual(models.serialize_events(self.schedule), snapshot.events)
+        self.assertTrue(all(
+            list(mode.tags.all()) == [self.tag] for mode in models.Mode.objects.filter(schedule=self.schedule)
+        ), "Restored events should get their tags back")
+        self.assertFalse(models.Mode.objects.filter(pk=self.modes[2].pk).exists(), "Changed events are replaced")
+        self.assertTrue(models.Mode.objects.filter(start=self.at(3, 8), comments='').exists())
+
+        # restoring again changes nothing
+        pks = set(models.Mode.objects.values_list('pk', flat=True))
+        snapshot.restore()
+        self.assertEqual(set(models.Mode.objects.values_list('pk', flat=True)), pks)
+
+    def test_layout_changed(self):
+        snapshot = models.ScheduleSnapshot.capture(self.schedule)
+        snapshot.events['scheduler.mode']['attrs'] = ['cancelled']
+        snapshot.save()
+        self.edit()
+        before = models.serialize_events(self.schedule)
+        with self.assertRaisesMessage(ValueError, 'scheduler.mode'):
+            snapshot.restore()
+        self.assertEqual(models.serialize_events(self.schedule), before, "Nothing should be restored")
 
-# Create your tests here.
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('restore-schedule-snapshot', kwargs={'pk': snapshot.pk}))
+        self.assertIn('scheduler.mode', response.json()['message'])
+        self.assertEqual(models.serialize_events(self.schedule), before)
@@ -10,6 +10,9 @@ urlpatterns = [
     path('schedules/<int:pk>/modes/<str:date>/', views.ModeEditor.as_view(), name="schedule-modes-edit"),
     path('schedules/<int:pk>/overlay/', views.ModeEditor.as_view(), name="schedule-modes-edit"),
     path('schedules/<int:pk>/switch/<str:state>/', views.PromoteSchedule.as_view(), name="switch-schedule"),
+    path('schedules/<int:pk>/snapshots/', views.SnapshotList.as_view(), name="schedule-snapshot-list"),
+    path('schedules/<int:pk>/snapshots/new/', views.CaptureSnapshot.as_view(), name="capture-schedule-snapshot"),
+    path('snapshots/<int:pk>/restore/', views.RestoreSnapshot.as_view(), name="restore-schedule-snapshot"),
 
     path('mode-types/', views.ModeTypeList.as_view(), name="mode-type-list"),
     path('mode-types/<int:pk>/edit/', views.EditModeType.as_view(), name="edit-mode-type"),
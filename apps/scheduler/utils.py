@@ -1,10 +1,63 @@
+import hashlib
+import time
+
+from dateutil import parser, rrule
 from rest_framework import status
 from datetime import datetime, timedelta
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 from django.db.models import Q, Min, Max, F, ExpressionWrapper, fields
 
+from . import intervals
+
 
 DURATION_FIELD = ExpressionWrapper(F('end') - F('start'), output_field=fields.DurationField())
+VERSION_TIMEOUT = 60 * 60 * 24 * 30    # keep version stamps for 30 days
+
+
+def _version_key(scope: str) -> str:
+    return f'scheduler-version:{scope}'
+
+
+def touch_versions(*scopes: str):
+    """
+    Mark the given change-tracking scopes as modified. Scopes are plain strings such as 'modes',
+    'schedule:<pk>', 'facility:<pk>' or 'project:<pk>'. The version of a scope is a monotonic nanosecond
+    time stamp stored in the shared cache.
+    :param scopes: the scopes to update
+    """
+    if scopes:
+        stamp = time.time_ns()
+        cache.set_many({_version_key(scope): stamp for scope in scopes}, timeout=VERSION_TIMEOUT)
+
+
+def get_versions(*scopes: str) -> dict:
+    """
+    Fetch the current versions of the given change-tracking scopes in a single cache round-trip. Scopes
+    which have never been touched, or which have been evicted from the cache, are initialized to the current
+    time so that clients holding stale validators will be sent fresh content.
+    :param scopes: the scopes to fetch
+    :return: a dictionary mapping scopes to version stamps
+    """
+    keys = {_version_key(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=VERSION_TIMEOUT)
+        found.update(missing)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+def version_tag(versions: dict, *extras) -> str:
+    """
+    Generate an entity tag from a dictionary of scope versions and any additional values which
+    determine the content of a response, such as the requested time window.
+    :param versions: dictionary of scope versions as returned by get_versions
+    :param extras: additional values to include in the tag
+    """
+    parts = [f'{scope}={stamp}' for scope, stamp in sorted(versions.items())] + [str(extra) for extra in extras]
+    return hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
 
 
 def round_time(dt, delta):
@@ -146,3 +199,189 @@ def clear_event(schedule, queryset, data):
             event.start = data['end']
             event.save()
     return status.HTTP_200_OK
+
+
+def expand_recurrence(rule: str, start: datetime, end: datetime, until: datetime, exclude=()) -> list[tuple]:
+    """
+    Expand a recurrence rule into a list of event spans. The first occurrence is the template event
+    given by start and end, and all later occurrences have the same duration.
+    :param rule: an iCalendar RRULE string such as "FREQ=WEEKLY;BYDAY=WE", with or without the "RRULE:" prefix
+    :param start: start of the template event
+    :param end: end of the template event
+    :param until: no occurrence may end after this time
+    :param exclude: dates or date strings on which occurrences are skipped
+    :return: sorted list of (start, end) tuples
+    """
+    duration = end - start
+    skip = {
+        (parser.parse(value).date() if isinstance(value, str) else value) for value in exclude
+    }
+    skip = {value.date() if isinstance(value, datetime) else value for value in skip}
+    recurrence = rrule.rrulestr(rule.removeprefix('RRULE:'), dtstart=start)
+    return [
+        (occurrence, occurrence + duration)
+        for occurrence in recurrence.between(start, until - duration, inc=True)
+        if timezone.localtime(occurrence).date() not in skip
+    ]
+
+
+def _field_values(model, data: dict) -> dict:
+    """
+    Map event data to raw column values for comparison with existing events, excluding the time span
+    and many-to-many fields
+    """
+    values = {}
+    for name, value in data.items():
+        if name in ['start', 'end', 'tags']:
+            continue
+        field = model._meta.get_field(name)
+        values[field.attname] = value.pk if field.is_relation and value is not None else value
+    return values
+
+
+def create_recurring_events(schedule, queryset, data, rule, exclude=()):
+    """
+    Paint a recurring event over a schedule in bulk. Occurrences are expanded in memory and merged against
+    existing events with the same semantics as create_event: matching events which overlap or touch an
+    occurrence are merged with it, and other overlapping events are clipped, split or replaced. All changes
+    are written with a fixed number of queries.
+    :param schedule: the schedule
+    :param queryset: queryset of events to paint over
+    :param data: the template event, the first occurrence
+    :param rule: an iCalendar RRULE string
+    :param exclude: dates on which occurrences are skipped
+    """
+
+    data['schedule'] = schedule
+    tags = list(data.pop('tags', []))
+    model = queryset.model
+    limit = timezone.make_aware(datetime.combine(schedule.end_date, datetime.min.time()))
+    first = timezone.make_aware(datetime.combine(schedule.start_date, datetime.min.time()))
+
+    if data['start'] < first or data['end'] > limit:
+        return status.HTTP_304_NOT_MODIFIED
+
+    try:
+        occurrences = intervals.merge(expand_recurrence(rule, data['start'], data['end'], limit, exclude=exclude))
+    except (ValueError, TypeError):
+        return status.HTTP_400_BAD_REQUEST
+    if not occurrences:
+        return status.HTTP_304_NOT_MODIFIED
+
+    values = _field_values(model, data)
+    tag_ids = {getattr(tag, 'pk', tag) for tag in tags}
+    tags_field = model._meta.get_field('tags')
+    existing = queryset.filter(
+        start__lte=occurrences[-1][1], end__gte=occurrences[0][0]
+    ).prefetch_related('tags')
+
+    # Matching events are absorbed into the occurrences they touch, all others are clipped by the occurrences
+    to_delete, to_update, to_create, tag_links = [], [], [], []
+    absorbed, others = [], []
+    for event in existing:
+        span = (event.start, event.end)
+        matches = (
+            not event.cancelled and {tag.pk for tag in event.tags.all()} == tag_ids and
+            all(getattr(event, name) == value for name, value in values.items())
+        )
+        if matches and intervals.overlapping(occurrences, span, adjacent=True):
+            to_delete.append(event.pk)
+            absorbed.append(span)
+        else:
+            others.append(event)
+    occurrences = intervals.merge(occurrences + absorbed)
+
+    for event in others:
+        if not intervals.overlapping(occurrences, (event.start, event.end)):
+            continue
+        pieces = intervals.subtract((event.start, event.end), occurrences)
+        if not pieces:
+            to_delete.append(event.pk)
+            continue
+        old_tags = [tag.pk for tag in event.tags.all()]
+        field_values = {
+            f.attname: getattr(event, f.attname) for f in model._meta.concrete_fields
+            if not f.primary_key and f.name not in ['start', 'end', 'created', 'modified']
+        }
+        for start, end in pieces[1:]:   # create split copies
+            to_create.append((model(start=start, end=end, **field_values), old_tags))
+        event.start, event.end = pieces[0]
+        to_update.append(event)
+
+    to_create.extend(
+        (model(start=start, end=end, **values), list(tag_ids)) for start, end in occurrences
+    )
+    with transaction.atomic():
+        model.objects.filter(pk__in=to_delete).delete()
+        model.objects.bulk_update(to_update, ['start', 'end'])
+        created = model.objects.bulk_create([obj for obj, obj_tags in to_create])
+        for obj, (_, obj_tags) in zip(created, to_create):
+            tag_links.extend(
+                tags_field.remote_field.through(**{
+                    f'{tags_field.m2m_field_name()}_id': obj.pk, f'{tags_field.m2m_reverse_field_name()}_id': tag
+                })
+                for tag in obj_tags
+            )
+        tags_field.remote_field.through.objects.bulk_create(tag_links)
+    return status.HTTP_201_CREATED
+
+
+def _group_rows(rows: list, size: int) -> dict:
+    """
+    Group serialized event rows by their key values
+    :param rows: serialized rows of [start, end, *keys, *attrs, tags]
+    :param size: number of key columns
+    :return: dictionary mapping key tuples to lists of rows
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[2:2 + size]), []).append(row)
+    return groups
+
+
+def diff_events(before: dict, after: dict) -> dict:
+    """
+    Compare two serialized sets of schedule events (see scheduler.models.serialize_events). Events are grouped by
+    their keys (e.g. mode type, or project and beamline), and within each group the time covered only after is
+    reported as added and the time covered only before as removed. Events with identical keys and spans but
+    different attributes or tags are reported as changed. The cost is dominated by sorting, O(n log n).
+    :param before: the earlier serialized events
+    :param after: the later serialized events
+    :return: dictionary mapping model labels to {'added': [...], 'removed': [...], 'changed': [...]}, where each
+        entry is a dictionary with 'start', 'end' and the key values, and changed entries also have 'before' and
+        'after' attribute dictionaries.
+    """
+    tz = timezone.get_current_timezone()
+    diff = {}
+    for label in sorted(set(before) | set(after)):
+        layout = after.get(label) or before.get(label)
+        keys, attrs = layout['keys'], layout['attrs']
+        old_groups = _group_rows(before.get(label, {}).get('rows', []), len(keys))
+        new_groups = _group_rows(after.get(label, {}).get('rows', []), len(keys))
+
+        def _entry(start, end, key, **extra):
+            return {
+                'start': datetime.fromtimestamp(start, tz=tz).isoformat(),
+                'end': datetime.fromtimestamp(end, tz=tz).isoformat(),
+                **dict(zip(keys, key)), **extra
+            }
+
+        added, removed, changed = [], [], []
+        for key in sorted(set(old_groups) | set(new_groups), key=repr):
+            old_rows, new_rows = old_groups.get(key, []), new_groups.get(key, [])
+            old_spans = [(row[0], row[1]) for row in old_rows]
+            new_spans = [(row[0], row[1]) for row in new_rows]
+            added.extend(_entry(start, end, key) for start, end in intervals.difference(new_spans, old_spans))
+            removed.extend(_entry(start, end, key) for start, end in intervals.difference(old_spans, new_spans))
+
+            old_values = {(row[0], row[1]): row[2 + len(keys):] for row in old_rows}
+            for row in new_rows:
+                values = row[2 + len(keys):]
+                previous = old_values.get((row[0], row[1]))
+                if previous is not None and previous != values:
+                    changed.append(_entry(
+                        row[0], row[1], key,
+                        before=dict(zip(attrs + ['tags'], previous)), after=dict(zip(attrs + ['tags'], values))
+                    ))
+        diff[label] = {'added': added, 'removed': removed, 'changed': changed}
+    return diff
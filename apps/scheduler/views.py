@@ -9,6 +9,8 @@ from django.db.models import Sum
 from django.http import JsonResponse
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.utils.safestring import mark_safe
 from django.utils.timezone import make_aware
 from django.views.generic import detail, TemplateView, View
@@ -235,11 +237,42 @@ class ModeEditor(EventEditor):
         return models.ModeTag.objects.filter()
 
 
-class FacilityModeListAPI(generics.ListAPIView):
+class ConditionalFeedMixin:
+    """
+    Mixin for event feed APIs which adds ETag and Last-Modified validators to list responses and answers
+    conditional requests with 304 Not Modified without evaluating the queryset or serializing any events.
+    Subclasses should override get_version_scopes to return the change-tracking scopes which determine the
+    content of the feed. See scheduler.utils.touch_versions.
+    """
+
+    def get_version_scopes(self) -> list:
+        return []
+
+    def get_validators(self):
+        versions = utils.get_versions(*self.get_version_scopes())
+        etag = quote_etag(utils.version_tag(versions, self.request.path, self.request.GET.urlencode()))
+        last_modified = max(versions.values(), default=0) // 1_000_000_000
+        return etag, last_modified
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+        response.headers.setdefault('Cache-Control', 'no-cache')
+        return response
+
+
+class FacilityModeListAPI(ConditionalFeedMixin, generics.ListAPIView):
     model = models.Mode
     serializer_class = serializers.ModeSerializer
     parser_classes = (JSONParser,)
 
+    def get_version_scopes(self):
+        return ['modes']
+
     def get_queryset(self, *args, **kwargs):
         queryset = models.Mode.objects.filter(
             schedule__state__in=[models.Schedule.STATES.live, models.Schedule.STATES.tentative]
@@ -251,10 +284,10 @@ class FacilityModeListAPI(generics.ListAPIView):
         else:
             start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
             end = start + timedelta(days=calendar.monthrange(start.year, start.month)[1])
-        return queryset.filter(start__lte=end, end__gte=start).all()
+        return queryset.overlaps(start, end).select_related('kind', 'schedule').prefetch_related('tags')
 
 
-class EventUpdateAPI(generics.ListCreateAPIView):
+class EventUpdateAPI(ConditionalFeedMixin, generics.ListCreateAPIView):
     model = models.Event
     serializer_class = None
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
@@ -270,12 +303,24 @@ class EventUpdateAPI(generics.ListCreateAPIView):
         else:
             start = self.schedule.start_date
             end = self.schedule.end_date
-        self.queryset = self.model.objects.filter(schedule=self.schedule, start__lte=end, end__gte=start)
+        self.queryset = self.model.objects.filter(
+            schedule=self.schedule, start__lte=end, end__gte=start
+        ).select_related('schedule')
         return self.queryset
 
     def post_process(self, schedule, queryset, data):
         pass
 
+    def get_version_scopes(self):
+        return [f"schedule:{self.kwargs['pk']}"]
+
+    def get_changed_scopes(self):
+        """
+        Change-tracking scopes to touch after events have been modified through this API. Bulk updates
+        and deletes do not emit model signals so feeds are invalidated here.
+        """
+        return self.get_version_scopes()
+
     def get_data(self, info):
         return {
             'start': parser.parse(info['start']), 'end': parser.parse(info['end']), 'comments': info.get('comments', ''),
@@ -295,6 +340,11 @@ class EventUpdateAPI(generics.ListCreateAPIView):
             elif request.data.get('comments'):
                 queryset.filter(pk=pk).update(comments=request.data.get('comments'))
             output_status = status.HTTP_200_OK
+        elif data.get(self.creation_key) and request.data.get('rrule'):
+            output_status = utils.create_recurring_events(
+                self.schedule, queryset, data, request.data['rrule'], exclude=request.data.get('exclude', [])
+            )
+            self.post_process(self.schedule, queryset, data)
         elif data.get(self.creation_key):
             output_status = utils.create_event(self.schedule, queryset, data)
             self.post_process(self.schedule, queryset, data)
@@ -321,6 +371,8 @@ class EventUpdateAPI(generics.ListCreateAPIView):
                 output_status = self.handle_one(request, queryset, data)
                 outputs.append(output_status)
             output_status = max(outputs)
+        if output_status != status.HTTP_304_NOT_MODIFIED:
+            utils.touch_versions(*self.get_changed_scopes())
         return Response([], status=output_status)
 
 
@@ -330,6 +382,13 @@ class ModeListAPI(EventUpdateAPI):
     creation_key = 'kind'
     allowed_schedule_states = [models.Schedule.STATES.draft, models.Schedule.STATES.tentative]
 
+    def get_queryset(self, *args, **kwargs):
+        self.queryset = super().get_queryset(*args, **kwargs).select_related('kind').prefetch_related('tags')
+        return self.queryset
+
+    def get_changed_scopes(self):
+        return super().get_changed_scopes() + ['modes']
+
     def get_data(self, info):
         return {
             'start': parser.parse(info['start']),
@@ -359,9 +418,90 @@ class PromoteSchedule(RolePermsViewMixin, ModalConfirmView):
         if self.kwargs.get('state') in models.Schedule.STATES:
             obj.state = self.kwargs.get('state')
             obj.save()
+            models.ScheduleSnapshot.capture(obj, label=f'Switched to {STATES[obj.state]}')
         return JsonResponse({"url": ""})
 
 
+class SnapshotList(RolePermsViewMixin, ItemListView):
+    model = models.ScheduleSnapshot
+    template_name = "item-list.html"
+    paginate_by = 15
+    allowed_roles = USO_ADMIN_ROLES
+    link_url = 'restore-schedule-snapshot'
+    link_attr = 'data-modal-url'
+    list_filters = ['state', 'created']
+    list_columns = ['label', 'state', 'created']
+    list_search = ['label']
+    list_transforms = {'state': _fmt_states}
+    ordering = ['-created']
+
+    def get_list_title(self):
+        return f'{self.schedule.description} Snapshots'
+
+    def get_queryset(self, *args, **kwargs):
+        self.schedule = models.Schedule.objects.get(pk=self.kwargs['pk'])
+        self.queryset = self.schedule.snapshots.all()
+        return super().get_queryset(*args, **kwargs)
+
+
+class CaptureSnapshot(RolePermsViewMixin, ModalConfirmView):
+    model = models.Schedule
+    allowed_roles = USO_ADMIN_ROLES
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['title'] = "Take Snapshot"
+        context['message'] = f"Save a snapshot of the current events of the schedule '{self.object}'?"
+        return context
+
+    def confirmed(self, *args, **kwargs):
+        models.ScheduleSnapshot.capture(self.object, label='Manual Snapshot')
+        return JsonResponse({"url": "", "message": "Snapshot saved"})
+
+
+class RestoreSnapshot(RolePermsViewMixin, ModalConfirmView):
+    model = models.ScheduleSnapshot
+    allowed_roles = USO_ADMIN_ROLES
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        diff = self.object.diff()
+        changes = sum(len(entries) for changes in diff.values() for entries in changes.values())
+        context['title'] = "Restore Snapshot"
+        context['message'] = (
+            f"Revert the events of the schedule '{self.object.schedule}' to the snapshot '{self.object}' "
+            f"taken on {timezone.localtime(self.object.created):%Y-%m-%d %H:%M}? "
+            f"{changes} changed intervals will be reverted."
+        )
+        return context
+
+    def confirmed(self, *args, **kwargs):
+        if not self.object.schedule.is_editable():
+            return JsonResponse({"url": "", "message": "Live schedules can not be restored"})
+        try:
+            self.object.restore()
+        except ValueError as err:
+            return JsonResponse({"url": "", "message": str(err)})
+        return JsonResponse({"url": "", "message": "Snapshot restored"})
+
+
+class SnapshotDiffAPI(RolePermsViewMixin, View):
+    """
+    Changes between a snapshot and the current events of its schedule, or a later snapshot specified
+    through the 'against' query parameter.
+    """
+    allowed_roles = USO_ADMIN_ROLES
+
+    def get(self, request, *args, **kwargs):
+        snapshot = models.ScheduleSnapshot.objects.filter(pk=self.kwargs['pk']).first()
+        if not snapshot:
+            return JsonResponse({}, status=status.HTTP_404_NOT_FOUND)
+        other = None
+        if request.GET.get('against'):
+            other = snapshot.schedule.snapshots.filter(pk=request.GET.get('against')).first()
+        return JsonResponse(snapshot.diff(other))
+
+
 class YearTemplate(RolePermsViewMixin, TemplateView):
     template_name = "scheduler/year.html"
 
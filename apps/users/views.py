@@ -47,7 +47,6 @@ class UserDetailView(RolePermsViewMixin, DetailView):
         # inject username in to kwargs if not already present
         if not self.kwargs.get('username'):
             self.kwargs['username'] = self.request.user.username
-        self.kwargs['words'] = stats.get_keywords(self.request.user.publications.all(), transform=math.sqrt)
         return super().get_object(*args, **kwargs)
 
     def get_context_data(self, **kwargs):
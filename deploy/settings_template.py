@@ -142,6 +142,14 @@ USO_PDB_SITE = 'CLSI'       # Protein Data Bank site code
 #     "CLSI08ID-1": ["CMCF-BM"],
 #     "CLSIUNKNOWN": ["CMCF-ID", "CMCF-BM"],
 # }
+
+# -----------------------------------------------------------------------------
+# Per-view query and timing instrumentation, summarized with `manage.py worstviews`
+# -----------------------------------------------------------------------------
+# USO_INSTRUMENT_VIEWS = False      # record query counts and timings per view
+# USO_SERVER_TIMING = False         # report query counts and timings in a Server-Timing header
+# USO_INSTRUMENT_STORE = '/usonline/local/instrumentation.db'
+# USO_INSTRUMENT_MAX_SAMPLES = 20000
 # -----------------------------------------------------------------------------
 # Override code generators for Projects, Proposals, Submissions, and Materials
 # These are the default code generators, you can override any or all of them:
@@ -85,6 +85,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'misc.middleware.instrumentation.QueryInstrumentationMiddleware',
 ]
 
 AUTHENTICATION_BACKENDS = global_settings.AUTHENTICATION_BACKENDS + [
@@ -232,11 +233,22 @@ USO_REVIEW_ASSIGNMENT = "MIP"    # or either "MIP" or "CMACRA" or "BRUTE_FORCE"
 USO_PDB_SITE = 'XXXX'       # Protein Data Bank site code
 USO_PDB_SITE_MAP = {
 }
+USO_INSTRUMENT_VIEWS = None     # record query counts and timings per view, None follows DEBUG (off under tests)
+USO_SERVER_TIMING = None        # report query counts and timings in a Server-Timing header, None follows DEBUG
+USO_INSTRUMENT_STORE = str(LOCAL_DIR / 'instrumentation.db')
 
 OPEN_CITATIONS_API_KEY = None
 CROSSREF_THROTTLE = 1  # time delay between crossref calls
 CROSSREF_BATCH_SIZE = 20
 CROSSREF_API_EMAIL = None
+HARVEST_WORKERS = 8  # worker threads used to fetch publication metrics
+HARVEST_HOST_LIMITS = {}  # per-host (concurrent requests, requests per second) overrides
+HTTP_CACHE_PATH = str(LOCAL_DIR / 'cache' / 'http.db')  # cache of external bibliographic responses
+HTTP_CACHE_MAX_SIZE = 256 * 1024 * 1024
+PUBLICATION_METRICS_TIMEOUT = 6 * 3600  # seconds for which institution and beamline metrics are cached
+PUBLICATION_FEED_PAGE_SIZE = 50  # entries per page of the public publication feeds
+PUBLICATION_FEED_MAX_AGE = 300  # seconds for which proxies may cache publication feed pages
+PDB_PAGE_SIZE = 250  # number of PDB entries fetched per GraphQL query during synchronization
 
 
 ROLEPERMS_DEBUG = False